@@ -0,0 +1,179 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import pygame
+
+from sprite_atlas import SpriteAtlas
+
+# Persistent on-disk cache of baked assets, so a launch (or a worker
+# process) does not rasterize the same sprites and text again. Two files per
+# variant and resolution:
+#
+#   <variant>-<w>x<h>-<hash>.atlas  the packed sprite atlas
+#   <variant>-<w>x<h>-<hash>.text   rendered text (HUD strings, matrix glyphs)
+#
+# <hash> covers the variant's source file (its draw code), the modules that
+# bake and render, the pygame/SDL versions and CACHE_VERSION, so changing
+# any drawing code simply misses the cache; stale files of the same variant
+# and resolution are deleted when a new one is written.
+#
+# File layout: b'RGAC', format version byte, index length (uint32 LE), JSON
+# index, then raw RGBA pixel blobs at the offsets the index gives (relative
+# to the end of the index). Files are memory-mapped and each surface is
+# created straight from the mapping; they are written to a temporary file
+# and renamed, so a reader never sees half a file.
+
+MAGIC = b'RGAC'
+FORMAT_VERSION = 1
+CACHE_VERSION = 1  # bump to invalidate every cache file
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose code ends up in baked pixels, besides the variant itself
+BAKE_SOURCES = ['sprite_atlas.py', 'text_cache.py', 'rng.py']
+
+
+def default_directory():
+    # $RETRO_GAME_CACHE, else the XDG cache directory
+    directory = os.environ.get('RETRO_GAME_CACHE')
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'retro-game')
+
+
+def source_hash(paths):
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}|{pygame.version.ver}|{pygame.version.SDL}".encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _write(path, index, blobs):
+    encoded = json.dumps(index).encode('utf-8')
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + bytes([FORMAT_VERSION]) + struct.pack('<I', len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+
+def _read(path, load):
+    # Calls load(index, pixels) with pixels a memoryview of the blobs
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            if mapping[:4] != MAGIC or mapping[4] != FORMAT_VERSION:
+                raise ValueError(f"{path} is not an asset cache file of this version")
+            (length,) = struct.unpack_from('<I', mapping, 5)
+            start = 9 + length
+            index = json.loads(mapping[9:start].decode('utf-8'))
+            pixels = memoryview(mapping)[start:]
+            try:
+                return load(index, pixels)
+            finally:
+                pixels.release()
+
+
+def _surface(pixels, offset, size):
+    # A surface of its own (in the display's format when there is a
+    # display); the view of the mapping is dropped before the file closes
+    view = pygame.image.frombuffer(pixels[offset:offset + size[0] * size[1] * 4], size, 'RGBA')
+    if pygame.display.get_surface() is not None:
+        return view.convert_alpha()
+    return view.copy()
+
+
+class AssetCache:
+    def __init__(self, directory, variant, resolution, source_file):
+        self.directory = directory
+        self.variant = variant
+        self.prefix = f"{variant}-{resolution[0]}x{resolution[1]}"
+        sources = [source_file] + [os.path.join(GAME_DIR, name) for name in BAKE_SOURCES]
+        self.hash = source_hash(sources)
+        self.text_keys = set()  # text entries the cache file already has
+
+    def path(self, kind):
+        return os.path.join(self.directory, f"{self.prefix}-{self.hash}.{kind}")
+
+    def _save(self, kind, index, blobs):
+        # Failing to write the cache only costs the next launch some baking
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write(self.path(kind), index, blobs)
+        except OSError as e:
+            print(f"Could not write asset cache {self.path(kind)}: {e}")
+            return False
+        for stale in glob.glob(os.path.join(self.directory, f"{self.prefix}-*.{kind}")):
+            if stale != self.path(kind):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return True
+
+    def _load(self, kind, load):
+        # None on a miss; unreadable files count as misses and get rewritten
+        path = self.path(kind)
+        if not os.path.exists(path):
+            return None
+        try:
+            return _read(path, load)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            print(f"Ignoring asset cache {path}: {e}")
+            return None
+
+    def load_atlas(self, padding=None):
+        def load(index, pixels):
+            atlas = SpriteAtlas() if padding is None else SpriteAtlas(padding)
+            atlas.surface = _surface(pixels, 0, tuple(index['size']))
+            atlas.frames = {key: [(pygame.Rect(area), offset_x, offset_y)
+                                  for area, offset_x, offset_y in frames]
+                            for key, frames in index['frames'].items()}
+            return atlas
+        return self._load('atlas', load)
+
+    def save_atlas(self, atlas):
+        index = {
+            'size': list(atlas.surface.get_size()),
+            'frames': {key: [[list(area), offset_x, offset_y] for area, offset_x, offset_y in frames]
+                       for key, frames in atlas.frames.items()},
+        }
+        return self._save('atlas', index, [pygame.image.tobytes(atlas.surface, 'RGBA')])
+
+    def load_text(self, cache):
+        # Puts every cached text surface into a text_cache.TextCache
+        def load(index, pixels):
+            for text, size, color, antialias, face, offset, surface_size in index['entries']:
+                key = (text, size, tuple(color), antialias, face)
+                cache.preload(key, _surface(pixels, offset, tuple(surface_size)))
+                self.text_keys.add(key)
+            return len(index['entries'])
+        return self._load('text', load) or 0
+
+    def save_text(self, cache):
+        # Rewrites the text file when the session rendered text it lacked.
+        # Only per-pixel-alpha (antialiased) text survives the RGBA round trip.
+        entries = [(key, surface) for key, surface in cache.entries.items()
+                   if surface.get_flags() & pygame.SRCALPHA]
+        if not entries or {key for key, _ in entries} <= self.text_keys:
+            return False
+        index_entries = []
+        blobs = []
+        offset = 0
+        for (text, size, color, antialias, face), surface in entries:
+            blob = pygame.image.tobytes(surface, 'RGBA')
+            index_entries.append([text, size, list(color), antialias, face, offset, list(surface.get_size())])
+            blobs.append(blob)
+            offset += len(blob)
+        if not self._save('text', {'entries': index_entries}, blobs):
+            return False
+        self.text_keys = {key for key, _ in entries}
+        return True
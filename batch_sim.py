@@ -0,0 +1,246 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Batch simulator for balance sweeps: every combination of the swept
+# parameters is played `repeats` times (seeds seed, seed + 1, ...; the same
+# seeds for every combination) by headless games spread over a process pool.
+#
+#   python batch_sim.py --variant retro_game_it_crowd --sweep ENEMY_SPEED=1,2,3 \
+#       --sweep enemy_spawn_delay=40,80 --repeats 8 --frames 20000 --input random
+#
+# A run ends after --frames frames or once --max-escaped enemies got past the
+# player; its survival time is the frame it ended on. There is no way to die
+# in the games, so letting too many enemies through is the loss condition.
+#
+# Runs are dispatched to the workers in chunks. Each worker imports pygame
+# and the game once (in the pool initializer) and then plays all of its
+# runs; results stream back one per run through a bounded queue, so a slow
+# consumer throttles the workers instead of piling results up in memory.
+# A worker that dies (killed, out of memory) fails the sweep with
+# BrokenProcessPool rather than leaving it waiting for the lost runs.
+
+# Sweepable parameters: module constants read when entities are created,
+# and Game attributes set on every new game
+CONSTANTS = ('PLAYER_SPEED', 'BULLET_SPEED', 'ENEMY_SPEED')
+ATTRIBUTES = ('enemy_spawn_delay',)
+
+RESULT_FIELDS = ('score', 'survival_frames', 'enemies_escaped')
+
+# Per-worker state set up by _init_worker
+_worker = None
+
+
+def parse_sweep(text):
+    # "ENEMY_SPEED=1,2,3" -> ('ENEMY_SPEED', [1, 2, 3])
+    name, _, values = text.partition('=')
+    if name not in CONSTANTS + ATTRIBUTES:
+        raise argparse.ArgumentTypeError(
+            f"cannot sweep {name!r}, expected one of: {', '.join(CONSTANTS + ATTRIBUTES)}")
+    try:
+        return name, [int(value) for value in values.split(',') if value]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text!r}: values must be comma-separated integers")
+
+
+def make_runs(sweeps, repeats, seed):
+    # One (params, seed) pair per run
+    names = [name for name, _ in sweeps]
+    runs = []
+    for values in itertools.product(*[values for _, values in sweeps]):
+        params = dict(zip(names, values))
+        for repeat in range(repeats):
+            runs.append((params, seed + repeat))
+    return runs
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _init_worker(variant, options, results):
+    # Runs once per worker process: pays for the imports and game module
+    # set-up before the first run
+    global _worker
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import headless
+    module = headless.load_variant(variant)
+    _worker = {
+        'headless': headless,
+        'module': module,
+        'defaults': {name: getattr(module, name) for name in CONSTANTS},
+        'options': options,
+        'results': results,
+    }
+
+
+def _run_chunk(chunk):
+    # Plays a chunk of runs in this worker, putting each result on the queue
+    for params, seed in chunk:
+        _worker['results'].put(play(params, seed, **_worker['options']))
+    return len(chunk)
+
+
+def play(params, seed, frames, input_text, max_escaped, character, entity_store):
+    headless = _worker['headless']
+    module = _worker['module']
+    for name, default in _worker['defaults'].items():
+        setattr(module, name, params.get(name, default))
+    game = headless.create_game(module, character, seed=seed, entity_store=entity_store)
+    for name in ATTRIBUTES:
+        if name in params:
+            setattr(game, name, params[name])
+    script = headless.make_input(input_text, seed)
+
+    apply_input = game.apply_input
+    update = game.update
+    start = time.perf_counter()
+    frame = 0
+    while frame < frames:
+        if script is not None:
+            apply_input(*script.frame(frame))
+        update()
+        frame += 1
+        if max_escaped and game.enemies_escaped >= max_escaped:
+            break
+    return {
+        'params': params,
+        'seed': seed,
+        'score': game.score,
+        'survival_frames': frame,
+        'enemies_escaped': game.enemies_escaped,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def aggregate(results, names):
+    # params -> runs, mean/min/max of every result field
+    groups = {}
+    for result in results:
+        key = tuple(result['params'][name] for name in names)
+        groups.setdefault(key, []).append(result)
+    table = []
+    for key in sorted(groups):
+        runs = groups[key]
+        row = dict(zip(names, key))
+        row['runs'] = len(runs)
+        for field in RESULT_FIELDS:
+            values = [run[field] for run in runs]
+            row[field] = (sum(values) / len(values), min(values), max(values))
+        table.append(row)
+    return table
+
+
+def print_table(table, names):
+    header = ''.join(f"{name:>18}" for name in names) + f"{'runs':>6}" + \
+        ''.join(f"{field + ' (mean/min/max)':>34}" for field in RESULT_FIELDS)
+    print(header)
+    for row in table:
+        line = ''.join(f"{row[name]:>18}" for name in names) + f"{row['runs']:>6}"
+        for field in RESULT_FIELDS:
+            mean, low, high = row[field]
+            line += f"{mean:>18.1f}{low:>8}{high:>8}"
+        print(line)
+
+
+def run_sweep(variant, sweeps, repeats=4, seed=1, workers=None, chunk_size=None,
+              queue_size=256, output=None, progress=True, **options):
+    # Returns the aggregated table; per-run rows are written to output (CSV)
+    # as they arrive
+    names = [name for name, _ in sweeps]
+    runs = make_runs(sweeps, repeats, seed)
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # Several chunks per worker, so uneven runs still balance out
+        chunk_size = max(1, len(runs) // (workers * 4))
+
+    context = multiprocessing.get_context()
+    results_queue = context.Queue(queue_size)
+    writer = None
+    if output is not None:
+        writer = csv.writer(output)
+        writer.writerow(names + ['seed'] + list(RESULT_FIELDS) + ['seconds'])
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(variant, options, results_queue)) as pool:
+        chunks = [pool.submit(_run_chunk, chunk) for chunk in chunked(runs, chunk_size)]
+        try:
+            while len(results) < len(runs):
+                try:
+                    result = results_queue.get(timeout=0.5)
+                except queue.Empty:
+                    for chunk in chunks:
+                        if chunk.done() and chunk.exception() is not None:
+                            chunk.result()  # re-raises the worker's exception or BrokenProcessPool
+                    continue
+                results.append(result)
+                if writer is not None:
+                    writer.writerow([result['params'][name] for name in names] + [result['seed']] +
+                                    [result[field] for field in RESULT_FIELDS] + [f"{result['seconds']:.4f}"])
+                if progress and (len(results) % max(1, len(runs) // 20) == 0 or len(results) == len(runs)):
+                    print(f"  {len(results)}/{len(runs)} runs", file=sys.stderr)
+        except BaseException:
+            # Drop the chunks not started yet, and keep emptying the queue so
+            # the running ones are not left blocked on it while the pool
+            # shuts down
+            for chunk in chunks:
+                chunk.cancel()
+            while not all(chunk.done() for chunk in chunks):
+                try:
+                    results_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        for chunk in chunks:
+            chunk.result()
+    elapsed = time.perf_counter() - start
+
+    frames = sum(result['survival_frames'] for result in results)
+    print(f"{len(runs)} runs, {frames} frames in {elapsed:.1f}s on {workers} workers "
+          f"({frames / elapsed if elapsed > 0 else 0:.0f} simulated FPS)")
+    return aggregate(results, names)
+
+
+def main(argv=None):
+    import headless
+
+    parser = argparse.ArgumentParser(description="Sweep game parameters over many headless runs.")
+    parser.add_argument('--variant', choices=sorted(headless.VARIANTS), default='retro_game_it_crowd')
+    parser.add_argument('--sweep', type=parse_sweep, action='append', default=[], metavar='NAME=V1,V2,...',
+                        help=f"parameter values to sweep (repeatable): {', '.join(CONSTANTS + ATTRIBUTES)}")
+    parser.add_argument('--repeats', type=int, default=4, help="runs (seeds) per parameter combination")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the first repeat")
+    parser.add_argument('--frames', type=int, default=10000, help="frame limit per run")
+    parser.add_argument('--max-escaped', type=int, default=10,
+                        help="end a run once this many enemies escaped (0: never)")
+    parser.add_argument('--input', default='random',
+                        help="player: input script, @file, or 'random' (see headless.py)")
+    parser.add_argument('--character', choices=headless.CHARACTERS, default='moss')
+    parser.add_argument('--entity-store', action='store_true')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=None, help="runs per dispatched task")
+    parser.add_argument('--queue-size', type=int, default=256, help="results in flight before workers wait")
+    parser.add_argument('--output', type=argparse.FileType('w'), default=None,
+                        help="write one CSV row per run to this file")
+    args = parser.parse_args(argv)
+
+    sweeps = args.sweep or [('ENEMY_SPEED', [1])]
+    table = run_sweep(args.variant, sweeps, repeats=args.repeats, seed=args.seed, workers=args.workers,
+                      chunk_size=args.chunk_size, queue_size=args.queue_size, output=args.output,
+                      frames=args.frames, input_text=args.input, max_escaped=args.max_escaped,
+                      character=args.character, entity_store=args.entity_store)
+    print_table(table, [name for name, _ in sweeps])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
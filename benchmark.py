@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not on Windows; peak memory is then not reported
+    resource = None
+
+# Scenario benchmark suite. Every (variant, scenario) pair runs in its own
+# subprocess under the SDL dummy video driver, stepping input, simulation
+# and drawing one frame at a time and timing each phase:
+#
+#   handle_events     event pump
+#   update            Game.update() minus collision checks
+#   check_collisions
+#   draw              Game.draw() minus presenting the frame
+#   flip              pygame.display.flip() / update()
+#
+# Results (per-phase mean and percentiles in milliseconds, peak RSS) are
+# printed and written as JSON; --baseline compares against an earlier JSON
+# file and exits non-zero on regressions.
+#
+#   python benchmark.py --output results.json
+#   python benchmark.py --scenario enemies_500 --baseline results.json
+
+PHASES = ('handle_events', 'update', 'check_collisions', 'draw', 'flip')
+PERCENTILES = (50, 90, 99)
+SEED = 1
+
+# Time below which a slowdown is treated as noise, in milliseconds
+NOISE_FLOOR_MS = 0.05
+
+
+def populate(count):
+    # Stationary enemies scattered over the playfield (no natural spawning)
+    def setup(game, module):
+        game.enemy_spawn_delay = 10 ** 9
+        rng = random.Random(count)
+        types = getattr(module, 'ENEMY_TYPES', None)
+        for i in range(count):
+            x = rng.randint(0, module.SCREEN_WIDTH - 50)
+            y = rng.randint(40, module.SCREEN_HEIGHT - 160)
+            if types:
+                enemy = game.spawn_enemy(x, y, types[i % len(types)])
+            else:
+                enemy = game.spawn_enemy(x, y)
+            enemy.speed = 0
+    return setup
+
+
+def explosions_every(frames, count):
+    # Bursts of explosions spread over the screen
+    def each_frame(game, module, n):
+        if n % frames == 0:
+            for i in range(count):
+                game.explode((i * 97 + n * 13) % module.SCREEN_WIDTH,
+                             (i * 53 + n * 7) % module.SCREEN_HEIGHT)
+    return each_frame
+
+
+# name -> frames, input script (see headless.py), setup(game, module),
+# each_frame(game, module, n), required Game method, start character
+SCENARIOS = {
+    'menu': {'frames': 600, 'input': '-', 'character': 'menu', 'requires': 'start_game'},
+    'enemies_50': {'frames': 600, 'input': 'S,-*9', 'setup': populate(50)},
+    'enemies_500': {'frames': 600, 'input': 'S,-*9', 'setup': populate(500)},
+    'enemies_5000': {'frames': 300, 'input': 'S,-*9', 'setup': populate(5000)},
+    'bullet_spam': {'frames': 1200, 'input': 'SR*30,SL*30', 'setup': populate(100)},
+    'mass_explosions': {'frames': 600, 'input': '-', 'requires': 'explode',
+                        'each_frame': explosions_every(10, 100)},
+    'long_session': {'frames': 10000, 'input': 'random'},
+}
+
+
+def summarize(samples):
+    # samples in seconds -> stats in milliseconds
+    ordered = sorted(samples)
+    n = len(ordered)
+    stats = {'mean_ms': sum(ordered) / n * 1000}
+    for p in PERCENTILES:
+        stats[f'p{p}_ms'] = ordered[min(n - 1, int(n * p / 100))] * 1000
+    stats['max_ms'] = ordered[-1] * 1000
+    return stats
+
+
+def run_scenario(variant, scenario, frames=None, **options):
+    # Runs one benchmark in this process and returns its result dict
+    import headless
+    import pygame
+
+    spec = SCENARIOS[scenario]
+    module = headless.load_variant(variant)
+    game = module.Game(seed=SEED, **options)
+    if hasattr(game, 'bake_assets'):
+        # Time frames, not sprite baking (skipped when the asset cache is warm)
+        game.bake_assets(None)
+    if spec.get('character', 'moss') != 'menu' and hasattr(game, 'start_game'):
+        game.start_game(spec.get('character', 'moss'))
+    if 'setup' in spec:
+        spec['setup'](game, module)
+    each_frame = spec.get('each_frame')
+    script = headless.make_input(spec['input'], SEED)
+    frames = frames or spec['frames']
+
+    # Time presenting the frame and collision checks separately from the
+    # phases that call them
+    clock = time.perf_counter
+    timing = {'flip': 0.0, 'check_collisions': 0.0}
+
+    def timed(name, function):
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timing[name] += clock() - start
+        return wrapper
+
+    pygame.display.flip = timed('flip', pygame.display.flip)
+    pygame.display.update = timed('flip', pygame.display.update)
+    game.check_collisions = timed('check_collisions', game.check_collisions)
+
+    samples = {name: [] for name in PHASES}
+    samples['frame'] = []
+    start = clock()
+    for n in range(frames):
+        timing['flip'] = timing['check_collisions'] = 0.0
+        t0 = clock()
+        game.handle_events()
+        t1 = clock()
+        if each_frame is not None:
+            each_frame(game, module, n)
+        game.apply_input(*script.frame(n))
+        game.update()
+        t2 = clock()
+        game.draw()
+        t3 = clock()
+        samples['handle_events'].append(t1 - t0)
+        samples['update'].append(t2 - t1 - timing['check_collisions'])
+        samples['check_collisions'].append(timing['check_collisions'])
+        samples['draw'].append(t3 - t2 - timing['flip'])
+        samples['flip'].append(timing['flip'])
+        samples['frame'].append(t3 - t0)
+    elapsed = clock() - start
+
+    peak_rss_kb = None
+    if resource is not None:
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':  # bytes there, kilobytes on Linux
+            peak_rss_kb //= 1024
+    return {
+        'variant': variant,
+        'scenario': scenario,
+        'options': options,
+        'frames': frames,
+        'fps': frames / elapsed if elapsed > 0 else None,
+        'score': game.score,
+        'enemies': len(game.enemies),
+        'phases': {name: summarize(values) for name, values in samples.items()},
+        'peak_rss_kb': peak_rss_kb,
+    }
+
+
+def run_in_subprocess(variant, scenario, frames=None, options=None):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', variant, scenario,
+               '--options', json.dumps(options or {})]
+    if frames:
+        command += ['--frames', str(frames)]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{variant}/{scenario} failed:\n{completed.stderr}")
+    # The worker prints its result as the last line (pygame may print first)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def applicable(variant, scenario):
+    # Whether a variant has what a scenario needs (only it-crowd.py has a
+    # menu, retro_game.py has no explosions)
+    import headless
+    required = SCENARIOS[scenario].get('requires')
+    if required is None:
+        return True
+    return hasattr(headless.load_variant(variant).Game, required)
+
+
+def compare(results, baseline, threshold):
+    # Phases (by mean and p90) slower than the baseline by more than
+    # threshold, ignoring differences under the noise floor
+    previous = {(r['variant'], r['scenario'], json.dumps(r['options'], sort_keys=True)): r
+                for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = (result['variant'], result['scenario'], json.dumps(result['options'], sort_keys=True))
+        old = previous.get(key)
+        if old is None:
+            continue
+        for phase, stats in result['phases'].items():
+            old_stats = old['phases'].get(phase)
+            if old_stats is None:
+                continue
+            for stat in ('mean_ms', 'p90_ms'):
+                before, after = old_stats[stat], stats[stat]
+                if after - before > NOISE_FLOOR_MS and after > before * (1 + threshold):
+                    regressions.append({
+                        'variant': result['variant'],
+                        'scenario': result['scenario'],
+                        'phase': phase,
+                        'stat': stat,
+                        'baseline_ms': before,
+                        'current_ms': after,
+                        'change': after / before - 1 if before else None,
+                    })
+    return regressions
+
+
+def environment():
+    import pygame
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': numpy_version,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def main(argv=None):
+    import headless
+
+    parser = argparse.ArgumentParser(description="Run the scenario benchmark suite.")
+    parser.add_argument('--variant', action='append', choices=sorted(headless.VARIANTS),
+                        help="variant to run (repeatable; default: all)")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument('--frames', type=int, default=None,
+                        help="override every scenario's frame count")
+    parser.add_argument('--entity-store', action='store_true')
+    parser.add_argument('--dirty-rects', action='store_true')
+    parser.add_argument('--output', metavar='FILE', default=None, help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', default=None,
+                        help="JSON results to compare against; exits 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (default 0.10)")
+    parser.add_argument('--worker', nargs=2, metavar=('VARIANT', 'SCENARIO'), help=argparse.SUPPRESS)
+    parser.add_argument('--options', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    if args.worker:
+        result = run_scenario(*args.worker, frames=args.frames, **json.loads(args.options))
+        print(json.dumps(result))
+        return 0
+
+    options = {}
+    if args.entity_store:
+        options['entity_store'] = True
+    if args.dirty_rects:
+        options['dirty_rects'] = True
+
+    results = []
+    for variant in args.variant or list(headless.VARIANTS):
+        for scenario in args.scenario or list(SCENARIOS):
+            if not applicable(variant, scenario):
+                continue
+            result = run_in_subprocess(variant, scenario, args.frames, options)
+            results.append(result)
+            phases = result['phases']
+            print(f"{variant:20} {scenario:16} {result['fps']:8.0f} FPS  "
+                  f"frame p50 {phases['frame']['p50_ms']:6.2f} ms  p99 {phases['frame']['p99_ms']:6.2f} ms  "
+                  f"update {phases['update']['mean_ms']:6.2f}  collisions {phases['check_collisions']['mean_ms']:6.2f}  "
+                  f"draw {phases['draw']['mean_ms']:6.2f}  flip {phases['flip']['mean_ms']:5.2f}  "
+                  f"peak {result['peak_rss_kb'] or 0:7d} KB")
+
+    report = {'environment': environment(), 'results': results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        report['regressions'] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['variant']}/{r['scenario']} {r['phase']} {r['stat']}: "
+                  f"{r['baseline_ms']:.3f} -> {r['current_ms']:.3f} ms")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import pygame
+
+from rng import fx_random
+from timestep import interpolate
+
+# World-to-screen camera. Screen shake, panning and zoom are applied to the
+# positions entities are drawn at, so the game layer is drawn straight onto
+# the screen instead of into a frame-sized intermediate surface. Entities are
+# drawn alpha of the way from their previous simulation tick to the latest
+# one (see timestep.py).
+
+
+class Camera:
+    def __init__(self, viewport_size):
+        self.viewport_width, self.viewport_height = viewport_size
+        # World point shown at the centre of the viewport
+        self.center_x = self.viewport_width / 2
+        self.center_y = self.viewport_height / 2
+        self.zoom = 1.0
+        self.shake_x = 0
+        self.shake_y = 0
+        self.alpha = 1.0
+        self._update_transform()
+
+    def pan_to(self, x, y):
+        self.center_x = x
+        self.center_y = y
+        self._update_transform()
+
+    def pan_by(self, dx, dy):
+        self.pan_to(self.center_x + dx, self.center_y + dy)
+
+    def set_zoom(self, zoom):
+        self.zoom = max(0.05, zoom)
+        self._update_transform()
+
+    def begin_frame(self, screen_shake=0, alpha=1.0):
+        # Same offsets, drawn the same way, as the old per-frame shake surface
+        self.alpha = alpha
+        if screen_shake > 0:
+            self.shake_x = fx_random.randint(-screen_shake, screen_shake)
+            self.shake_y = fx_random.randint(-screen_shake, screen_shake)
+        else:
+            self.shake_x = self.shake_y = 0
+        self._update_transform()
+
+    def _update_transform(self):
+        # screen = world * zoom + offset
+        self.offset_x = self.viewport_width / 2 - self.center_x * self.zoom + self.shake_x
+        self.offset_y = self.viewport_height / 2 - self.center_y * self.zoom + self.shake_y
+
+    def to_screen(self, x, y):
+        return (round(x * self.zoom + self.offset_x), round(y * self.zoom + self.offset_y))
+
+    def to_world(self, x, y):
+        return ((x - self.offset_x) / self.zoom, (y - self.offset_y) / self.zoom)
+
+    def scale(self, length):
+        return max(1, round(length * self.zoom))
+
+    def rect_to_screen(self, x, y, width, height):
+        # Screen rect covering a world rect (rounded outwards)
+        left, top = self.to_screen(x, y)
+        return pygame.Rect(left - 1, top - 1, self.scale(width) + 2, self.scale(height) + 2)
+
+    def bounds(self, entity, padding=0):
+        # Screen rect covering an entity's box grown by padding on every side
+        x, y = interpolate(entity, self.alpha)
+        return self.rect_to_screen(x - padding, y - padding,
+                                   entity.width + 2 * padding, entity.height + 2 * padding)
+
+    def draw(self, screen, entity, atlas=None):
+        # Baked sprites are blitted at the transformed position (from an atlas
+        # scaled to the current zoom). Anything else is drawn procedurally
+        # with its position temporarily moved to screen space; zoom then only
+        # affects where it is drawn, not its size.
+        if atlas is not None and hasattr(entity, 'sprite_frame'):
+            key, index = entity.sprite_frame()
+            if key in atlas:
+                x, y = self.to_screen(*interpolate(entity, self.alpha))
+                return atlas.at_zoom(self.zoom).blit(screen, key, index, x, y)
+
+        x, y = entity.x, entity.y
+        entity.x, entity.y = self.to_screen(*interpolate(entity, self.alpha))
+        try:
+            entity.draw(screen)
+        finally:
+            entity.x, entity.y = x, y
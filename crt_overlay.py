@@ -0,0 +1,149 @@
+import math
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:  # only the curvature effect needs NumPy
+    np = None
+
+# CRT post-processing. Everything that does not depend on the frame's content
+# (scanlines, vignette, phosphor tint) is baked once per resolution into one
+# RLE-accelerated overlay, so applying it is a single blit that skips the
+# transparent runs. Curvature is a precomputed lookup table applied with one
+# gather per frame.
+
+EFFECTS = ('scanlines', 'vignette', 'tint', 'curvature')
+
+SCANLINE_COLOR = (0, 50, 0)
+SCANLINE_SPACING = 4
+VIGNETTE_ALPHA = 170        # darkening in the corners, 0-255
+TINT_COLOR = (60, 255, 120)
+TINT_ALPHA = 16
+CURVATURE = 0.08            # barrel distortion strength
+
+# Vignette and tint are smooth, so they are computed at this resolution and
+# scaled up
+GRADIENT_SIZE = (80, 60)
+
+
+def parse_effects(text):
+    # "scanlines,vignette" -> ('scanlines', 'vignette'); "none" -> ()
+    if not text or text == 'none':
+        return ()
+    effects = tuple(name.strip() for name in text.split(',') if name.strip())
+    for name in effects:
+        if name not in EFFECTS:
+            raise ValueError(f"Unknown CRT effect {name!r}, expected one of: {', '.join(EFFECTS)}")
+    return effects
+
+
+class CRTOverlay:
+    def __init__(self, size, effects=('scanlines',)):
+        for name in effects:
+            if name not in EFFECTS:
+                raise ValueError(f"Unknown CRT effect {name!r}, expected one of: {', '.join(EFFECTS)}")
+        if 'curvature' in effects and np is None:
+            raise RuntimeError("The curvature effect requires NumPy")
+        self.size = tuple(size)
+        self.effects = frozenset(effects)
+        self.overlay = None
+        self.curvature_lut = None
+        self._curvature_buffer = None
+
+        if self.effects & {'scanlines', 'vignette', 'tint'}:
+            self.overlay = self._build_overlay()
+        if 'curvature' in self.effects:
+            self.curvature_lut = self._build_curvature_lut()
+
+    def apply(self, screen):
+        if self.curvature_lut is not None:
+            self._apply_curvature(screen)
+        if self.overlay is not None:
+            screen.blit(self.overlay, (0, 0))
+
+    def _build_overlay(self):
+        width, height = self.size
+        if self.effects & {'vignette', 'tint'}:
+            overlay = pygame.transform.smoothscale(self._build_gradient(), self.size)
+        else:
+            overlay = pygame.Surface(self.size, pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, 0))
+
+        if 'scanlines' in self.effects:
+            for y in range(0, height, SCANLINE_SPACING):
+                pygame.draw.line(overlay, SCANLINE_COLOR, (0, y), (width, y))
+
+        if pygame.display.get_surface() is not None:
+            overlay = overlay.convert_alpha()
+        overlay.set_alpha(255, pygame.RLEACCEL)
+        return overlay
+
+    def _build_gradient(self):
+        # Vignette composited over the tint into a single RGBA layer
+        gradient = pygame.Surface(GRADIENT_SIZE, pygame.SRCALPHA)
+        grad_w, grad_h = GRADIENT_SIZE
+        tint_alpha = TINT_ALPHA / 255 if 'tint' in self.effects else 0.0
+        for gy in range(grad_h):
+            for gx in range(grad_w):
+                vignette_alpha = 0.0
+                if 'vignette' in self.effects:
+                    nx = (gx + 0.5) / grad_w * 2 - 1
+                    ny = (gy + 0.5) / grad_h * 2 - 1
+                    distance = min(1.0, math.hypot(nx, ny) / math.sqrt(2))
+                    vignette_alpha = VIGNETTE_ALPHA / 255 * distance ** 2.5
+                alpha = vignette_alpha + tint_alpha * (1 - vignette_alpha)
+                if alpha <= 0:
+                    gradient.set_at((gx, gy), (0, 0, 0, 0))
+                    continue
+                # Vignette is black, so only the tint contributes colour
+                weight = tint_alpha * (1 - vignette_alpha) / alpha
+                color = [int(c * weight) for c in TINT_COLOR]
+                gradient.set_at((gx, gy), (*color, int(alpha * 255)))
+        return gradient
+
+    def _build_curvature_lut(self):
+        # For every output pixel, the flat index of the source pixel it shows;
+        # pixels that fall outside the curved screen read a black border pixel
+        width, height = self.size
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float64)
+        nx = xs / (width - 1) * 2 - 1
+        ny = ys / (height - 1) * 2 - 1
+        r2 = nx * nx + ny * ny
+        sx = nx * (1 + CURVATURE * r2)
+        sy = ny * (1 + CURVATURE * r2)
+        src_x = np.rint((sx + 1) / 2 * (width - 1)).astype(np.int64)
+        src_y = np.rint((sy + 1) / 2 * (height - 1)).astype(np.int64)
+        outside = (src_x < 0) | (src_x >= width) | (src_y < 0) | (src_y >= height)
+        lut = src_y * width + src_x
+        # One extra pixel past the frame holds black
+        lut[outside] = width * height
+        self._curvature_buffer = np.zeros(width * height + 1, dtype=np.uint32)
+        return lut.ravel()
+
+    def _apply_curvature(self, screen):
+        # pixels2d is (width, height); its transpose is row-major and, for a
+        # 32-bit screen without row padding, contiguous
+        pixels = pygame.surfarray.pixels2d(screen).T
+        buffer = self._curvature_buffer
+        if pixels.flags.c_contiguous:
+            flat = pixels.reshape(-1)
+            buffer[:-1] = flat
+            np.take(buffer, self.curvature_lut, out=flat)
+        else:
+            buffer[:-1] = pixels.reshape(-1)
+            pixels[...] = buffer[self.curvature_lut].reshape(pixels.shape)
+        del pixels
+
+
+_overlays = {}
+
+
+def get_overlay(size, effects=('scanlines',)):
+    # One overlay per resolution and effect set, built on first use
+    key = (tuple(size), tuple(effects))
+    overlay = _overlays.get(key)
+    if overlay is None:
+        overlay = CRTOverlay(size, effects)
+        _overlays[key] = overlay
+    return overlay
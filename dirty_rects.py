@@ -0,0 +1,142 @@
+import pygame
+
+# Opt-in dirty-rectangle renderer. Each frame the game lists the screen areas
+# it is about to draw into; those plus the areas drawn last frame are the
+# only regions cleared, redrawn and presented with
+# pygame.display.update(rect_list). When too much of the screen changed (or
+# after an invalidate()), the frame is drawn and flipped in full.
+#
+# Frame order:
+#   renderer.begin_frame(rects, hud_blocks, hud_key)
+#   renderer.erase(screen)
+#   ...draw background and entities as usual...
+#   renderer.draw_hud(screen, draw_ui)
+#   renderer.apply_overlay(screen, crt)
+#   renderer.present()
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen_size, full_redraw_ratio=0.5, background=(0, 0, 0),
+                 overlay=None, log=None):
+        self.screen_rect = pygame.Rect((0, 0), screen_size)
+        self.screen_area = self.screen_rect.width * self.screen_rect.height
+        self.full_redraw_ratio = full_redraw_ratio
+        self.background = background
+        self.log = log  # optional file: one "frame,dirty_percent,full" line per frame
+
+        # Only scanlines can be re-applied to part of a frame; other CRT
+        # effects touch every pixel, so with them every frame is full
+        self.supported = overlay is None or overlay.effects <= {'scanlines'}
+
+        self.previous = []
+        self.dirty = []
+        self.hud_boxes = []
+        self.hud_key = None
+        self.full = True
+        self.force_full = True
+
+        # Stats
+        self.frame = 0
+        self.full_frames = 0
+        self.dirty_percent = 100.0
+        self.total_percent = 0.0
+        if self.log is not None:
+            self.log.write("frame,dirty_percent,full\n")
+
+    def invalidate(self):
+        # Next frame is drawn in full (first frame, state changes, expose)
+        self.force_full = True
+
+    def begin_frame(self, rects, hud_blocks=(), hud_key=None):
+        # rects: every area the frame will draw into outside the HUD
+        # hud_blocks: fixed HUD areas, redrawn clipped to whatever changed
+        # hud_key: any value that changes when the HUD's content changes
+        screen_rect = self.screen_rect
+        current = []
+        for rect in rects:
+            rect = pygame.Rect(rect).clip(screen_rect)
+            if rect.width and rect.height:
+                current.append(rect)
+
+        hud_changed = hud_key != self.hud_key
+        self.hud_key = hud_key
+
+        dirty = self.previous + current
+        self.previous = current
+        blocks = [pygame.Rect(block).clip(screen_rect) for block in hud_blocks]
+        if hud_changed:
+            dirty.extend(blocks)
+        self.dirty = self._merge(dirty)
+
+        # The HUD is drawn over the game, so it is redrawn exactly where the
+        # game below it was redrawn. Merged rects never overlap, so neither
+        # do these boxes.
+        self.hud_boxes = [rect.clip(block) for block in blocks
+                          for rect in self.dirty if rect.colliderect(block)]
+
+        area = sum(rect.width * rect.height for rect in self.dirty)
+        ratio = area / self.screen_area
+        self.full = (self.force_full or not self.supported or ratio > self.full_redraw_ratio)
+        self.force_full = False
+        if self.full:
+            self.dirty = [screen_rect.copy()]
+            self.hud_boxes = []
+            ratio = 1.0
+            self.full_frames += 1
+
+        self.frame += 1
+        self.dirty_percent = ratio * 100
+        self.total_percent += self.dirty_percent
+        if self.log is not None:
+            self.log.write(f"{self.frame},{self.dirty_percent:.2f},{int(self.full)}\n")
+
+    def erase(self, screen):
+        if self.full:
+            screen.fill(self.background)
+            return
+        for rect in self.dirty:
+            screen.fill(self.background, rect)
+
+    def draw_hud(self, screen, draw_ui):
+        if self.full:
+            draw_ui()
+            return
+        clip = screen.get_clip()
+        for box in self.hud_boxes:
+            screen.set_clip(box)
+            draw_ui()
+        screen.set_clip(clip)
+
+    def apply_overlay(self, screen, crt):
+        if crt is None:
+            return
+        if self.full or crt.overlay is None:
+            crt.apply(screen)
+            return
+        for rect in self.dirty:
+            screen.blit(crt.overlay, rect, rect)
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty)
+
+    def mean_dirty_percent(self):
+        return self.total_percent / self.frame if self.frame else 0.0
+
+    @staticmethod
+    def _merge(rects):
+        # Unions overlapping rects so no pixel is cleared, overlaid or
+        # presented twice
+        merged = []
+        for rect in rects:
+            rect = rect.copy()
+            while True:
+                hits = rect.collidelistall(merged)
+                if not hits:
+                    break
+                for index in reversed(hits):
+                    rect.union_ip(merged.pop(index))
+            merged.append(rect)
+        return merged
@@ -0,0 +1,255 @@
+# Optional NumPy structure-of-arrays store for bullets and enemies.
+#
+# Every entity lives in a slot of contiguous columns (position, size, speed,
+# type, animation timer), so movement, off-screen culling and the bullet/enemy
+# overlap test run as batch operations. Removal swaps the last live slot into
+# the hole instead of shifting a list. Game code keeps working with thin view
+# objects: a view subclasses the game's own Bullet/Enemy class, so draw() and
+# is_off_screen() are unchanged, but reads and writes x, y, ... in the store.
+# Views of removed entities are recycled by later adds, like pooled entities.
+
+try:
+    import numpy as np
+except ImportError:  # the store is optional, the games run without NumPy
+    np = None
+
+COLUMNS = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed', 'kind', 'animation_timer', 'seq')
+
+
+def available():
+    return np is not None
+
+
+def _column_property(name):
+    def get(self):
+        return int(getattr(self._store, name)[self._slot])
+
+    def set(self, value):
+        getattr(self._store, name)[self._slot] = value
+
+    return property(get, set)
+
+
+class StoreView:
+    x = _column_property('x')
+    y = _column_property('y')
+    prev_x = _column_property('prev_x')
+    prev_y = _column_property('prev_y')
+    width = _column_property('width')
+    height = _column_property('height')
+    speed = _column_property('speed')
+    animation_timer = _column_property('animation_timer')
+
+    @property
+    def alive(self):
+        return self._slot is not None
+
+
+class KindStoreView(StoreView):
+    # For stores created with kinds: enemy_type maps to the kind column
+    @property
+    def enemy_type(self):
+        return self._store.kinds[self._store.kind[self._slot]]
+
+    @enemy_type.setter
+    def enemy_type(self, value):
+        self._store.kind[self._slot] = self._store.kinds.index(value)
+
+
+class EntityStore:
+    def __init__(self, entity_class, kinds=(), capacity=1024):
+        if np is None:
+            raise RuntimeError("EntityStore requires NumPy")
+        # Views inherit drawing and the rest of the behaviour from the game class
+        self.kinds = list(kinds)
+        view_base = KindStoreView if self.kinds else StoreView
+        self.view_class = type(entity_class.__name__ + 'View', (view_base, entity_class), {})
+        self.count = 0
+        self.capacity = 0
+        self.next_seq = 0
+        self.views = []  # slot order, kept in sync with the columns
+        self.free_views = []
+        for name in COLUMNS:
+            setattr(self, name, np.zeros(0, dtype=np.int64))
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        for name in COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=np.int64)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def add(self, entity):
+        # Copies a freshly constructed Bullet/Enemy into the next slot and
+        # returns the view that replaces it
+        if self.count == self.capacity:
+            self._grow(self.capacity * 2)
+        slot = self.count
+        self.x[slot] = entity.x
+        self.y[slot] = entity.y
+        self.prev_x[slot] = getattr(entity, 'prev_x', entity.x)
+        self.prev_y[slot] = getattr(entity, 'prev_y', entity.y)
+        self.width[slot] = entity.width
+        self.height[slot] = entity.height
+        self.speed[slot] = entity.speed
+        enemy_type = getattr(entity, 'enemy_type', None)
+        self.kind[slot] = self.kinds.index(enemy_type) if enemy_type is not None else 0
+        self.animation_timer[slot] = getattr(entity, 'animation_timer', 0)
+        self.seq[slot] = self.next_seq
+        self.next_seq += 1
+        self.count += 1
+
+        if self.free_views:
+            view = self.free_views.pop()
+        else:
+            view = self.view_class.__new__(self.view_class)
+        view._store = self
+        view._slot = slot
+        self.views.append(view)
+        return view
+
+    def clear(self):
+        for view in self.views:
+            view._slot = None
+        self.free_views.extend(self.views)
+        self.views.clear()
+        self.count = 0
+
+    def move(self, direction):
+        # direction is -1 (up, bullets) or 1 (down, enemies)
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        self.y[:n] += self.speed[:n] * direction
+        self.animation_timer[:n] += 1
+
+    def cull(self, min_y=None, max_y=None):
+        # Removes entities with y < min_y or y > max_y; returns how many
+        n = self.count
+        if n == 0:
+            return 0
+        y = self.y[:n]
+        dead = np.zeros(n, dtype=bool)
+        if min_y is not None:
+            dead |= y < min_y
+        if max_y is not None:
+            dead |= y > max_y
+        slots = np.flatnonzero(dead)
+        if len(slots):
+            self.remove_slots(slots)
+        return len(slots)
+
+    def remove(self, views):
+        if views:
+            self.remove_slots(np.array([view._slot for view in views], dtype=np.int64))
+
+    def remove_slots(self, slots):
+        # Batch swap-remove: the live slots past the new end are moved into
+        # the holes left below it, so only len(slots) views change slot
+        n = self.count
+        new_count = n - len(slots)
+        dead = np.zeros(n, dtype=bool)
+        dead[slots] = True
+        holes = np.flatnonzero(dead[:new_count])
+        movers = np.flatnonzero(~dead[new_count:]) + new_count
+
+        views = self.views
+        for slot in slots.tolist():
+            views[slot]._slot = None
+            self.free_views.append(views[slot])
+        if len(holes):
+            for name in COLUMNS:
+                column = getattr(self, name)
+                column[holes] = column[movers]
+            for hole, mover in zip(holes.tolist(), movers.tolist()):
+                view = views[mover]
+                view._slot = hole
+                views[hole] = view
+        del views[new_count:]
+        self.count = new_count
+
+
+def find_hits(bullets, enemies):
+    # Bullet/enemy pairs to resolve this frame, in the same order the nested
+    # loop over spawn-ordered lists would find them: bullets in spawn order,
+    # each taking the earliest spawned overlapping enemy not already hit.
+    nb, ne = bullets.count, enemies.count
+    if nb == 0 or ne == 0:
+        return []
+
+    bx, by = bullets.x[:nb], bullets.y[:nb]
+    bw, bh = bullets.width[:nb], bullets.height[:nb]
+    ex, ey = enemies.x[:ne], enemies.y[:ne]
+    ew, eh = enemies.width[:ne], enemies.height[:ne]
+
+    # Broad phase: bucket enemies by the grid cell of their top-left corner,
+    # with cells at least as large as the largest enemy, and sort by cell.
+    # A bullet can then only hit enemies whose corner cell lies in a small
+    # block of cells, each looked up with a binary search.
+    cell = max(int(ew.max()), int(eh.max()), 1)
+    ecx, ecy = ex // cell, ey // cell
+    min_cx, min_cy = int(ecx.min()), int(ecy.min())
+    columns = int(ecx.max()) - min_cx + 1
+    rows = int(ecy.max()) - min_cy + 1
+    keys = (ecy - min_cy) * columns + (ecx - min_cx)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Enemy corners that can overlap a bullet lie in
+    # (bullet.x - enemy.width, bullet.x + bullet.width), same for y
+    bcx0 = (bx - int(ew.max()) + 1) // cell - min_cx
+    bcx1 = (bx + bw - 1) // cell - min_cx
+    bcy0 = (by - int(eh.max()) + 1) // cell - min_cy
+    bcy1 = (by + bh - 1) // cell - min_cy
+    span_x = int((bcx1 - bcx0).max()) + 1
+    span_y = int((bcy1 - bcy0).max()) + 1
+
+    bullet_index = np.arange(nb)
+    pair_bullets = []
+    pair_enemies = []
+    for dy in range(span_y):
+        qcy = bcy0 + dy
+        for dx in range(span_x):
+            qcx = bcx0 + dx
+            valid = ((qcx <= bcx1) & (qcy <= bcy1) &
+                     (qcx >= 0) & (qcx < columns) & (qcy >= 0) & (qcy < rows))
+            if not valid.any():
+                continue
+            query = (qcy * columns + qcx)[valid]
+            lo = np.searchsorted(sorted_keys, query, side='left')
+            hi = np.searchsorted(sorted_keys, query, side='right')
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            run_start = np.repeat(np.cumsum(counts) - counts, counts)
+            pair_bullets.append(np.repeat(bullet_index[valid], counts))
+            pair_enemies.append(order[np.repeat(lo, counts) + np.arange(total) - run_start])
+    if not pair_bullets:
+        return []
+
+    # Narrow phase: exact AABB overlap on the candidate pairs
+    b, e = np.concatenate(pair_bullets), np.concatenate(pair_enemies)
+    overlap = ((bx[b] < ex[e] + ew[e]) & (bx[b] + bw[b] > ex[e]) &
+               (by[b] < ey[e] + eh[e]) & (by[b] + bh[b] > ey[e]))
+    b, e = b[overlap], e[overlap]
+    if len(b) == 0:
+        return []
+
+    # Resolve in (bullet spawn order, enemy spawn order)
+    ranked = np.lexsort((enemies.seq[e], bullets.seq[b]))
+    hits = []
+    used_bullets = set()
+    used_enemies = set()
+    for bullet_slot, enemy_slot in zip(b[ranked].tolist(), e[ranked].tolist()):
+        if bullet_slot in used_bullets or enemy_slot in used_enemies:
+            continue
+        used_bullets.add(bullet_slot)
+        used_enemies.add(enemy_slot)
+        hits.append((bullets.views[bullet_slot], enemies.views[enemy_slot]))
+    return hits
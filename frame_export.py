@@ -0,0 +1,192 @@
+import pygame
+
+try:
+    import numpy as np
+except ImportError:  # frame export hands out NumPy arrays, the games run without it
+    np = None
+
+# Rendered frames as NumPy arrays, for recording and pixel-based play-testers.
+#
+#   game = module.Game(frame_export=FrameExporter(scale=4, grayscale=True))
+#   game.draw()
+#   pixels = game.frame_array()          # (600, 800, 3) uint8 view of the screen
+#   obs = game.observation('game')       # (150, 200) uint8, game layer only
+#
+# frame_array() is a view straight into the surface's pixels
+# (pygame.surfarray), not a copy: reading it costs nothing, and it shows the
+# next frame too once that is drawn. A view locks its surface, and SDL cannot
+# draw on a locked surface, so Game.draw() releases the views the exporter
+# handed out; do not keep one past the next draw() (copy it instead).
+#
+# Layers:
+#   frame  the screen as presented: background, game layer, HUD, CRT effects
+#   game   only the game layer (player, bullets, enemies, explosions) on
+#          black, drawn into a surface of its own when first asked for in a
+#          frame
+#
+# observation() downsamples (by an integer factor, averaging each block or
+# taking its top-left pixel) and/or converts to grayscale into buffers
+# allocated once per layer; the array it returns is overwritten by the next
+# call for the same layer. With neither option it is the frame_array() view.
+
+LAYERS = ('frame', 'game')
+RESAMPLE = ('area', 'nearest')
+
+# ITU-R BT.601 luma weights, in 1/256ths
+GRAY_WEIGHTS = (77, 150, 29)
+
+
+def available():
+    return np is not None
+
+
+class FrameExporter:
+    def __init__(self, scale=1, grayscale=False, resample='area'):
+        if np is None:
+            raise RuntimeError("Frame export requires NumPy")
+        if resample not in RESAMPLE:
+            raise ValueError(f"Unknown resampling {resample!r}, expected one of: {', '.join(RESAMPLE)}")
+        self.scale = scale
+        self.grayscale = grayscale
+        self.resample = resample
+        self.views = {}      # layer -> (view handed out since the last draw, its surface)
+        self.drawn = set()   # separately drawn layers already drawn this frame
+        self.surfaces = {}   # layer -> surface of a separately drawn layer
+        self.buffers = {}    # layer -> preallocated observation buffers
+        self.alpha = 1.0     # interpolation alpha of the last drawn frame
+
+    def release(self, alpha=1.0):
+        # Called by Game.draw(alpha) before drawing: unlocks the viewed
+        # surfaces and marks separately drawn layers as out of date
+        surfaces = [surface for _, surface in self.views.values()]
+        self.views.clear()
+        self.drawn.clear()
+        self.alpha = alpha
+        for surface in surfaces:
+            if surface.get_locked():
+                raise RuntimeError("A frame_array() view is still in use when drawing the next frame; "
+                                   "copy it to keep it")
+
+    def layer_surface(self, layer, size):
+        # (surface, True if it still has to be drawn this frame)
+        surface = self.surfaces.get(layer)
+        if surface is None or surface.get_size() != size:
+            surface = pygame.Surface(size)
+            self.surfaces[layer] = surface
+        stale = layer not in self.drawn
+        self.drawn.add(layer)
+        return surface, stale
+
+    def view(self, layer, surface):
+        # (height, width, 3) RGB view of the surface's pixels
+        if layer not in self.views:
+            self.views[layer] = (pygame.surfarray.pixels3d(surface).transpose(1, 0, 2), surface)
+        return self.views[layer][0]
+
+    def packed_view(self, layer, surface):
+        # (height, width) view of the surface's 32-bit pixels
+        key = (layer, 'packed')
+        if key not in self.views:
+            self.views[key] = (pygame.surfarray.pixels2d(surface).transpose(), surface)
+        return self.views[key][0]
+
+    def observation(self, layer, surface, out=None):
+        # Downsampled and/or grayscale copy of the surface (see the top of
+        # the file), in out if given
+        step = self.scale if self.resample == 'nearest' else 1
+        k = self.scale // step  # block size averaged
+        if k == 1 and not self.grayscale and out is None:
+            return self.view(layer, surface)[::step, ::step]
+        width, height = surface.get_width(), surface.get_height()
+        width, height = -(-width // step) // k, -(-height // step) // k
+        buffers = self._buffers(layer, height, width)
+        if out is None:
+            out = buffers['out']
+
+        shifts = _lane_shifts(surface, k)
+        if shifts is not None:
+            pixels = self.packed_view(layer, surface)[::step, ::step]
+            red, green, blue = self._packed_sums(pixels, k, shifts, buffers)
+        else:
+            pixels = self.view(layer, surface)[::step, ::step]
+            red, green, blue = self._channel_sums(pixels, k, buffers)
+
+        if self.grayscale:
+            luma, term = buffers['luma'], buffers['term']
+            np.multiply(red, GRAY_WEIGHTS[0], out=luma)
+            np.multiply(green, GRAY_WEIGHTS[1], out=term)
+            np.add(luma, term, out=luma)
+            np.multiply(blue, GRAY_WEIGHTS[2], out=term)
+            np.add(luma, term, out=luma)
+            np.floor_divide(luma, 256 * k * k, out=luma)
+            np.copyto(out, luma, casting='unsafe')
+        else:
+            for channel, sums in enumerate((red, green, blue)):
+                if k > 1:
+                    np.floor_divide(sums, k * k, out=sums)
+                np.copyto(out[:, :, channel], sums, casting='unsafe')
+        return out
+
+    def _packed_sums(self, pixels, k, shifts, buffers):
+        # Per-channel sums of every k x k block of packed pixels. Red and
+        # blue are 16 bits apart, so both are summed in one uint32 with
+        # room for 256 pixels per lane; green is summed separately.
+        red_shift, green_shift, blue_shift = shifts
+        red_blue, green, term = buffers['red'], buffers['green'], buffers['term']
+        red_blue_mask = (0xFF << red_shift) | (0xFF << blue_shift)
+        height, width = red_blue.shape
+        pixels = pixels[:height * k, :width * k]
+        for dy in range(k):
+            for dx in range(k):
+                block = pixels[dy::k, dx::k]
+                if dy == 0 and dx == 0:
+                    np.bitwise_and(block, red_blue_mask, out=red_blue)
+                    np.bitwise_and(block, 0xFF << green_shift, out=green)
+                    continue
+                np.bitwise_and(block, red_blue_mask, out=term)
+                np.add(red_blue, term, out=red_blue)
+                np.bitwise_and(block, 0xFF << green_shift, out=term)
+                np.add(green, term, out=green)
+        blue = buffers['blue']
+        np.right_shift(red_blue, blue_shift, out=blue)
+        np.bitwise_and(blue, 0xFFFF, out=blue)
+        np.right_shift(red_blue, red_shift, out=red_blue)
+        np.bitwise_and(red_blue, 0xFFFF, out=red_blue)
+        np.right_shift(green, green_shift, out=green)
+        return red_blue, green, blue
+
+    def _channel_sums(self, pixels, k, buffers):
+        # Same as _packed_sums for any pixel format, one channel at a time
+        height, width = buffers['red'].shape
+        pixels = pixels[:height * k, :width * k]
+        sums = (buffers['red'], buffers['green'], buffers['blue'])
+        for channel, total in enumerate(sums):
+            np.copyto(total, pixels[::k, ::k, channel])
+            for dy in range(k):
+                for dx in range(k):
+                    if dy or dx:
+                        np.add(total, pixels[dy::k, dx::k, channel], out=total)
+        return sums
+
+    def _buffers(self, layer, height, width):
+        buffers = self.buffers.get(layer)
+        if buffers is None or buffers['size'] != (height, width):
+            channels = () if self.grayscale else (3,)
+            buffers = {'size': (height, width),
+                       'out': np.empty((height, width) + channels, dtype=np.uint8)}
+            for name in ('red', 'green', 'blue', 'luma', 'term'):
+                buffers[name] = np.empty((height, width), dtype=np.uint32)
+            self.buffers[layer] = buffers
+        return buffers
+
+
+def _lane_shifts(surface, k):
+    # (red, green, blue) bit shifts when the surface's pixels can be summed
+    # in packed form: 32-bit with red and blue in the low and high halves,
+    # and blocks of at most 256 pixels; None otherwise
+    if surface.get_bitsize() != 32 or k > 16:
+        return None
+    red_shift, green_shift, blue_shift, _ = surface.get_shifts()
+    if {red_shift, blue_shift} != {0, 16} or green_shift != 8:
+        return None
+    return red_shift, green_shift, blue_shift
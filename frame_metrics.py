@@ -0,0 +1,259 @@
+import json
+import time
+
+import pygame
+
+from text_cache import get_font
+
+# Per-frame timing of the main loop's phases. The game calls lap(name) at the
+# end of every phase; the time since the previous lap is charged to that
+# phase. Phases that run several times in a frame (update sub-steps on frames
+# with more than one simulation tick) add up. Frames are kept in a ring
+# buffer of the last `capacity` frames, which export() writes as CSV or JSON
+# and the F3 overlay draws as a rolling frame-time graph and per-phase bars.
+#
+# Phase names are "group:step" (update:enemies, draw:ui) or a bare group
+# (events, present, idle); the graph stacks each frame by group, so a stutter
+# shows whether it came from the simulation, drawing or the display flip.
+#
+# Usage per rendered frame:
+#   metrics.begin_frame()
+#   game.handle_events(); metrics.lap('events')
+#   ...
+#   metrics.end_frame()
+#
+# Games that are not measuring hold NULL_METRICS, whose methods do nothing.
+
+DEFAULT_CAPACITY = 3600  # one minute at 60 FPS
+
+# Overlay layout
+OVERLAY_POS = (10, 50)
+OVERLAY_WIDTH = 300
+GRAPH_FRAMES = OVERLAY_WIDTH - 20
+GRAPH_HEIGHT = 60
+GRAPH_MS = 50.0          # frame time at the top of the graph
+BAR_FRAMES = 60          # frames averaged for the phase bars
+BAR_MS = 1000.0 / 60     # phase time filling a whole bar
+OVERLAY_REFRESH = 6      # frames between overlay redraws
+FONT_SIZE = 16
+LINE_HEIGHT = 14
+
+GROUP_COLORS = {
+    'events': (255, 191, 0),
+    'update': (0, 162, 232),
+    'draw': (0, 255, 0),
+    'present': (255, 0, 255),
+    'idle': (70, 70, 70),
+}
+OTHER_COLOR = (192, 192, 192)
+BUDGET_COLOR = (255, 69, 0)
+
+
+def group_of(phase):
+    return phase.split(':', 1)[0]
+
+
+class FrameMetrics:
+    enabled = True
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        # Seconds per frame and per phase, indexed by frame % capacity
+        self.frame_times = [0.0] * capacity
+        self.columns = {}  # phase -> list, in first-seen order
+        self.frames = 0
+        self.current = {}
+        self.frame_start = self.last = clock()
+
+        # Overlay
+        self.visible = False
+        self.panel = None
+        self.panel_frame = None
+
+    def begin_frame(self):
+        self.current.clear()
+        self.frame_start = self.last = self.clock()
+
+    def lap(self, name):
+        now = self.clock()
+        current = self.current
+        current[name] = current.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        now = self.clock()
+        slot = self.frames % self.capacity
+        current = self.current
+        self.frame_times[slot] = now - self.frame_start
+        for name, column in self.columns.items():
+            column[slot] = current.pop(name, 0.0)
+        for name, value in current.items():
+            # First frame with this phase
+            column = [0.0] * self.capacity
+            column[slot] = value
+            self.columns[name] = column
+        current.clear()
+        self.frames += 1
+        self.frame_start = self.last = now
+
+    def __len__(self):
+        return min(self.frames, self.capacity)
+
+    def _slots(self, count=None):
+        # Ring buffer slots of the last count frames, oldest first
+        stored = len(self)
+        if count is None or count > stored:
+            count = stored
+        first = self.frames - count
+        return [(first + i) % self.capacity for i in range(count)]
+
+    def recent(self, phase=None, count=None):
+        # Seconds of the last count frames (or of one phase in them)
+        column = self.frame_times if phase is None else self.columns[phase]
+        return [column[slot] for slot in self._slots(count)]
+
+    def summary(self):
+        # phase -> mean/p50/p90/p99/max in milliseconds over the buffer
+        stats = {'frame': _summarize(self.recent())}
+        for name in self.columns:
+            stats[name] = _summarize(self.recent(name))
+        return stats
+
+    def export(self, path):
+        # CSV (one row per frame) if path ends in .csv, JSON otherwise
+        slots = self._slots()
+        phases = list(self.columns)
+        if path.endswith('.csv'):
+            with open(path, 'w') as f:
+                f.write(','.join(['frame', 'frame_ms'] + [name + '_ms' for name in phases]) + '\n')
+                first = self.frames - len(slots)
+                for i, slot in enumerate(slots):
+                    values = [self.frame_times[slot]] + [self.columns[name][slot] for name in phases]
+                    f.write(f"{first + i}," + ','.join(f"{value * 1000:.4f}" for value in values) + '\n')
+            return
+        report = {
+            'frames': self.frames,
+            'first_frame': self.frames - len(slots),
+            'phases': phases,
+            'summary': self.summary(),
+            'samples_ms': {
+                'frame': [round(value * 1000, 4) for value in self.recent()],
+                **{name: [round(value * 1000, 4) for value in self.recent(name)] for name in phases},
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    # Overlay
+
+    def toggle_overlay(self):
+        self.visible = not self.visible
+        self.panel = None
+
+    def overlay_rect(self):
+        # Screen area the overlay covers this frame (None when hidden)
+        if not self.visible:
+            return None
+        return self._panel().get_rect(topleft=OVERLAY_POS)
+
+    def draw_overlay(self, screen):
+        if self.visible:
+            screen.blit(self._panel(), OVERLAY_POS)
+
+    def _panel(self):
+        # Rebuilt every OVERLAY_REFRESH frames; text is rendered directly so
+        # the ever-changing numbers stay out of the shared text cache
+        if self.panel is not None and self.frames - self.panel_frame < OVERLAY_REFRESH:
+            return self.panel
+        font = get_font(FONT_SIZE)
+        phases = list(self.columns)
+        height = 10 + LINE_HEIGHT + GRAPH_HEIGHT + 8 + LINE_HEIGHT * len(phases) + 6
+        panel = pygame.Surface((OVERLAY_WIDTH, height))
+        panel.fill((0, 0, 0))
+        panel.set_alpha(210)
+        pygame.draw.rect(panel, GROUP_COLORS['draw'], panel.get_rect(), 1)
+
+        frame_ms = [value * 1000 for value in self.recent(count=BAR_FRAMES)]
+        if frame_ms:
+            mean = sum(frame_ms) / len(frame_ms)
+            header = f"frame {mean:5.2f} ms avg  {max(frame_ms):5.2f} max  ({1000 / mean:4.0f} FPS)"
+        else:
+            header = "frame timing: no frames yet"
+        panel.blit(font.render(header, True, (255, 255, 255)), (10, 5))
+
+        # Rolling frame-time graph, each frame stacked by phase group
+        top = 5 + LINE_HEIGHT + 4
+        bottom = top + GRAPH_HEIGHT
+        scale = GRAPH_HEIGHT / GRAPH_MS
+        slots = self._slots(GRAPH_FRAMES)
+        x = 10 + GRAPH_FRAMES - len(slots)
+        groups = {}
+        for name in self.columns:
+            groups.setdefault(group_of(name), []).append(self.columns[name])
+        for slot in slots:
+            y = bottom
+            for group, columns in groups.items():
+                height = int(sum(column[slot] for column in columns) * 1000 * scale + 0.5)
+                if height:
+                    new_y = max(top, y - height)
+                    pygame.draw.line(panel, GROUP_COLORS.get(group, OTHER_COLOR), (x, y - 1), (x, new_y))
+                    y = new_y
+            x += 1
+        for budget in (1000 / 60, 1000 / 30):
+            y = bottom - int(budget * scale)
+            pygame.draw.line(panel, BUDGET_COLOR, (10, y), (10 + GRAPH_FRAMES, y))
+
+        # Mean time of every phase over the last BAR_FRAMES frames
+        y = bottom + 8
+        for name in phases:
+            values = self.recent(name, BAR_FRAMES)
+            ms = sum(values) / len(values) * 1000 if values else 0.0
+            color = GROUP_COLORS.get(group_of(name), OTHER_COLOR)
+            width = min(120, int(120 * ms / BAR_MS))
+            if width:
+                pygame.draw.rect(panel, color, (170, y + 3, width, LINE_HEIGHT - 5))
+            panel.blit(font.render(name, True, color), (10, y))
+            text = font.render(f"{ms:.2f}", True, color)
+            panel.blit(text, (164 - text.get_width(), y))
+            y += LINE_HEIGHT
+
+        self.panel = panel
+        self.panel_frame = self.frames
+        return panel
+
+
+class NullFrameMetrics:
+    # Stands in for FrameMetrics when nothing is measured
+    enabled = False
+    visible = False
+
+    def begin_frame(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def overlay_rect(self):
+        return None
+
+    def draw_overlay(self, screen):
+        pass
+
+
+NULL_METRICS = NullFrameMetrics()
+
+
+def _summarize(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    n = len(ordered)
+    stats = {'mean_ms': sum(ordered) / n * 1000}
+    for p in (50, 90, 99):
+        stats[f'p{p}_ms'] = ordered[min(n - 1, int(n * p / 100))] * 1000
+    stats['max_ms'] = ordered[-1] * 1000
+    return stats
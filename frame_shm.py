@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:  # readers then get memoryviews instead of arrays
+    np = None
+
+# Finished frames published into a shared-memory ring for other processes
+# (stream overlays, analyzers, a second display) to read without copies,
+# sockets or pickling.
+#
+#   python it-crowd.py --publish-frames retro-frames
+#
+#   reader = FrameReader('retro-frames')
+#   frame = reader.wait()                 # newest frame, blocks until one
+#   frame.pixels                          # (600, 800, 4) BGRA view, no copy
+#   frame.number, frame.score, frame.enemies, frame.state, ...
+#   if frame.valid(): ...                 # not overwritten while in use
+#
+#   python frame_shm.py --readers 3 --frames 1200    # latency benchmark
+#
+# Layout: a header (magic, format version, slot count, width, height,
+# pitch, number of the newest published frame), then `slots` slots, each a
+# slot header (sequence number, frame number, publish time, score, entity
+# counts, game state) followed by the frame's BGRA pixels. The game blits
+# straight into the slot, through a surface backed by the shared memory.
+#
+# There are no locks: every slot carries a sequence number that is odd
+# while the publisher writes it (a seqlock). A reader reads the number,
+# the header (and whatever pixels it wants), and the number again, and
+# retries if it changed. With several slots a frame stays intact for
+# slots - 1 frame periods after it was published, which is the time a
+# zero-copy reader has to use it; Frame.valid() tells whether it made it.
+# (The publisher is the only writer and CPython stores are not reordered on
+# x86; on weakly ordered CPUs the sequence check is best effort.)
+
+MAGIC = b'RGSM'
+FORMAT_VERSION = 1
+DEFAULT_SLOTS = 4
+
+# magic, version, slots, width, height, pitch, newest frame, publisher closed
+HEADER = struct.Struct('<4sBxxxIIIIQI')
+HEADER_SIZE = 64
+NEWEST_OFFSET = 24
+CLOSED_OFFSET = 32
+# sequence, frame, publish time (monotonic ns), score, bullets, enemies,
+# explosions, state
+SLOT_HEADER = struct.Struct('<QQqqIIII')
+SLOT_HEADER_SIZE = 64
+
+# Failed reads of the newest frame before a reader gives up on it: a slot
+# only stays odd for as long as one frame takes to write, unless the
+# publisher died in the middle of it
+READ_RETRIES = 1000
+
+# Game states a frame can be tagged with (it-crowd.py's Game.state)
+STATES = ('playing', 'character_select')
+
+
+def _attach(name):
+    # Readers must not unlink the segment when they exit; before Python 3.13
+    # the resource tracker would, unless told to forget it. (A reader in the
+    # publishing process, or a multiprocessing child of it, shares the
+    # publisher's tracker, which then complains harmlessly on close.)
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        except (ImportError, AttributeError):
+            pass
+        return memory
+
+
+class FramePublisher:
+    def __init__(self, name, size, slots=DEFAULT_SLOTS):
+        import pygame
+        width, height = size
+        self.pitch = width * 4
+        self.slot_size = SLOT_HEADER_SIZE + self.pitch * height
+        self.slots = slots
+        self.memory = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + slots * self.slot_size)
+        self.name = self.memory.name
+        self.buf = self.memory.buf
+        HEADER.pack_into(self.buf, 0, MAGIC, FORMAT_VERSION, slots, width, height, self.pitch, 0, 0)
+        # Surfaces drawing straight into each slot's pixels
+        self.surfaces = []
+        for slot in range(slots):
+            start = HEADER_SIZE + slot * self.slot_size + SLOT_HEADER_SIZE
+            self.surfaces.append(pygame.image.frombuffer(self.buf[start:start + self.pitch * height], size, 'BGRA'))
+        self.frame = 0
+
+    def publish(self, screen, score=0, bullets=0, enemies=0, explosions=0, state='playing'):
+        self.frame += 1
+        slot = self.frame % self.slots
+        offset = HEADER_SIZE + slot * self.slot_size
+        buf = self.buf
+        sequence = struct.unpack_from('<Q', buf, offset)[0]
+        struct.pack_into('<Q', buf, offset, sequence + 1)  # odd: being written
+        self.surfaces[slot].blit(screen, (0, 0))
+        SLOT_HEADER.pack_into(buf, offset, sequence + 1, self.frame, time.monotonic_ns(), score,
+                              bullets, enemies, explosions, STATES.index(state))
+        struct.pack_into('<Q', buf, offset, sequence + 2)
+        struct.pack_into('<Q', buf, NEWEST_OFFSET, self.frame)
+
+    def publish_game(self, game):
+        # retro_game.py has no explosions and no menu
+        self.publish(game.screen, game.score, len(game.bullets), len(game.enemies),
+                     len(getattr(game, 'explosions', ())), getattr(game, 'state', 'playing'))
+
+    def close(self):
+        struct.pack_into('<I', self.buf, CLOSED_OFFSET, 1)
+        # The slot surfaces export the buffer, which has to be released
+        # before the segment can close
+        self.surfaces = []
+        self.buf = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+class Frame:
+    # One published frame; pixels is a view into the shared memory
+    def __init__(self, reader, slot, sequence, fields):
+        self.reader = reader
+        self.slot = slot
+        self.sequence = sequence
+        (_, self.number, self.timestamp_ns, self.score,
+         self.bullets, self.enemies, self.explosions, state) = fields
+        self.state = STATES[state] if state < len(STATES) else 'unknown'
+
+    @property
+    def pixels(self):
+        return self.reader.pixels(self.slot)
+
+    def valid(self):
+        # True while the publisher has not started overwriting this frame
+        return self.reader.sequence(self.slot) == self.sequence
+
+    def copy(self):
+        # The pixels as bytes, or None if the frame was overwritten meanwhile
+        data = bytes(self.reader.pixel_bytes(self.slot))
+        return data if self.valid() else None
+
+
+class FrameReader:
+    def __init__(self, name):
+        self.memory = _attach(name)
+        self.buf = self.memory.buf
+        (magic, version, self.slots, self.width, self.height, self.pitch,
+         _, _) = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Shared memory {name!r} is not a frame ring of this version")
+        self.slot_size = SLOT_HEADER_SIZE + self.pitch * self.height
+        self.views = {}
+        self.last = 0
+        self.retries = 0
+
+    def newest(self):
+        return struct.unpack_from('<Q', self.buf, NEWEST_OFFSET)[0]
+
+    def closed(self):
+        return struct.unpack_from('<I', self.buf, CLOSED_OFFSET)[0] != 0
+
+    def sequence(self, slot):
+        return struct.unpack_from('<Q', self.buf, HEADER_SIZE + slot * self.slot_size)[0]
+
+    def pixel_bytes(self, slot):
+        start = HEADER_SIZE + slot * self.slot_size + SLOT_HEADER_SIZE
+        return self.buf[start:start + self.pitch * self.height]
+
+    def pixels(self, slot):
+        # (height, width, 4) uint8 BGRA array without NumPy a flat memoryview
+        view = self.views.get(slot)
+        if view is None:
+            view = self.pixel_bytes(slot)
+            if np is not None:
+                view = np.frombuffer(view, dtype=np.uint8).reshape(self.height, self.pitch // 4, 4)[:, :self.width]
+            self.views[slot] = view
+        return view
+
+    def latest(self, poll=0.0005, retries=READ_RETRIES):
+        # The newest published frame (None before the first one, or if it
+        # stays unreadable: the publisher closed or stopped mid-write)
+        for _ in range(retries + 1):
+            number = self.newest()
+            if number == 0:
+                return None
+            slot = number % self.slots
+            offset = HEADER_SIZE + slot * self.slot_size
+            fields = SLOT_HEADER.unpack_from(self.buf, offset)
+            sequence = fields[0]
+            if sequence % 2 == 0 and fields[1] == number and self.sequence(slot) == sequence:
+                self.last = number
+                return Frame(self, slot, sequence, fields)
+            # Overwritten while reading: the publisher has moved on
+            self.retries += 1
+            if self.closed():
+                return None
+            time.sleep(poll)
+        return None
+
+    def wait(self, timeout=None, poll=0.0005):
+        # The first frame newer than the one last returned; None on timeout,
+        # once the publisher closed, or if the new frame cannot be read
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.newest() <= self.last:
+            if self.closed() or (deadline is not None and time.monotonic() > deadline):
+                return None
+            time.sleep(poll)
+        return self.latest(poll)
+
+    def close(self):
+        self.views = {}
+        self.buf = None
+        try:
+            self.memory.close()
+        except BufferError:
+            raise RuntimeError("Frame pixel arrays are still in use; drop them before closing the reader") from None
+
+
+# Benchmark: the game side publishing frames at a fixed rate, and reader
+# processes (started as separate programs, like real consumers) measuring
+# how long each frame took to reach them
+
+def _bench_reader(name, touch):
+    reader = FrameReader(name)
+    latencies = []
+    missed = 0
+    invalid = 0
+    last = 0
+    while True:
+        frame = reader.wait(timeout=5)
+        if frame is None:
+            break
+        latencies.append(time.monotonic_ns() - frame.timestamp_ns)
+        if last:
+            missed += frame.number - last - 1
+        last = frame.number
+        if touch:
+            # Read every pixel, as an analyzer would
+            int(frame.pixels.sum()) if np is not None else sum(frame.pixels)
+            if not frame.valid():
+                invalid += 1
+    reader.close()
+    print(json.dumps({'missed': missed, 'invalid': invalid, 'retries': reader.retries, 'latencies': latencies}))
+
+
+def benchmark(readers=2, frames=600, fps=60, touch=False):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    pygame.display.init()
+    screen = pygame.display.set_mode((800, 600))
+    publisher = FramePublisher(f"frame-shm-bench-{os.getpid()}", screen.get_size())
+    command = [sys.executable, os.path.abspath(__file__), '--read', publisher.name] + (['--touch'] if touch else [])
+    processes = [subprocess.Popen(command, stdout=subprocess.PIPE) for _ in range(readers)]
+    time.sleep(1.0)  # let the readers attach
+
+    interval = 1.0 / fps if fps else 0.0
+    start = time.perf_counter()
+    publish_time = 0.0
+    try:
+        for frame in range(frames):
+            screen.fill((frame % 256, 64, 255 - frame % 256))
+            before = time.perf_counter()
+            publisher.publish(screen, score=frame)
+            publish_time += time.perf_counter() - before
+            if interval:
+                delay = start + (frame + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        elapsed = time.perf_counter() - start
+    finally:
+        publisher.close()
+    print(f"publisher: {frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} FPS), "
+          f"publish {publish_time / frames * 1000:.3f} ms per frame")
+
+    for index, process in enumerate(processes):
+        output, _ = process.communicate()
+        report = json.loads(output)
+        latencies = sorted(report['latencies'])
+        if not latencies:
+            print(f"reader {index}: no frames")
+            continue
+        p50, p99 = (latencies[min(len(latencies) - 1, len(latencies) * p // 100)] / 1000 for p in (50, 99))
+        print(f"reader {index}: {len(latencies)} frames, {report['missed']} missed, "
+              f"{report['invalid']} overwritten while read, {report['retries']} retries, "
+              f"latency p50 {p50:.0f} us, p99 {p99:.0f} us, max {latencies[-1] / 1000:.0f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shared-memory frame ring.")
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--fps', type=int, default=60, help="publishing rate (0: as fast as possible)")
+    parser.add_argument('--touch', action='store_true', help="readers sum every pixel of every frame")
+    parser.add_argument('--read', metavar='NAME', help=argparse.SUPPRESS)  # a reader process
+    args = parser.parse_args(argv)
+    if args.read:
+        _bench_reader(args.read, args.touch)
+    else:
+        benchmark(args.readers, args.frames, args.fps, args.touch)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from replay import Replay, state_digest
+
+# Headless simulation runner: steps Game.update() (which includes
+# check_collisions) as fast as the CPU allows, with no window, no drawing
+# and no frame cap.
+#
+#   python headless.py --variant it-crowd --frames 100000 --seed 1 --input "R*20,S,L*20,S"
+#   python headless.py --replay session.rec
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Variant name -> game script
+VARIANTS = {
+    'retro_game': 'retro_game.py',
+    'retro_game_it_crowd': 'retro_game_it_crowd.py',
+    'it-crowd': 'it-crowd.py',
+}
+
+CHARACTERS = ['moss', 'jen', 'roy']
+
+# Input script letters -> what they press during a frame
+SCRIPT_HELD = {'L': 'left', 'R': 'right'}
+SCRIPT_KEYS = {'S': 'K_SPACE', 'E': 'K_RETURN', 'X': 'K_ESCAPE'}
+
+
+def load_variant(name):
+    # it-crowd.py is not a valid module name, so every variant is loaded
+    # from its file path
+    if name not in VARIANTS:
+        raise ValueError(f"Unknown variant {name!r}, expected one of: {', '.join(VARIANTS)}")
+    if GAME_DIR not in sys.path:
+        sys.path.insert(0, GAME_DIR)
+    module_name = name.replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(GAME_DIR, VARIANTS[name]))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class InputScript:
+    # A looping per-frame input script. Tokens are separated by commas or
+    # whitespace; each token is a combination of L (hold left), R (hold
+    # right), S (space), E (enter) and X (escape), or '-' for an idle frame,
+    # optionally repeated with '*N'. Example: "R*10,S,LS,-*5"
+    def __init__(self, text):
+        self.frames = []
+        for token in text.replace(',', ' ').split():
+            token, _, repeat = token.partition('*')
+            frame = self.parse_token(token.upper())
+            self.frames.extend([frame] * (int(repeat) if repeat else 1))
+        if not self.frames:
+            self.frames.append(((), False, False))
+
+    @staticmethod
+    def parse_token(token):
+        import pygame
+        keydowns = []
+        held = set()
+        for letter in token:
+            if letter in SCRIPT_HELD:
+                held.add(SCRIPT_HELD[letter])
+            elif letter in SCRIPT_KEYS:
+                keydowns.append(getattr(pygame, SCRIPT_KEYS[letter]))
+            elif letter not in '-.':
+                raise ValueError(f"Unknown input script letter {letter!r}")
+        return tuple(keydowns), 'left' in held, 'right' in held
+
+    def frame(self, n):
+        return self.frames[n % len(self.frames)]
+
+
+class RandomInput:
+    # A random player: holds a direction for a while and fires now and then
+    def __init__(self, seed=None, fire_chance=0.1):
+        import pygame
+        self.rng = random.Random(seed)
+        self.fire_chance = fire_chance
+        self.space = (pygame.K_SPACE,)
+        self.held = (False, False)
+        self.hold_frames = 0
+
+    def frame(self, n):
+        if self.hold_frames <= 0:
+            self.held = self.rng.choice([(False, False), (True, False), (False, True)])
+            self.hold_frames = self.rng.randint(5, 60)
+        self.hold_frames -= 1
+        keydowns = self.space if self.rng.random() < self.fire_chance else ()
+        return keydowns, self.held[0], self.held[1]
+
+
+def make_input(text, seed=None):
+    if text is None:
+        return None
+    if text == 'random':
+        return RandomInput(seed)
+    if text.startswith('@'):
+        with open(text[1:]) as f:
+            text = f.read()
+    return InputScript(text)
+
+
+def create_game(module, character='moss', **options):
+    game = module.Game(headless=True, **options)
+    # it-crowd.py starts on the character select screen
+    if character != 'menu' and hasattr(game, 'start_game'):
+        game.start_game(character)
+    return game
+
+
+def run_headless(game, frames, script=None):
+    # Returns the wall-clock seconds spent simulating
+    apply_input = game.apply_input
+    update = game.update
+    start = time.perf_counter()
+    if script is None:
+        for _ in range(frames):
+            update()
+    else:
+        for n in range(frames):
+            apply_input(*script.frame(n))
+            update()
+    return time.perf_counter() - start
+
+
+def replay_session(path, **options):
+    # Re-runs a recorded session tick for tick and checks that it ends in
+    # the recorded state
+    replay = Replay(path)
+    module = load_variant(replay.variant)
+    game = create_game(module, replay.character, seed=replay.seed, **options)
+    elapsed = run_headless(game, len(replay), replay)
+    fps = len(replay) / elapsed if elapsed > 0 else float('inf')
+    print(f"{replay.variant}: replayed {len(replay)} ticks in {elapsed:.3f}s "
+          f"({fps:.0f} simulated FPS), score {game.score}")
+    if state_digest(game) != replay.digest:
+        print("Replay diverged: the final state differs from the recorded session")
+        return 1
+    print("Replay matches the recorded session")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a game variant headless at maximum speed.")
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='retro_game_it_crowd')
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=None,
+                        help="simulation seed (random if omitted)")
+    parser.add_argument('--input', default=None,
+                        help="input script (e.g. 'R*10,S,L*10'), @file to read one, or 'random'")
+    parser.add_argument('--character', choices=CHARACTERS + ['menu'], default='moss',
+                        help="it-crowd.py only: character to start with, or 'menu' to stay on the select screen")
+    parser.add_argument('--entity-store', action='store_true',
+                        help="keep bullets and enemies in the NumPy entity store")
+    parser.add_argument('--replay', metavar='FILE', default=None,
+                        help="replay a session recorded with --record (overrides variant, seed, input and frames)")
+    args = parser.parse_args(argv)
+
+    # No window is ever opened, so keep SDL away from the real display/audio
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    if args.replay:
+        return replay_session(args.replay, entity_store=args.entity_store)
+
+    module = load_variant(args.variant)
+    game = create_game(module, args.character, seed=args.seed, entity_store=args.entity_store)
+    script = make_input(args.input, args.seed)
+
+    elapsed = run_headless(game, args.frames, script)
+    fps = args.frames / elapsed if elapsed > 0 else float('inf')
+    print(f"{args.variant}: {args.frames} frames in {elapsed:.3f}s "
+          f"({fps:.0f} simulated FPS), score {game.score}")
+    for name in ('bullet', 'enemy', 'explosion'):
+        pool = getattr(game, name + '_pool', None)
+        if pool is not None:
+            stats = pool.stats()
+            print(f"  {name} pool: capacity {stats['capacity']}, peak in use {stats['peak_in_use']}, "
+                  f"{stats['exhaustions']} exhaustions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
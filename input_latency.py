@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pygame
+
+from headless import VARIANTS, load_variant
+
+# Input-to-photon latency: how long a key press takes to show on screen.
+# The game's input goes through an InputPipeline, which timestamps every
+# event as it comes off SDL's queue and follows each fire and move press
+# through the game: to the simulation tick that acts on it (a bullet spawned,
+# the player moved) and to the end of the display flip of the first frame
+# showing that. Each press adds to per-kind histograms of its stages:
+#
+#   queue    arrival to the game taking it (handle_events)
+#   wait     taken to the tick that applied it
+#   present  that tick to the flip showing its effect returning
+#   total    arrival to flip
+#
+#   python it-crowd.py --input-latency latency.json     # or .csv, on exit
+#   python it-crowd.py --late-input
+#   python input_latency.py --variant it-crowd          # both modes, scripted presses
+#
+# Presses a tick applies without effect (space on the menu, a move into the
+# screen edge) are counted, not timed. The flip returning is as close to the
+# photon as the game can see: the compositor, vsync and the display's own
+# lag come on top.
+#
+# The main loop normally polls input once a frame and then sleeps out the
+# frame in clock.tick(), so a press waits for the rest of that sleep, and
+# again for the next tick when the frame has none due. In late-input mode the
+# frame's wait takes events off the queue in 1 ms slices and ends as soon as
+# a key is pressed, and a frame that has input but no tick due runs the next
+# tick early (FixedTimestep.borrow()), so a press is simulated, drawn and
+# flipped right after it arrives.
+# Frames then come at irregular times around key presses; the simulation
+# itself keeps its rate and stays deterministic per tick.
+#
+# The tracking pipeline waits in slices in either mode, so that events
+# arriving during the sleep are stamped when they arrive; an event arriving
+# while a frame is simulated or drawn is only stamped at the next poll, so
+# its queue time reads short by up to that frame's work. Events carrying a
+# posted_at attribute (perf_counter time), like the benchmark's, use that as
+# their arrival.
+
+HISTOGRAM_MS = 250   # last bin collects everything slower
+BIN_MS = 0.25
+WAIT_SLICE = 0.001
+
+KINDS = ('fire', 'move')
+KEY_KINDS = {
+    pygame.K_SPACE: 'fire',
+    pygame.K_LEFT: 'move', pygame.K_RIGHT: 'move', pygame.K_a: 'move', pygame.K_d: 'move',
+}
+STAGES = ('queue', 'wait', 'present', 'total')
+
+
+class LatencyHistogram:
+    def __init__(self, bin_ms=BIN_MS, max_ms=HISTOGRAM_MS):
+        self.bin_ms = bin_ms
+        self.bins = [0] * (int(max_ms / bin_ms) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = max(0.0, seconds * 1000)
+        self.bins[min(len(self.bins) - 1, int(ms / self.bin_ms))] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        # Upper edge of the bin holding the p-th percentile, in milliseconds
+        target = self.count * p / 100
+        seen = 0
+        for index, n in enumerate(self.bins):
+            seen += n
+            if seen > target:
+                return min(self.max, (index + 1) * self.bin_ms)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return None
+        stats = {'count': self.count, 'mean_ms': self.total / self.count}
+        for p in (50, 90, 99):
+            stats[f'p{p}_ms'] = self.percentile(p)
+        stats['max_ms'] = self.max
+        return stats
+
+    def nonzero(self):
+        # (start_ms, end_ms, count) of every bin that has samples
+        last = len(self.bins) - 1
+        for index, n in enumerate(self.bins):
+            if n:
+                end = (index + 1) * self.bin_ms if index < last else float('inf')
+                yield index * self.bin_ms, end, n
+
+
+class Press:
+    __slots__ = ('kind', 'key', 'arrival', 'taken', 'applied', 'tick')
+
+    def __init__(self, kind, key, arrival, taken):
+        self.kind = kind
+        self.key = key
+        self.arrival = arrival
+        self.taken = taken
+        self.applied = None
+        self.tick = None
+
+
+class InputPipeline:
+    def __init__(self, late=False, path=None):
+        self.late = late
+        self.path = path
+        self.stash = []      # (event, arrival) taken off the queue while waiting
+        self.woke = False
+        self.waiting = []    # presses handed to the game, not simulated yet
+        self.shown = []      # presses simulated, not on screen yet
+        self.ticks = 0
+        self.frame_start = time.perf_counter()
+        self.histograms = {kind: {stage: LatencyHistogram() for stage in STAGES} for kind in KINDS}
+        self.no_effect = dict.fromkeys(KINDS, 0)
+
+        # Stats
+        self.early_wakes = 0
+        self.borrowed_ticks = 0
+
+    def _drain(self):
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            self.stash.append((event, now))
+            if event.type == pygame.KEYDOWN or event.type == pygame.QUIT:
+                self.woke = True
+
+    def events(self):
+        # Replaces pygame.event.get() in handle_events
+        self._drain()
+        stash, self.stash = self.stash, []
+        self.woke = False
+        taken = time.perf_counter()
+        events = []
+        for event, arrival in stash:
+            if event.type == pygame.KEYDOWN:
+                kind = KEY_KINDS.get(event.key)
+                if kind is not None:
+                    self.waiting.append(Press(kind, event.key, getattr(event, 'posted_at', arrival), taken))
+            events.append(event)
+        return events
+
+    def schedule(self, timestep, ticks, pending_keydowns):
+        # Ticks to run this frame: late input pulls the next one forward
+        # rather than leave a press waiting for it
+        if self.late and not ticks and pending_keydowns:
+            ticks = timestep.borrow()
+            self.borrowed_ticks += ticks
+        return ticks
+
+    def apply_input(self, game, keydowns, left, right):
+        # Replaces game.apply_input in tick(), noting what the presses did
+        self.ticks += 1
+        if not self.waiting:
+            game.apply_input(keydowns, left, right)
+            return
+        player = game.player
+        x = player.x if player is not None else None
+        shots = game.bullet_pool.acquired
+        pool = game.bullet_pool
+        game.apply_input(keydowns, left, right)
+        now = time.perf_counter()
+        # start_game() may have replaced the pool or the player
+        fired = game.bullet_pool.acquired - shots if game.bullet_pool is pool else 0
+        moved = player is not None and game.player is player and player.x != x
+        for press in self.waiting:
+            press.applied = now
+            press.tick = self.ticks
+            if press.kind == 'fire' and fired > 0:
+                fired -= 1
+                self.shown.append(press)
+            elif press.kind == 'move' and moved:
+                self.shown.append(press)
+            else:
+                self.no_effect[press.kind] += 1
+        self.waiting = []
+
+    def presented(self, alpha):
+        # Call once the frame is flipped; alpha is the interpolation it was
+        # drawn with
+        if not self.shown:
+            return
+        now = time.perf_counter()
+        pending = []
+        for press in self.shown:
+            # A move drawn with alpha 0 is drawn at its previous position
+            if press.kind == 'move' and press.tick == self.ticks and alpha <= 0.0:
+                pending.append(press)
+                continue
+            histograms = self.histograms[press.kind]
+            histograms['queue'].add(press.taken - press.arrival)
+            histograms['wait'].add(press.applied - press.taken)
+            histograms['present'].add(now - press.applied)
+            histograms['total'].add(now - press.arrival)
+        self.shown = pending
+
+    def wait(self, clock, max_fps):
+        # Replaces clock.tick(max_fps): sleeps out the rest of the frame in
+        # slices, taking events off the queue as they arrive
+        if max_fps:
+            deadline = self.frame_start + 1.0 / max_fps
+            while True:
+                self._drain()
+                if self.late and self.woke:
+                    if time.perf_counter() < deadline:
+                        self.early_wakes += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(WAIT_SLICE, remaining))
+        self.frame_start = time.perf_counter()
+        clock.tick()
+
+    def summary(self):
+        return {kind: {stage: self.histograms[kind][stage].summary() for stage in STAGES} for kind in KINDS}
+
+    def report(self):
+        lines = [f"Input latency ({'late input' if self.late else 'frame-start input'}, milliseconds):"]
+        for kind in KINDS:
+            total = self.histograms[kind]['total'].summary()
+            if total is None:
+                lines.append(f"  {kind}: no presses shown ({self.no_effect[kind]} without effect)")
+                continue
+            lines.append(f"  {kind}: {total['count']} presses, {self.no_effect[kind]} without effect")
+            for stage in STAGES:
+                stats = self.histograms[kind][stage].summary()
+                if stats is None:
+                    continue
+                lines.append(f"    {stage:8} mean {stats['mean_ms']:6.2f}  p50 {stats['p50_ms']:6.2f}  "
+                             f"p90 {stats['p90_ms']:6.2f}  p99 {stats['p99_ms']:6.2f}  max {stats['max_ms']:6.2f}")
+        if self.late:
+            lines.append(f"  {self.early_wakes} frame waits cut short, {self.borrowed_ticks} ticks run early")
+        return '\n'.join(lines)
+
+    def export(self, path):
+        # CSV (one row per histogram bin) if path ends in .csv, JSON otherwise
+        if path.endswith('.csv'):
+            with open(path, 'w') as f:
+                f.write('kind,stage,bin_start_ms,bin_end_ms,count\n')
+                for kind in KINDS:
+                    for stage in STAGES:
+                        for start, end, n in self.histograms[kind][stage].nonzero():
+                            f.write(f"{kind},{stage},{start:g},{end:g},{n}\n")
+            return
+        report = {
+            'late_input': self.late,
+            'bin_ms': BIN_MS,
+            'summary': self.summary(),
+            'no_effect': self.no_effect,
+            'early_wakes': self.early_wakes,
+            'borrowed_ticks': self.borrowed_ticks,
+            'histograms': {kind: {stage: [[start, None if end == float('inf') else end, n]
+                                          for start, end, n in self.histograms[kind][stage].nonzero()]
+                                  for stage in STAGES}
+                           for kind in KINDS},
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def close(self):
+        if self.path:
+            self.export(self.path)
+        print(self.report())
+
+
+# Benchmark: a windowed game under the dummy driver, one process per mode,
+# with a thread pressing space at random times. Posted key presses do not
+# change pygame.key.get_pressed(), so only fire latency is measured.
+
+def _press(key, at=None):
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0,
+                                         posted_at=time.perf_counter() if at is None else at))
+
+
+def _bench_presses(seconds, rate, seed, menu):
+    rng = random.Random(seed)
+    time.sleep(0.5)
+    if menu:
+        _press(pygame.K_RETURN)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        time.sleep(rng.expovariate(rate))
+        _press(pygame.K_SPACE)
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+def _bench_game(variant, late, seconds, rate, fps, path):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    module = load_variant(variant)
+    game = module.Game(seed=1)
+    game.input_pipeline = InputPipeline(late, path)
+    presses = threading.Thread(target=_bench_presses,
+                               args=(seconds, rate, 1, getattr(game, 'state', None) == 'character_select'),
+                               daemon=True)
+    presses.start()
+    try:
+        game.run(max_fps=fps)
+    except SystemExit:
+        pass
+
+
+def benchmark(variant='it-crowd', seconds=10.0, rate=5.0, fps=60):
+    results = {}
+    for late in (False, True):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        command = [sys.executable, os.path.abspath(__file__), '--variant', variant, '--seconds', str(seconds),
+                   '--rate', str(rate), '--fps', str(fps), '--measure', path] + (['--late-input'] if late else [])
+        try:
+            subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+            with open(path) as f:
+                results[late] = json.load(f)
+        finally:
+            os.remove(path)
+
+    print(f"{variant}, {fps} FPS cap, space pressed {rate:g} times a second for {seconds:g} s "
+          f"(milliseconds, arrival to flip)")
+    print(f"  {'mode':12} {'presses':>8} {'mean':>7} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}"
+          f"  {'queue p50':>9} {'wait p50':>9} {'present p50':>11}")
+    for late, report in results.items():
+        stages = report['summary']['fire']
+        total = stages['total']
+        if total is None:
+            print(f"  {'late' if late else 'frame start':12} no presses shown")
+            continue
+        print(f"  {'late' if late else 'frame start':12} {total['count']:8} {total['mean_ms']:7.2f} "
+              f"{total['p50_ms']:7.2f} {total['p90_ms']:7.2f} {total['p99_ms']:7.2f} {total['max_ms']:7.2f}"
+              f"  {stages['queue']['p50_ms']:9.2f} {stages['wait']['p50_ms']:9.2f} {stages['present']['p50_ms']:11.2f}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure input-to-flip latency with and without late input.")
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='it-crowd')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--rate', type=float, default=5.0, help="space presses per second")
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--late-input', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--measure', metavar='FILE', help=argparse.SUPPRESS)  # one mode's game process
+    args = parser.parse_args(argv)
+    if args.measure:
+        _bench_game(args.variant, args.late_input, args.seconds, args.rate, args.fps, args.measure)
+    else:
+        benchmark(args.variant, args.seconds, args.rate, args.fps)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
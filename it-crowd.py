@@ -1,9 +1,31 @@
+import argparse
 import pygame
 import sys
 import random
 
-# Initialize Pygame
-pygame.init()
+from asset_cache import AssetCache, default_directory as default_asset_cache
+from camera import Camera
+from crt_overlay import get_overlay, parse_effects
+from dirty_rects import DirtyRectRenderer
+from entity_store import EntityStore, find_hits
+from frame_export import LAYERS as FRAME_LAYERS, FrameExporter
+from frame_metrics import NULL_METRICS, FrameMetrics
+from frame_shm import FramePublisher
+from input_latency import InputPipeline
+from particles import ParticleSystem, available as particle_system_available
+from pools import ObjectPool
+from profiler_capture import DEFAULT_FRAMES as PROFILE_FRAMES, MODES as PROFILER_MODES, ProfilerCapture
+from replay import InputRecorder
+from rng import fx_random, new_seed, seed_fx
+from session_recorder import POLICIES as RECORD_POLICIES, SessionRecorder
+from spatial_hash import SpatialHash
+from sprite_atlas import PADDING, SpriteAtlas
+from startup import StartupTimer, init_subsystems
+from text_cache import render_text, text_cache
+from timestep import DEFAULT_TICK_RATE, FixedTimestep
+
+# Variant name, as headless.py and recordings know it
+VARIANT = 'it-crowd'
 
 # Game constants
 SCREEN_WIDTH = 800
@@ -29,40 +51,62 @@ TERMINAL_GREEN = (0, 255, 0)
 RETRO_AMBER = (255, 191, 0)
 CRT_BLUE = (0, 162, 232)
 ERROR_RED = (255, 69, 0)
+EXPLOSION_COLORS = [RETRO_AMBER, WHITE, YELLOW, ORANGE]
 
 # Player settings
 PLAYER_SPEED = 5
 BULLET_SPEED = 7
 ENEMY_SPEED = 1
 
+# Preallocated entities per object pool (pools grow when exhausted)
+POOL_SIZES = {'bullet': 64, 'enemy': 64, 'explosion': 16}
+
+ENEMY_TYPES = ['virus', 'bug', 'error']
+
+# Baked variants of each randomized animation frame
+SPRITE_VARIANTS = 8
+
+# Seconds per frame spent baking sprites until the atlas is ready
+BAKE_BUDGET = 0.004
+
+# Fixed HUD areas (top bar, instructions) for the dirty-rect renderer
+HUD_BLOCKS = [(0, 0, SCREEN_WIDTH, 40), (0, SCREEN_HEIGHT - 70, SCREEN_WIDTH, 60)]
+
 class MatrixRain:
     def __init__(self):
         self.drops = []
         for i in range(50):
             self.drops.append({
-                'x': random.randint(0, SCREEN_WIDTH),
-                'y': random.randint(-SCREEN_HEIGHT, 0),
-                'speed': random.randint(2, 6),
-                'char': random.choice(['0', '1', 'IT', 'PC', 'CPU', 'RAM', 'GPU'])
+                'x': fx_random.randint(0, SCREEN_WIDTH),
+                'y': fx_random.randint(-SCREEN_HEIGHT, 0),
+                'speed': fx_random.randint(2, 6),
+                'char': fx_random.choice(['0', '1', 'IT', 'PC', 'CPU', 'RAM', 'GPU'])
             })
     
     def update(self):
         for drop in self.drops:
             drop['y'] += drop['speed']
             if drop['y'] > SCREEN_HEIGHT:
-                drop['y'] = random.randint(-100, -10)
-                drop['x'] = random.randint(0, SCREEN_WIDTH)
+                drop['y'] = fx_random.randint(-100, -10)
+                drop['x'] = fx_random.randint(0, SCREEN_WIDTH)
     
     def draw(self, screen):
-        font = pygame.font.Font(None, 20)
         for drop in self.drops:
-            text = font.render(drop['char'], True, TERMINAL_GREEN)
+            text = render_text(drop['char'], 20, TERMINAL_GREEN)
             screen.blit(text, (drop['x'], drop['y']))
+    
+    def rects(self):
+        # Screen areas draw() is about to blit into
+        return [pygame.Rect((drop['x'], drop['y']), render_text(drop['char'], 20, TERMINAL_GREEN).get_size())
+                for drop in self.drops]
 
 class Player:
     def __init__(self, x, y, character='moss'):
         self.x = x
         self.y = y
+        # Position before the latest simulation tick, for interpolated drawing
+        self.prev_x = x
+        self.prev_y = y
         self.width = 40
         self.height = 60
         self.speed = PLAYER_SPEED
@@ -88,7 +132,7 @@ class Player:
         # Curly hair
         hair_color = BROWN
         for i in range(8):
-            offset_x = random.randint(-2, 2) if self.blink_timer % 20 < 10 else 0
+            offset_x = fx_random.randint(-2, 2) if self.blink_timer % 20 < 10 else 0
             pygame.draw.circle(screen, hair_color, 
                              (self.x + 10 + i * 3 + offset_x, self.y + 5), 4)
         
@@ -172,7 +216,7 @@ class Player:
         # Hair texture/layers
         for i in range(6):
             hair_x = self.x + 10 + i * 4
-            hair_y = self.y + 5 + random.randint(-1, 1)
+            hair_y = self.y + 5 + fx_random.randint(-1, 1)
             pygame.draw.ellipse(screen, (220, 120, 60), (hair_x, hair_y, 4, 12))
         
         # Eyes
@@ -204,16 +248,50 @@ class Player:
             self.draw_jen(screen)
         elif self.character == 'roy':
             self.draw_roy(screen)
+    
+    def sprite_frame(self):
+        # Baked frame (see bake_sprites) showing the current animation phase
+        if self.character == 'moss':
+            if self.blink_timer % 20 < 10:
+                return 'moss_jitter', fx_random.randrange(SPRITE_VARIANTS)
+            return 'moss', 0
+        elif self.character == 'jen':
+            # Jen's hair strands wave with a 180 frame period
+            return 'jen', self.blink_timer % 180
+        else:  # roy
+            return 'roy', fx_random.randrange(SPRITE_VARIANTS)
+    
+    @staticmethod
+    def bake_sprites(atlas):
+        def frame(character, blink_timer):
+            def draw(surface, x, y):
+                player = Player(x, y, character)
+                player.blink_timer = blink_timer
+                player.draw(surface)
+            return draw
+        
+        atlas.bake('moss', [frame('moss', 10)], 40, 60)
+        atlas.bake('moss_jitter', [frame('moss', 0)] * SPRITE_VARIANTS, 40, 60)
+        atlas.bake('jen', [frame('jen', blink_timer) for blink_timer in range(180)], 40, 60)
+        atlas.bake('roy', [frame('roy', 0)] * SPRITE_VARIANTS, 40, 60)
 
 class Bullet:
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed')
+    
     def __init__(self, x, y):
+        self.reset(x, y)
+    
+    def reset(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.width = 6
         self.height = 12
         self.speed = BULLET_SPEED
         
     def update(self):
+        self.prev_x, self.prev_y = self.x, self.y
         self.y -= self.speed
         
     def draw(self, screen):
@@ -221,22 +299,45 @@ class Bullet:
         pygame.draw.rect(screen, RETRO_AMBER, (self.x, self.y, self.width, self.height))
         pygame.draw.rect(screen, WHITE, (self.x + 1, self.y + 1, self.width - 2, self.height - 2))
         
+    def sprite_frame(self):
+        return 'bullet', 0
+    
+    @staticmethod
+    def bake_sprites(atlas):
+        atlas.bake('bullet', [lambda surface, x, y: Bullet(x, y).draw(surface)], 6, 12)
+        
     def is_off_screen(self):
         return self.y < 0
 
 class Enemy:
-    def __init__(self, x, y):
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed', 'enemy_type', 'animation_timer',
+                 'spatial_hash')
+    
+    def __init__(self, x, y, enemy_type, spatial_hash=None):
+        self.reset(x, y, enemy_type, spatial_hash)
+    
+    def reset(self, x, y, enemy_type, spatial_hash=None):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.width = 50
         self.height = 40
         self.speed = ENEMY_SPEED
-        self.enemy_type = random.choice(['virus', 'bug', 'error'])
+        self.enemy_type = enemy_type
         self.animation_timer = 0
         
+        # Broad-phase grid kept in sync as the enemy moves
+        self.spatial_hash = spatial_hash
+        if spatial_hash is not None:
+            spatial_hash.insert(self)
+        
     def update(self):
+        self.prev_x, self.prev_y = self.x, self.y
         self.y += self.speed
         self.animation_timer += 1
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(self)
         
     def draw(self, screen):
         if self.enemy_type == 'virus':
@@ -247,15 +348,14 @@ class Enemy:
             # Glitchy effect
             if self.animation_timer % 20 < 10:
                 for i in range(5):
-                    x_offset = random.randint(-2, 2)
-                    y_offset = random.randint(-2, 2)
+                    x_offset = fx_random.randint(-2, 2)
+                    y_offset = fx_random.randint(-2, 2)
                     pygame.draw.rect(screen, MAGENTA, 
                                    (self.x + x_offset, self.y + y_offset, 
-                                    random.randint(5, 15), random.randint(2, 8)))
+                                    fx_random.randint(5, 15), fx_random.randint(2, 8)))
             
             # "VIRUS" text
-            font = pygame.font.Font(None, 12)
-            virus_text = font.render("VIRUS", True, WHITE)
+            virus_text = render_text("VIRUS", 12, WHITE)
             screen.blit(virus_text, (self.x + 5, self.y + self.height//2 - 5))
             
         elif self.enemy_type == 'bug':
@@ -267,13 +367,12 @@ class Enemy:
             for i in range(4):
                 start_x = self.x + 10 + i * 8
                 start_y = self.y + self.height
-                end_x = start_x + random.randint(-3, 3)
+                end_x = start_x + fx_random.randint(-3, 3)
                 end_y = start_y + 8
                 pygame.draw.line(screen, TERMINAL_GREEN, (start_x, start_y), (end_x, end_y), 2)
             
             # "BUG" text
-            font = pygame.font.Font(None, 12)
-            bug_text = font.render("BUG", True, WHITE)
+            bug_text = render_text("BUG", 12, WHITE)
             screen.blit(bug_text, (self.x + 10, self.y + self.height//2 - 5))
             
         else:  # error
@@ -288,73 +387,114 @@ class Enemy:
                 pygame.draw.line(screen, WHITE, (self.x + 35, self.y + 10), (self.x + 15, self.y + 30), 3)
             
             # "ERROR" text
-            font = pygame.font.Font(None, 10)
-            error_text = font.render("ERROR", True, WHITE)
+            error_text = render_text("ERROR", 10, WHITE)
             screen.blit(error_text, (self.x + 8, self.y + self.height - 12))
         
+    def sprite_frame(self):
+        # Baked frame (see bake_sprites) showing the current animation phase
+        if self.enemy_type == 'virus':
+            if self.animation_timer % 20 < 10:
+                return 'virus_glitch', fx_random.randrange(SPRITE_VARIANTS)
+            return 'virus', 0
+        elif self.enemy_type == 'bug':
+            return 'bug', fx_random.randrange(SPRITE_VARIANTS)
+        else:  # error
+            return 'error', 0 if self.animation_timer % 40 < 20 else 1
+    
+    @staticmethod
+    def bake_sprites(atlas):
+        def frame(enemy_type, animation_timer):
+            def draw(surface, x, y):
+                enemy = Enemy(x, y, enemy_type)
+                enemy.animation_timer = animation_timer
+                enemy.draw(surface)
+            return draw
+        
+        # Randomized phases (glitch, legs) get a few baked variants each
+        atlas.bake('virus', [frame('virus', 10)], 50, 40)
+        atlas.bake('virus_glitch', [frame('virus', 0)] * SPRITE_VARIANTS, 50, 40)
+        atlas.bake('bug', [frame('bug', 0)] * SPRITE_VARIANTS, 50, 40)
+        atlas.bake('error', [frame('error', 0), frame('error', 20)], 50, 40)
+        
     def is_off_screen(self):
         return self.y > SCREEN_HEIGHT
 
+class Particle:
+    __slots__ = ('x', 'y', 'vx', 'vy', 'color')
+
 class Explosion:
+    __slots__ = ('x', 'y', 'timer', 'max_timer', 'particles')
+    
     def __init__(self, x, y):
+        self.reset(x, y)
+    
+    def reset(self, x, y):
         self.x = x
         self.y = y
         self.timer = 0
         self.max_timer = 30
-        self.particles = []
-        
-        # Create particles
-        for _ in range(15):
-            self.particles.append({
-                'x': x,
-                'y': y,
-                'vx': random.randint(-5, 5),
-                'vy': random.randint(-5, 5),
-                'color': random.choice([RETRO_AMBER, WHITE, YELLOW, ORANGE])
-            })
+        
+        # Create particles (a pooled explosion reuses its particle objects)
+        if getattr(self, 'particles', None) is None:
+            self.particles = [Particle() for _ in range(15)]
+        for particle in self.particles:
+            particle.x = x
+            particle.y = y
+            particle.vx = fx_random.randint(-5, 5)
+            particle.vy = fx_random.randint(-5, 5)
+            particle.color = fx_random.choice(EXPLOSION_COLORS)
     
     def update(self):
         self.timer += 1
         for particle in self.particles:
-            particle['x'] += particle['vx']
-            particle['y'] += particle['vy']
-            particle['vy'] += 0.2  # gravity
+            particle.x += particle.vx
+            particle.y += particle.vy
+            particle.vy += 0.2  # gravity
     
-    def draw(self, screen):
+    def draw(self, screen, camera=None):
         alpha = 1 - (self.timer / self.max_timer)
         for particle in self.particles:
             size = max(1, int(5 * alpha))
-            pygame.draw.circle(screen, particle['color'], 
-                             (int(particle['x']), int(particle['y'])), size)
+            center = (int(particle.x), int(particle.y))
+            if camera is not None:
+                center = camera.to_screen(*center)
+                size = camera.scale(size)
+            pygame.draw.circle(screen, particle.color, center, size)
+    
+    def bounds(self, camera):
+        # Screen rect covering every particle as draw() is about to draw it
+        xs = [int(particle.x) for particle in self.particles]
+        ys = [int(particle.y) for particle in self.particles]
+        radius = 5
+        return camera.rect_to_screen(min(xs) - radius, min(ys) - radius,
+                                     max(xs) - min(xs) + 2 * radius, max(ys) - min(ys) + 2 * radius)
     
     def is_finished(self):
         return self.timer >= self.max_timer
 
 class CharacterSelect:
-    def __init__(self):
+    def __init__(self, sprites=None):
+        self.sprites = sprites
         self.selected_character = 'moss'
         self.characters = ['moss', 'jen', 'roy']
         self.character_index = 0
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
-        
-    def handle_events(self, event):
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_LEFT:
-                self.character_index = (self.character_index - 1) % len(self.characters)
-                self.selected_character = self.characters[self.character_index]
-            elif event.key == pygame.K_RIGHT:
-                self.character_index = (self.character_index + 1) % len(self.characters)
-                self.selected_character = self.characters[self.character_index]
-            elif event.key == pygame.K_RETURN:
-                return True
+        
+    def handle_key(self, key):
+        if key == pygame.K_LEFT:
+            self.character_index = (self.character_index - 1) % len(self.characters)
+            self.selected_character = self.characters[self.character_index]
+        elif key == pygame.K_RIGHT:
+            self.character_index = (self.character_index + 1) % len(self.characters)
+            self.selected_character = self.characters[self.character_index]
+        elif key == pygame.K_RETURN:
+            return True
         return False
     
     def draw(self, screen):
         screen.fill(BLACK)
         
         # Title
-        title = self.font.render("SELECT YOUR IT EXPERT", True, TERMINAL_GREEN)
+        title = render_text("SELECT YOUR IT EXPERT", 36, TERMINAL_GREEN)
         screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
         
         # Character names and descriptions
@@ -375,12 +515,15 @@ class CharacterSelect:
             
             # Draw character sprite
             temp_player = Player(x - 20, y, char)
-            temp_player.draw(screen)
+            if self.sprites is not None:
+                self.sprites.draw(screen, temp_player)
+            else:
+                temp_player.draw(screen)
             
             # Draw character info
             name, title, special = character_info[char]
-            name_text = self.small_font.render(name, True, RETRO_AMBER)
-            title_text = self.small_font.render(title, True, WHITE)
+            name_text = render_text(name, 24, RETRO_AMBER)
+            title_text = render_text(title, 24, WHITE)
             
             screen.blit(name_text, (x - name_text.get_width()//2, y + 80))
             screen.blit(title_text, (x - title_text.get_width()//2, y + 100))
@@ -393,18 +536,105 @@ class CharacterSelect:
         ]
         
         for i, instruction in enumerate(instructions):
-            text = self.small_font.render(instruction, True, CRT_BLUE)
+            text = render_text(instruction, 24, CRT_BLUE)
             screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 450 + i * 25))
 
+def new_sprite_atlas():
+    # Atlas with every sprite queued for baking (build() or bake_step())
+    atlas = SpriteAtlas()
+    Player.bake_sprites(atlas)
+    Bullet.bake_sprites(atlas)
+    Enemy.bake_sprites(atlas)
+    return atlas
+
 class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("IT Crowd: Debug the System!")
+    def __init__(self, headless=False, entity_store=False, sprite_atlas=True,
+                 crt_effects=('scanlines',), dirty_rects=False, dirty_log=None,
+                 pool_sizes=None, seed=None, particle_system=True, frame_metrics=False,
+                 frame_export=False, startup=None, asset_cache=True):
+        # Start-up phases are timed from here unless the caller started the timer
+        self.startup = startup or StartupTimer()
+        
+        # Simulation randomness comes from this game's own seeded stream,
+        # cosmetic randomness from rng.fx_random
+        self.seed = new_seed() if seed is None else seed
+        self.sim_random = random.Random(self.seed)
+        seed_fx(self.seed)
+        
+        # Headless games never open a window and are never drawn
+        self.headless = headless
+        if headless:
+            self.screen = None
+        else:
+            init_subsystems()
+            self.startup.mark('subsystems')
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.startup.mark('window')
+            pygame.display.set_caption("IT Crowd: Debug the System!")
         self.clock = pygame.time.Clock()
         
+        # Input gathered by handle_events for the next tick
+        self.pending_keydowns = []
+        self.held_left = self.held_right = False
+        # Optional replay.InputRecorder, fed every tick's input
+        self.recorder = None
+        # Optional session_recorder.SessionRecorder, fed every drawn frame
+        self.session_recorder = None
+        # Optional frame_shm.FramePublisher, fed every drawn frame
+        self.frame_publisher = None
+        # Optional input_latency.InputPipeline: timestamped input, late input
+        self.input_pipeline = None
+        # Set by rollback.py while it simulates frames again: the matrix rain
+        # and the particle system, which snapshots do not cover, stay put
+        self.resimulating = False
+        
+        # Per-phase frame timing, shown with F3 (see frame_metrics.py)
+        self.metrics = FrameMetrics() if frame_metrics else NULL_METRICS
+        # Profiles the next frames on F9 (see profiler_capture.py)
+        self.profiler = ProfilerCapture(VARIANT)
+        # NumPy views of the drawn frames (see frame_export.py): True for
+        # the default FrameExporter, or a configured one
+        self.frame_export = FrameExporter() if frame_export is True else (frame_export or None)
+        
+        # CRT post-processing, built once for the screen resolution
+        self.crt = None
+        if crt_effects and not headless:
+            self.crt = get_overlay((SCREEN_WIDTH, SCREEN_HEIGHT), crt_effects)
+            self.startup.mark('crt overlay')
+        
+        # Opt-in dirty-rectangle rendering
+        self.dirty_renderer = None
+        if dirty_rects and not headless:
+            self.dirty_renderer = DirtyRectRenderer((SCREEN_WIDTH, SCREEN_HEIGHT), overlay=self.crt,
+                                                    log=dirty_log)
+        
+        # World-to-screen transform for the game layer (shake, pan, zoom)
+        self.camera = Camera((SCREEN_WIDTH, SCREEN_HEIGHT))
+        
+        # Baked sprites and rendered text kept on disk between runs
+        # (asset_cache True: the default directory, or a directory path)
+        self.assets = None
+        if asset_cache and not headless:
+            directory = default_asset_cache() if asset_cache is True else asset_cache
+            self.assets = AssetCache(directory, VARIANT, (SCREEN_WIDTH, SCREEN_HEIGHT), __file__)
+            self.assets.load_text(text_cache)
+            self.startup.mark('cached text')
+        
+        # Pre-rendered character and enemy animation frames, loaded from the
+        # asset cache or baked in the spare time of the first frames, which
+        # draw entities procedurally meanwhile
+        self.sprites = None
+        self.sprite_baker = None
+        if sprite_atlas and not headless:
+            if self.assets is not None:
+                self.sprites = self.assets.load_atlas()
+            if self.sprites is None:
+                self.sprite_baker = new_sprite_atlas()
+            self.startup.mark('sprites')
+        
         # Game state
         self.state = 'character_select'  # 'character_select', 'playing'
-        self.character_select = CharacterSelect()
+        self.character_select = CharacterSelect(self.sprites)
         
         # Background effect
         self.matrix_rain = MatrixRain()
@@ -413,13 +643,32 @@ class Game:
         self.player = None
         self.bullets = []
         self.enemies = []
+        self.enemy_grid = SpatialHash(64)
+        # Pooled entities: acquired instead of constructed, released when they
+        # leave the game
+        pool_sizes = dict(POOL_SIZES, **(pool_sizes or {}))
+        self.bullet_pool = ObjectPool(Bullet, pool_sizes['bullet'])
+        self.enemy_pool = ObjectPool(Enemy, pool_sizes['enemy'])
+        self.explosion_pool = ObjectPool(Explosion, pool_sizes['explosion'])
+        
+        # Optional NumPy-backed bullets and enemies; the lists become the
+        # stores' live view lists
+        self.entity_store = entity_store
+        if entity_store:
+            self.bullet_store = EntityStore(Bullet)
+            self.enemy_store = EntityStore(Enemy, kinds=ENEMY_TYPES)
+            self.bullets = self.bullet_store.views
+            self.enemies = self.enemy_store.views
+        
         self.explosions = []
+        # With NumPy, explosions are emitted into one vectorized particle
+        # system instead of being Explosion objects
+        self.particles = None
+        if particle_system and particle_system_available():
+            self.particles = ParticleSystem(EXPLOSION_COLORS)
         self.score = 0
-        
-        # Fonts
-        self.font_large = pygame.font.Font(None, 36)
-        self.font_medium = pygame.font.Font(None, 24)
-        self.font_small = pygame.font.Font(None, 18)
+        # Enemies that reached the bottom of the screen unharmed
+        self.enemies_escaped = 0
         
         # Enemy spawn timer
         self.enemy_spawn_timer = 0
@@ -427,139 +676,384 @@ class Game:
         
         # Screen effects
         self.screen_shake = 0
+        self.startup.mark('game objects')
     
     def start_game(self, character):
         self.player = Player(SCREEN_WIDTH // 2 - 20, SCREEN_HEIGHT - 80, character)
-        self.bullets = []
-        self.enemies = []
+        if self.entity_store:
+            self.bullet_store.clear()
+            self.enemy_store.clear()
+        else:
+            self.bullet_pool.release_all(self.bullets)
+            self.enemy_pool.release_all(self.enemies)
+            self.bullets = []
+            self.enemies = []
+            self.enemy_grid.clear()
+        self.explosion_pool.release_all(self.explosions)
         self.explosions = []
+        if self.particles is not None:
+            self.particles.clear()
         self.score = 0
+        self.enemies_escaped = 0
         self.enemy_spawn_timer = 0
         self.screen_shake = 0
         self.state = 'playing'
         
     def handle_events(self):
-        for event in pygame.event.get():
+        # Key presses are queued for the next simulation tick; held keys are
+        # sampled once per rendered frame and apply to every tick
+        events = pygame.event.get() if self.input_pipeline is None else self.input_pipeline.events()
+        for event in events:
             if event.type == pygame.QUIT:
                 return False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_metrics_overlay()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+                self.profiler.request()
+            elif event.type == pygame.KEYDOWN:
+                self.pending_keydowns.append(event.key)
+            elif event.type == pygame.VIDEOEXPOSE and self.dirty_renderer is not None:
+                self.dirty_renderer.invalidate()
+        
+        keys = pygame.key.get_pressed()
+        self.held_left = keys[pygame.K_LEFT] or keys[pygame.K_a]
+        self.held_right = keys[pygame.K_RIGHT] or keys[pygame.K_d]
             
+        return True
+    
+    def tick(self):
+        # One fixed simulation step
+        keydowns = self.pending_keydowns
+        self.pending_keydowns = []
+        if self.player is not None:
+            self.player.prev_x, self.player.prev_y = self.player.x, self.player.y
+        if self.recorder is not None:
+            self.recorder.record(keydowns, self.held_left, self.held_right)
+        if self.input_pipeline is not None:
+            self.input_pipeline.apply_input(self, keydowns, self.held_left, self.held_right)
+        else:
+            self.apply_input(keydowns, self.held_left, self.held_right)
+        self.metrics.lap('update:input')
+        self.update()
+    
+    def toggle_metrics_overlay(self):
+        # Measuring starts with the first F3 when the game was started without it
+        if not self.metrics.enabled:
+            self.metrics = FrameMetrics()
+        self.metrics.toggle_overlay()
+        if self.dirty_renderer is not None:
+            self.dirty_renderer.invalidate()
+    
+    def apply_input(self, keydowns, left, right):
+        # Shared by tick() and scripted (headless) input
+        for key in keydowns:
             if self.state == 'character_select':
-                if self.character_select.handle_events(event):
+                if self.character_select.handle_key(key):
                     self.start_game(self.character_select.selected_character)
             
             elif self.state == 'playing':
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        bullet_x = self.player.x + self.player.width // 2 - 3
-                        bullet_y = self.player.y
-                        self.bullets.append(Bullet(bullet_x, bullet_y))
-                    elif event.key == pygame.K_ESCAPE:
-                        self.state = 'character_select'
+                if key == pygame.K_SPACE:
+                    self.shoot()
+                elif key == pygame.K_ESCAPE:
+                    self.state = 'character_select'
         
         if self.state == 'playing':
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+            if left:
                 self.player.move_left()
-            if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+            if right:
                 self.player.move_right()
-            
-        return True
+    
+    def shoot(self, player=None):
+        # player: who fires, if not self.player (netplay.py sessions have several)
+        player = player or self.player
+        bullet_x = player.x + player.width // 2 - 3
+        bullet_y = player.y
+        bullet = self.bullet_pool.acquire(bullet_x, bullet_y)
+        if self.entity_store:
+            # The store copies the bullet, so it goes straight back
+            self.bullet_store.add(bullet)
+            self.bullet_pool.release(bullet)
+        else:
+            self.bullets.append(bullet)
     
     def update(self):
-        self.matrix_rain.update()
+        metrics = self.metrics
+        if not self.resimulating:
+            self.matrix_rain.update()
+        metrics.lap('update:rain')
         
         if self.state == 'playing':
-            self.player.update()
+            # netplay.py sessions play without self.player and update their
+            # own players
+            if self.player is not None:
+                self.player.update()
+            metrics.lap('update:player')
             
-            for bullet in self.bullets[:]:
-                bullet.update()
-                if bullet.is_off_screen():
-                    self.bullets.remove(bullet)
+            if self.entity_store:
+                self.bullet_store.move(-1)
+                self.bullet_store.cull(min_y=0)
+                metrics.lap('update:bullets')
+                self.enemy_store.move(1)
+                self.enemies_escaped += self.enemy_store.cull(max_y=SCREEN_HEIGHT)
+                metrics.lap('update:enemies')
+            else:
+                for bullet in self.bullets[:]:
+                    bullet.update()
+                    if bullet.is_off_screen():
+                        self.bullets.remove(bullet)
+                        self.bullet_pool.release(bullet)
+                metrics.lap('update:bullets')
             
-            for enemy in self.enemies[:]:
-                enemy.update()
-                if enemy.is_off_screen():
-                    self.enemies.remove(enemy)
+                for enemy in self.enemies[:]:
+                    enemy.update()
+                    if enemy.is_off_screen():
+                        self.enemies.remove(enemy)
+                        self.enemy_grid.remove(enemy)
+                        self.enemy_pool.release(enemy)
+                        self.enemies_escaped += 1
+                metrics.lap('update:enemies')
             
             # Update explosions
+            if self.particles is not None and not self.resimulating:
+                self.particles.update()
             for explosion in self.explosions[:]:
                 explosion.update()
                 if explosion.is_finished():
                     self.explosions.remove(explosion)
+                    self.explosion_pool.release(explosion)
+            metrics.lap('update:explosions')
             
             self.enemy_spawn_timer += 1
             if self.enemy_spawn_timer >= self.enemy_spawn_delay:
-                enemy_x = random.randint(0, SCREEN_WIDTH - 50)
-                self.enemies.append(Enemy(enemy_x, -40))
+                enemy_x = self.sim_random.randint(0, SCREEN_WIDTH - 50)
+                enemy_type = self.sim_random.choice(ENEMY_TYPES)
+                self.spawn_enemy(enemy_x, -40, enemy_type)
                 self.enemy_spawn_timer = 0
+            metrics.lap('update:spawning')
             
             self.check_collisions()
             
             # Update screen shake
             if self.screen_shake > 0:
                 self.screen_shake -= 1
+            metrics.lap('update:collisions')
+    
+    def spawn_enemy(self, x, y, enemy_type):
+        # Returns the enemy (or its entity store view)
+        if self.entity_store:
+            # The store copies the enemy, so it goes straight back
+            enemy = self.enemy_pool.acquire(x, y, enemy_type)
+            view = self.enemy_store.add(enemy)
+            self.enemy_pool.release(enemy)
+            return view
+        enemy = self.enemy_pool.acquire(x, y, enemy_type, self.enemy_grid)
+        self.enemies.append(enemy)
+        return enemy
+    
+    def bake_assets(self, budget=BAKE_BUDGET):
+        # Continues baking the sprite atlas (all of it when budget is None)
+        # and draws with it once it is done
+        baker = self.sprite_baker
+        if baker is None or not baker.bake_step(budget):
+            return
+        self.sprites = baker.build()
+        self.sprite_baker = None
+        self.character_select.sprites = self.sprites
+        if self.dirty_renderer is not None:
+            self.dirty_renderer.invalidate()
+        if self.assets is not None:
+            self.assets.save_atlas(self.sprites)
+    
+    def explode(self, x, y):
+        if self.particles is not None:
+            if not self.resimulating:
+                self.particles.emit(x, y)
+        else:
+            self.explosions.append(self.explosion_pool.acquire(x, y))
     
     def check_collisions(self):
-        for bullet in self.bullets[:]:
-            for enemy in self.enemies[:]:
-                if (bullet.x < enemy.x + enemy.width and
-                    bullet.x + bullet.width > enemy.x and
-                    bullet.y < enemy.y + enemy.height and
-                    bullet.y + bullet.height > enemy.y):
-                    
-                    # Create explosion
-                    explosion_x = enemy.x + enemy.width // 2
-                    explosion_y = enemy.y + enemy.height // 2
-                    self.explosions.append(Explosion(explosion_x, explosion_y))
-                    
-                    self.bullets.remove(bullet)
-                    self.enemies.remove(enemy)
-                    self.score += 10
-                    self.screen_shake = 5
-                    break
-    
-    def draw(self):
+        if self.entity_store:
+            self.check_collisions_batched()
+            return
+        
+        # Each bullet only tests the enemies sharing a grid cell with it and
+        # hits the earliest spawned one it overlaps
+        hit_bullets = set()
+        for bullet in self.bullets:
+            enemy = self.enemy_grid.first_overlap(bullet)
+            if enemy is not None:
+                # Create explosion
+                explosion_x = enemy.x + enemy.width // 2
+                explosion_y = enemy.y + enemy.height // 2
+                self.explode(explosion_x, explosion_y)
+                
+                self.enemy_grid.remove(enemy)
+                hit_bullets.add(bullet)
+                self.score += 10
+                self.screen_shake = 5
+        
+        if hit_bullets:
+            self.bullet_pool.release_all([b for b in self.bullets if b in hit_bullets])
+            self.bullets[:] = [b for b in self.bullets if b not in hit_bullets]
+            self.enemy_pool.release_all([e for e in self.enemies if e not in self.enemy_grid])
+            self.enemies[:] = [e for e in self.enemies if e in self.enemy_grid]
+    
+    def check_collisions_batched(self):
+        # Same hits as check_collisions, found with vectorized overlap tests
+        hits = find_hits(self.bullet_store, self.enemy_store)
+        for bullet, enemy in hits:
+            # Create explosion
+            explosion_x = enemy.x + enemy.width // 2
+            explosion_y = enemy.y + enemy.height // 2
+            self.explode(explosion_x, explosion_y)
+            
+            self.score += 10
+            self.screen_shake = 5
+        
+        if hits:
+            self.bullet_store.remove([bullet for bullet, _ in hits])
+            self.enemy_store.remove([enemy for _, enemy in hits])
+    
+    def draw(self, alpha=1.0):
+        # alpha: how far between the last two simulation ticks to draw
+        if self.frame_export is not None:
+            # Views of the last frame lock the surfaces about to be drawn on
+            self.frame_export.release(alpha)
+        if self.dirty_renderer is not None:
+            self.draw_dirty(alpha)
+            return
+        metrics = self.metrics
+        
         if self.state == 'character_select':
             self.character_select.draw(self.screen)
+            metrics.lap('draw:menu')
         
         elif self.state == 'playing':
-            # Screen shake effect
-            shake_x = random.randint(-self.screen_shake, self.screen_shake) if self.screen_shake > 0 else 0
-            shake_y = random.randint(-self.screen_shake, self.screen_shake) if self.screen_shake > 0 else 0
+            # Screen shake moves the camera; the game layer is drawn straight
+            # onto the screen at camera-transformed positions
+            self.camera.begin_frame(self.screen_shake, alpha)
             
             self.screen.fill(BLACK)
+            metrics.lap('draw:clear')
             
-            # Draw matrix rain background
+            # Draw matrix rain background (not affected by shake)
             self.matrix_rain.draw(self.screen)
+            metrics.lap('draw:rain')
             
-            # Create a surface for the main game to apply shake effect
-            game_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            game_surface.fill(BLACK)
-            game_surface.set_colorkey(BLACK)
-            
-            # Draw game objects on the game surface
-            self.player.draw(game_surface)
-            
-            for bullet in self.bullets:
-                bullet.draw(game_surface)
-                
-            for enemy in self.enemies:
-                enemy.draw(game_surface)
-            
-            for explosion in self.explosions:
-                explosion.draw(game_surface)
-            
-            # Blit the game surface with shake effect
-            self.screen.blit(game_surface, (shake_x, shake_y))
+            self.draw_game_layer()
             
             # Draw UI (not affected by shake)
             self.draw_ui()
+            metrics.lap('draw:ui')
         
-        # Draw retro scanlines effect
-        for y in range(0, SCREEN_HEIGHT, 4):
-            pygame.draw.line(self.screen, (0, 50, 0), (0, y), (SCREEN_WIDTH, y))
+        # Draw retro scanlines (and any other CRT effects)
+        if self.crt is not None:
+            self.crt.apply(self.screen)
+        metrics.lap('draw:crt')
         
+        metrics.draw_overlay(self.screen)
+        metrics.lap('draw:metrics')
         pygame.display.flip()
+        metrics.lap('present')
+    
+    def draw_game_layer(self, screen=None):
+        # Draw game objects (onto the screen unless given another surface)
+        if screen is None:
+            screen = self.screen
+        self.camera.draw(screen, self.player, self.sprites)
+        
+        for bullet in self.bullets:
+            self.camera.draw(screen, bullet, self.sprites)
+            
+        for enemy in self.enemies:
+            self.camera.draw(screen, enemy, self.sprites)
+        self.metrics.lap('draw:sprites')
+        
+        for explosion in self.explosions:
+            explosion.draw(screen, self.camera)
+        if self.particles is not None:
+            self.particles.draw(screen, self.camera)
+        self.metrics.lap('draw:explosions')
+    
+    def draw_rects(self):
+        # Everything the matrix rain and draw_game_layer are about to touch
+        rects = self.matrix_rain.rects()
+        rects.append(self.camera.bounds(self.player, PADDING))
+        for bullet in self.bullets:
+            rects.append(self.camera.bounds(bullet, PADDING))
+        for enemy in self.enemies:
+            rects.append(self.camera.bounds(enemy, PADDING))
+        for explosion in self.explosions:
+            rects.append(explosion.bounds(self.camera))
+        if self.particles is not None and len(self.particles):
+            rects.append(self.particles.bounds(self.camera))
+        if self.metrics.visible:
+            rects.append(self.metrics.overlay_rect())
+        return rects
+    
+    def draw_dirty(self, alpha=1.0):
+        # Same frame as draw(), but only the regions that changed since the
+        # last frame are cleared, redrawn and presented
+        renderer = self.dirty_renderer
+        metrics = self.metrics
+        if self.state == 'character_select':
+            # The menu is static apart from key presses: draw it in full and
+            # start the game from a full frame
+            renderer.invalidate()
+            self.character_select.draw(self.screen)
+            metrics.lap('draw:menu')
+            if self.crt is not None:
+                self.crt.apply(self.screen)
+            metrics.lap('draw:crt')
+            metrics.draw_overlay(self.screen)
+            metrics.lap('draw:metrics')
+            pygame.display.flip()
+            metrics.lap('present')
+            return
+        
+        self.camera.begin_frame(self.screen_shake, alpha)
+        renderer.begin_frame(self.draw_rects(), HUD_BLOCKS, (self.player.character, self.score))
+        renderer.erase(self.screen)
+        metrics.lap('draw:clear')
+        
+        self.matrix_rain.draw(self.screen)
+        metrics.lap('draw:rain')
+        self.draw_game_layer()
+        
+        renderer.draw_hud(self.screen, self.draw_ui)
+        metrics.lap('draw:ui')
+        renderer.apply_overlay(self.screen, self.crt)
+        metrics.lap('draw:crt')
+        metrics.draw_overlay(self.screen)
+        metrics.lap('draw:metrics')
+        renderer.present()
+        metrics.lap('present')
+    
+    def frame_array(self, layer='frame'):
+        # The last drawn frame (or another of frame_export.LAYERS) as a
+        # (height, width, 3) uint8 view of its pixels, valid until the next
+        # draw()
+        return self.frame_export.view(layer, self.frame_surface(layer))
+    
+    def observation(self, layer='frame', out=None):
+        # The same, downsampled and/or grayscale as frame_export is set up
+        return self.frame_export.observation(layer, self.frame_surface(layer), out)
+    
+    def frame_surface(self, layer):
+        if self.screen is None:
+            raise RuntimeError("Headless games are never drawn")
+        if self.frame_export is None:
+            self.frame_export = FrameExporter()
+        if layer == 'frame':
+            return self.screen
+        if layer not in FRAME_LAYERS:
+            raise ValueError(f"Unknown layer {layer!r}, expected one of: {', '.join(FRAME_LAYERS)}")
+        surface, stale = self.frame_export.layer_surface(layer, self.screen.get_size())
+        if stale:
+            surface.fill(BLACK)
+            if self.state == 'playing':
+                self.draw_game_layer(surface)
+        return surface
     
     def draw_ui(self):
         # Draw retro-style UI border
@@ -569,7 +1063,7 @@ class Game:
         # Draw score with character name
         character_names = {'moss': 'MOSS', 'jen': 'JEN', 'roy': 'ROY'}
         char_name = character_names.get(self.player.character, 'UNKNOWN')
-        score_text = self.font_medium.render(f"{char_name} - SYSTEM INTEGRITY: {self.score}%", True, TERMINAL_GREEN)
+        score_text = render_text(f"{char_name} - SYSTEM INTEGRITY: {self.score}%", 24, TERMINAL_GREEN)
         self.screen.blit(score_text, (10, 12))
         
         # Draw IT Crowd inspired status messages
@@ -579,7 +1073,7 @@ class Game:
             "SYSTEM STATUS: OPERATIONAL"
         ]
         current_message = status_messages[min(2, self.score // 50)]
-        status_text = self.font_small.render(current_message, True, RETRO_AMBER)
+        status_text = render_text(current_message, 18, RETRO_AMBER)
         self.screen.blit(status_text, (SCREEN_WIDTH - status_text.get_width() - 10, 15))
         
         # Draw instructions
@@ -590,20 +1084,142 @@ class Game:
         ]
         
         for i, instruction in enumerate(instructions):
-            text = self.font_small.render(instruction, True, CRT_BLUE)
+            text = render_text(instruction, 18, CRT_BLUE)
             self.screen.blit(text, (10, SCREEN_HEIGHT - 70 + i * 20))
     
-    def run(self):
+    def run(self, tick_rate=DEFAULT_TICK_RATE, max_fps=60, metrics_path=None):
+        # The simulation runs at tick_rate ticks per second whatever the
+        # frame rate; max_fps caps rendering (0 for uncapped). metrics_path:
+        # CSV or JSON file the frame metrics are written to on exit.
+        timestep = FixedTimestep(tick_rate)
         running = True
-        while running:
-            running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(60)
-        
-        pygame.quit()
+        # The teardown runs however the loop ends (an exception, Ctrl+C), so
+        # recordings, captures and exports are always completed
+        try:
+            while running:
+                metrics = self.metrics
+                metrics.begin_frame()
+                running = self.handle_events()
+                metrics.lap('events')
+                ticks = timestep.advance()
+                if self.input_pipeline is not None:
+                    ticks = self.input_pipeline.schedule(timestep, ticks, self.pending_keydowns)
+                for _ in range(ticks):
+                    self.tick()
+                self.draw(timestep.alpha)
+                if self.input_pipeline is not None:
+                    self.input_pipeline.presented(timestep.alpha)
+                if self.session_recorder is not None:
+                    self.session_recorder.capture(self.screen, timestep.frames, timestep.ticks)
+                    metrics.lap('record')
+                if self.frame_publisher is not None:
+                    self.frame_publisher.publish_game(self)
+                    metrics.lap('publish')
+                self.bake_assets()
+                metrics.lap('assets')
+                if self.input_pipeline is not None:
+                    self.input_pipeline.wait(self.clock, max_fps)
+                else:
+                    self.clock.tick(max_fps)
+                metrics.lap('idle')
+                metrics.end_frame()
+                self.profiler.end_frame(self)
+                if timestep.frames == 1:
+                    self.startup.mark('first frame')
+                    print(self.startup.report())
+        finally:
+            self.profiler.close(self)
+            if self.assets is not None:
+                self.assets.save_text(text_cache)
+            
+            print(f"Simulated {timestep.ticks} ticks in {timestep.frames} frames, "
+                  f"dropped {timestep.dropped_ticks} ticks")
+            if self.recorder is not None:
+                self.recorder.close(self)
+            if self.session_recorder is not None:
+                self.session_recorder.close()
+            if self.frame_publisher is not None:
+                self.frame_publisher.close()
+            if self.input_pipeline is not None:
+                self.input_pipeline.close()
+            
+            if self.metrics.enabled and metrics_path:
+                self.metrics.export(metrics_path)
+                frame = self.metrics.summary()['frame']
+                if frame is not None:
+                    print(f"Frame metrics for the last {len(self.metrics)} frames written to {metrics_path}: "
+                          f"mean {frame['mean_ms']:.2f} ms, p99 {frame['p99_ms']:.2f} ms, max {frame['max_ms']:.2f} ms")
+            
+            if self.dirty_renderer is not None:
+                renderer = self.dirty_renderer
+                print(f"Dirty rects: {renderer.mean_dirty_percent():.1f}% of the screen per frame on average, "
+                      f"{renderer.full_frames} of {renderer.frame} frames drawn in full")
+            
+            pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="IT Crowd: Debug the System!")
+    parser.add_argument('--crt', default='scanlines',
+                        help="comma-separated CRT effects: scanlines, vignette, tint, curvature, or 'none'")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="redraw and present only the screen regions that changed")
+    parser.add_argument('--dirty-log', type=argparse.FileType('w'), default=None,
+                        help="write the dirty-area percentage of every frame to this CSV file")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for the simulation (random if omitted)")
+    parser.add_argument('--record', metavar='FILE', default=None,
+                        help="record the session's input to FILE for headless.py --replay")
+    parser.add_argument('--record-frames', metavar='FILE', default=None,
+                        help="record the drawn frames to FILE (compressed, with a FILE.timing.csv sidecar)")
+    parser.add_argument('--record-pipe', metavar='COMMAND', default=None,
+                        help="stream raw frames to COMMAND's stdin, e.g. an ffmpeg command line using "
+                             "{width}, {height}, {pix_fmt} and {fps}")
+    parser.add_argument('--record-policy', choices=RECORD_POLICIES, default='decimate',
+                        help="what frame recording does when the writer falls behind")
+    parser.add_argument('--publish-frames', metavar='NAME', default=None,
+                        help="publish every drawn frame to the shared memory NAME (see frame_shm.py)")
+    parser.add_argument('--input-latency', metavar='FILE', default=None,
+                        help="measure key-press-to-screen latency and write its histograms to FILE (.csv or .json) on exit")
+    parser.add_argument('--late-input', action='store_true',
+                        help="act on key presses as soon as they arrive instead of at the next frame")
+    parser.add_argument('--tick-rate', type=int, default=DEFAULT_TICK_RATE,
+                        help="simulation ticks per second")
+    parser.add_argument('--fps', type=int, default=60,
+                        help="rendering frame rate cap (0 for uncapped)")
+    parser.add_argument('--metrics', metavar='FILE', default=None,
+                        help="time every frame's phases and write them to FILE (.csv or .json) on exit")
+    parser.add_argument('--profile-frames', type=int, default=PROFILE_FRAMES,
+                        help="frames covered by each profiler capture (F9 starts one)")
+    parser.add_argument('--profile-after', type=int, metavar='FRAME', default=None,
+                        help="also start a profiler capture once FRAME frames have been drawn")
+    parser.add_argument('--profiler', choices=PROFILER_MODES, default='cprofile',
+                        help="cProfile, or the lower-overhead stack sampler")
+    parser.add_argument('--profile-dir', default='.',
+                        help="directory profiler captures are written to")
+    parser.add_argument('--asset-cache', metavar='DIR', default=None,
+                        help="directory of the baked asset cache (default: $RETRO_GAME_CACHE or ~/.cache/retro-game)")
+    parser.add_argument('--no-asset-cache', action='store_true',
+                        help="bake sprites and render text from scratch without touching the cache")
+    args = parser.parse_args()
+    
+    # Times interpreter start-up and imports too
+    startup = StartupTimer(from_process_start=True)
+    game = Game(crt_effects=parse_effects(args.crt), dirty_rects=args.dirty_rects or args.dirty_log is not None,
+                dirty_log=args.dirty_log,
+                seed=args.seed, frame_metrics=args.metrics is not None, startup=startup,
+                asset_cache=False if args.no_asset_cache else args.asset_cache or True)
+    game.profiler = ProfilerCapture(VARIANT, args.profile_frames, args.profiler, args.profile_dir)
+    if args.profile_after is not None:
+        game.profiler.request(args.profile_after)
+    if args.record:
+        # The game starts on the character select screen
+        game.recorder = InputRecorder(args.record, VARIANT, game.seed, args.tick_rate, 'menu')
+    if args.record_frames or args.record_pipe:
+        game.session_recorder = SessionRecorder(args.record_frames, args.record_pipe, policy=args.record_policy,
+                                                fps=args.fps or args.tick_rate, variant=VARIANT)
+    if args.publish_frames:
+        game.frame_publisher = FramePublisher(args.publish_frames, game.screen.get_size())
+    if args.input_latency or args.late_input:
+        game.input_pipeline = InputPipeline(late=args.late_input, path=args.input_latency)
+    game.run(tick_rate=args.tick_rate, max_fps=args.fps, metrics_path=args.metrics)
\ No newline at end of file
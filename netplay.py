@@ -0,0 +1,770 @@
+import argparse
+import asyncio
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+
+import headless
+from pools import ObjectPool
+from timestep import DEFAULT_TICK_RATE
+
+# Network multiplayer for it-crowd.py: an authoritative asyncio server runs
+# the game rules (Game.update, check_collisions) for sessions in which Moss,
+# Jen and Roy play together, and streams state snapshots to the clients.
+#
+#   python netplay.py server --port 5555 --send-rate 20
+#   python netplay.py client --host 127.0.0.1 --character jen     # a window
+#   python netplay.py bots --clients 30 --seconds 30              # load
+#   python netplay.py bench --sessions 4,16,64                    # capacity
+#
+# Clients send their held buttons, shots fired and the newest snapshot they
+# received (its tick) over TCP. Every --send-rate-th of a second the server
+# sends each client a snapshot of bullets, enemies, explosions, players and
+# score, delta-compressed against the last snapshot that client
+# acknowledged: entities that appeared (in full), disappeared (by id) or
+# moved (by a one-byte step per axis). Positions are quantized to --quantum
+# pixels; an explosion's timer is only sent when it appears, clients run
+# the animation themselves. Without an acknowledged baseline a snapshot is
+# sent in full.
+#
+# Each client has a bounded send queue written out by its own task; a
+# client too slow to drain it loses its oldest queued snapshots, which
+# costs nothing, since deltas only build on acknowledged ones. With
+# --interest R clients only get the entities within R pixels (horizontally)
+# of their player.
+#
+# Messages: uint16 body length, uint8 type, body (little endian).
+
+VARIANT = 'it-crowd'
+DEFAULT_PORT = 5555
+DEFAULT_SEND_RATE = 20
+DEFAULT_QUANTUM = 1
+DEFAULT_QUEUE_SIZE = 8
+REPORT_INTERVAL = 5.0
+
+# Snapshots kept per client as possible delta baselines
+HISTORY = 64
+
+# A session seats one player per character
+CHARACTERS = headless.CHARACTERS
+
+HELLO, WELCOME, INPUT, SNAPSHOT, FULL = range(1, 6)
+
+FRAME = struct.Struct('<HB')
+HELLO_BODY = struct.Struct('<B')          # character (index into CHARACTERS)
+WELCOME_BODY = struct.Struct('<IBBBB')    # session, seat, tick rate, ticks per snapshot, quantum
+INPUT_BODY = struct.Struct('<IBBI')       # input sequence, held buttons, shots, acknowledged tick
+SNAPSHOT_HEADER = struct.Struct('<IIiHB')  # tick, baseline tick (0: none), score, escaped, players
+PLAYER_RECORD = struct.Struct('<BH')      # seat, x
+COUNT = struct.Struct('<H')
+REMOVED = struct.Struct('<H')             # id
+MOVED = struct.Struct('<Hbb')             # id, dx, dy
+
+# Held buttons
+LEFT, RIGHT = 1, 2
+
+# Quantized coordinates are stored unsigned; enemies spawn above the screen
+POSITION_OFFSET = 128
+
+# Entity kinds in snapshot order: Game attribute, pool, record of an added
+# entity (id, x, y, extra fields) and half its width (for interest)
+KINDS = (
+    ('bullets', 'bullet_pool', struct.Struct('<HHH'), 3),
+    ('enemies', 'enemy_pool', struct.Struct('<HHHB'), 25),
+    ('explosions', 'explosion_pool', struct.Struct('<HHHB'), 0),
+)
+KIND_NAMES = [name for name, _, _, _ in KINDS]
+
+
+def message(kind, body):
+    if len(body) > 0xFFFF:
+        raise ValueError(f"Message of {len(body)} bytes is too long")
+    return FRAME.pack(len(body), kind) + body
+
+
+async def read_message(reader):
+    length, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length)
+
+
+def quantize(value, quantum):
+    return (int(value) + POSITION_OFFSET) // quantum
+
+
+def dequantize(value, quantum):
+    return value * quantum - POSITION_OFFSET
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+class TrackedPool(ObjectPool):
+    # An object pool noting what it hands out, so that an entity reusing a
+    # pooled object gets a new network id
+    def __init__(self, cls, capacity=64):
+        super().__init__(cls, capacity)
+        self.fresh = set()
+
+    def acquire(self, *args):
+        obj = super().acquire(*args)
+        self.fresh.add(id(obj))
+        return obj
+
+
+def encode_snapshot(tick, baseline_tick, score, escaped, players, state, baseline):
+    # state and baseline: per kind, {id: record}; baseline None for a full
+    # snapshot
+    parts = [SNAPSHOT_HEADER.pack(tick, baseline_tick, score, min(escaped, 0xFFFF), len(players))]
+    parts.extend(PLAYER_RECORD.pack(seat, x) for seat, x in players)
+    for kind, (_, _, record, _) in enumerate(KINDS):
+        records = state[kind]
+        base = baseline[kind] if baseline is not None else {}
+        removed = [entity for entity in base if entity not in records]
+        added = []
+        moved = []
+        for entity, values in records.items():
+            old = base.get(entity)
+            if old is None:
+                added.append(record.pack(entity, *values))
+            elif old[:2] != values[:2]:
+                dx, dy = values[0] - old[0], values[1] - old[1]
+                if -128 <= dx < 128 and -128 <= dy < 128:
+                    moved.append(MOVED.pack(entity, dx, dy))
+                else:
+                    added.append(record.pack(entity, *values))
+        for items in (removed, added, moved):
+            parts.append(COUNT.pack(len(items)))
+            if items is removed:
+                parts.extend(REMOVED.pack(entity) for entity in items)
+            else:
+                parts.extend(items)
+    return b''.join(parts)
+
+
+def decode_snapshot(body, states):
+    # (tick, score, escaped, players, state); states: tick -> state of the
+    # snapshots received before, for the baseline
+    tick, baseline_tick, score, escaped, count = SNAPSHOT_HEADER.unpack_from(body, 0)
+    offset = SNAPSHOT_HEADER.size
+    players = []
+    for _ in range(count):
+        players.append(PLAYER_RECORD.unpack_from(body, offset))
+        offset += PLAYER_RECORD.size
+    if baseline_tick:
+        if baseline_tick not in states:
+            raise ValueError(f"Snapshot {tick} is a delta against unknown snapshot {baseline_tick}")
+        baseline = states[baseline_tick]
+    else:
+        baseline = [{} for _ in KINDS]
+    state = []
+    for kind, (_, _, record, _) in enumerate(KINDS):
+        records = dict(baseline[kind])
+        (count,) = COUNT.unpack_from(body, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            del records[REMOVED.unpack_from(body, offset)[0]]
+            offset += REMOVED.size
+        (count,) = COUNT.unpack_from(body, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            entity, *values = record.unpack_from(body, offset)
+            records[entity] = tuple(values)
+            offset += record.size
+        (count,) = COUNT.unpack_from(body, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            entity, dx, dy = MOVED.unpack_from(body, offset)
+            old = records[entity]
+            records[entity] = (old[0] + dx, old[1] + dy) + old[2:]
+            offset += MOVED.size
+        state.append(records)
+    return tick, score, escaped, players, state
+
+
+class Session:
+    # One shared game: the rules of a headless it-crowd Game, with a Player
+    # per seated client instead of Game.player
+    def __init__(self, number, module, seed=None):
+        self.number = number
+        self.module = module
+        game = module.Game(headless=True, seed=seed, particle_system=False)
+        for _, pool_name, _, _ in KINDS:
+            pool = getattr(game, pool_name)
+            setattr(game, pool_name, TrackedPool(pool.cls, pool.capacity))
+        game.start_game(CHARACTERS[0])
+        game.player = None
+        self.game = game
+        self.seats = [None] * len(CHARACTERS)   # client per seat
+        self.tick = 0
+        self.next_id = 1
+        self.ids = [{} for _ in KINDS]          # per kind, id(obj) -> network id
+        self.state = [{} for _ in KINDS]        # per kind, network id -> record
+        self.players = []
+        self.encoded = {}                       # baseline tick -> snapshot of this tick
+
+    def seat(self, client, character):
+        seat = CHARACTERS.index(character)
+        if self.seats[seat] is not None:
+            return None
+        module = self.module
+        player = module.Player(module.SCREEN_WIDTH * (seat + 1) // 4 - 20, module.SCREEN_HEIGHT - 80, character)
+        self.seats[seat] = client
+        client.player = player
+        return seat
+
+    def empty(self):
+        return all(client is None for client in self.seats)
+
+    def clients(self):
+        return [client for client in self.seats if client is not None]
+
+    def step(self):
+        game = self.game
+        for client in self.seats:
+            if client is None:
+                continue
+            player = client.player
+            player.prev_x = player.x
+            for _ in range(client.shots):
+                game.shoot(player)
+            client.shots = 0
+            if client.held & LEFT:
+                player.move_left()
+            if client.held & RIGHT:
+                player.move_right()
+            player.update()
+        game.update()
+        self.tick += 1
+
+    def capture(self, quantum):
+        # Quantized records of every entity, under stable network ids
+        game = self.game
+        state = []
+        for kind, (attribute, pool_name, _, _) in enumerate(KINDS):
+            pool = getattr(game, pool_name)
+            previous = self.ids[kind]
+            ids = {}
+            records = {}
+            for obj in getattr(game, attribute):
+                key = id(obj)
+                entity = None if key in pool.fresh else previous.get(key)
+                if entity is None:
+                    entity = self.next_id
+                    self.next_id = self.next_id % 0xFFFF + 1
+                ids[key] = entity
+                values = (quantize(obj.x, quantum), quantize(obj.y, quantum))
+                if attribute == 'enemies':
+                    values += (self.module.ENEMY_TYPES.index(obj.enemy_type),)
+                elif attribute == 'explosions':
+                    values += (min(obj.timer, 0xFF),)
+                records[entity] = values
+            pool.fresh.clear()
+            self.ids[kind] = ids
+            state.append(records)
+        self.state = state
+        self.players = [(seat, quantize(client.player.x, quantum))
+                        for seat, client in enumerate(self.seats) if client is not None]
+        self.encoded = {}
+
+
+class Client:
+    # A connected client, as the server sees it
+    def __init__(self, writer, queue_size, server=None):
+        self.writer = writer
+        self.server = server      # counts the drops of its report window
+        self.queue = asyncio.Queue(queue_size)
+        self.session = None
+        self.seat = None
+        self.player = None
+        self.held = 0
+        self.shots = 0
+        self.acked = 0            # newest snapshot tick the client has
+        self.history = {}         # tick -> state sent, baselines for deltas
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def send(self, data):
+        # Never waits: a full queue loses its oldest message
+        if self.queue.full():
+            self.queue.get_nowait()
+            if self.server is not None:
+                self.server.queue_drops += 1
+        self.queue.put_nowait(data)
+
+    async def write_messages(self):
+        while True:
+            data = await self.queue.get()
+            self.writer.write(data)
+            self.bytes_sent += len(data)
+            await self.writer.drain()
+
+    def acknowledge(self, tick):
+        if tick <= self.acked or tick not in self.history:
+            return
+        self.acked = tick
+        for old in [old for old in self.history if old < tick]:
+            del self.history[old]
+
+
+class Server:
+    def __init__(self, send_rate=DEFAULT_SEND_RATE, tick_rate=DEFAULT_TICK_RATE, quantum=DEFAULT_QUANTUM,
+                 interest=0, queue_size=DEFAULT_QUEUE_SIZE, seed=None, max_sessions=None):
+        self.module = headless.load_variant(VARIANT)
+        self.tick_rate = tick_rate
+        self.snapshot_interval = max(1, round(tick_rate / send_rate))
+        self.quantum = quantum
+        self.interest = interest
+        self.queue_size = queue_size
+        self.seed = seed
+        self.max_sessions = max_sessions
+        self.sessions = []
+        self.session_count = 0
+        self.clients = set()
+        self.ticks = 0
+
+        # Metrics, per report window
+        self.tick_times = []
+        self.snapshot_times = []
+        self.late_ticks = 0
+        self.full_snapshots = 0
+        self.delta_snapshots = 0
+        self.queue_drops = 0
+        self.bytes_in = 0
+        self.bytes_out_closed = 0   # sent by clients that left since the window started
+        self.window_start = time.perf_counter()
+        self.window_cpu = time.process_time()
+        self.window_bytes_out = 0
+
+    def join(self, client, character):
+        for session in self.sessions:
+            seat = session.seat(client, character)
+            if seat is not None:
+                break
+        else:
+            if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+                return False
+            self.session_count += 1
+            seed = None if self.seed is None else self.seed + self.session_count
+            session = Session(self.session_count, self.module, seed)
+            self.sessions.append(session)
+            seat = session.seat(client, character)
+        client.session = session
+        client.seat = seat
+        return True
+
+    def leave(self, client):
+        self.clients.discard(client)
+        self.bytes_out_closed += client.bytes_sent
+        session = client.session
+        if session is None:
+            return
+        session.seats[client.seat] = None
+        if session.empty():
+            self.sessions.remove(session)
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer, self.queue_size, self)
+        sender = None
+        try:
+            kind, body = await read_message(reader)
+            if kind != HELLO:
+                return
+            (character,) = HELLO_BODY.unpack(body)
+            if character >= len(CHARACTERS) or not self.join(client, CHARACTERS[character]):
+                writer.write(message(FULL, b''))
+                return
+            self.clients.add(client)
+            writer.write(message(WELCOME, WELCOME_BODY.pack(client.session.number, client.seat, self.tick_rate,
+                                                            self.snapshot_interval, self.quantum)))
+            sender = asyncio.create_task(client.write_messages())
+            while True:
+                kind, body = await read_message(reader)
+                client.bytes_received += FRAME.size + len(body)
+                self.bytes_in += FRAME.size + len(body)
+                if kind == INPUT:
+                    _, held, shots, acked = INPUT_BODY.unpack(body)
+                    client.held = held
+                    client.shots += shots
+                    client.acknowledge(acked)
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error):
+            pass
+        finally:
+            if sender is not None:
+                sender.cancel()
+            self.leave(client)
+            writer.close()
+
+    def snapshot(self, session, client):
+        state = session.state
+        if self.interest:
+            center = client.player.x + client.player.width // 2
+            state = []
+            for kind, (_, _, _, half_width) in enumerate(KINDS):
+                state.append({entity: values for entity, values in session.state[kind].items()
+                              if abs(dequantize(values[0], self.quantum) + half_width - center) <= self.interest})
+        baseline_tick = client.acked if client.acked in client.history else 0
+        data = session.encoded.get(baseline_tick) if not self.interest else None
+        if data is None:
+            body = encode_snapshot(session.tick, baseline_tick, session.game.score, session.game.enemies_escaped,
+                                   session.players, state, client.history.get(baseline_tick))
+            data = message(SNAPSHOT, body)
+            if not self.interest:
+                # Seat-mates acknowledging the same snapshot get the same bytes
+                session.encoded[baseline_tick] = data
+        if baseline_tick:
+            self.delta_snapshots += 1
+        else:
+            self.full_snapshots += 1
+        client.history[session.tick] = state
+        if len(client.history) > HISTORY:
+            del client.history[min(client.history)]
+        client.send(data)
+
+    def step(self):
+        start = time.perf_counter()
+        for session in self.sessions:
+            session.step()
+        self.ticks += 1
+        simulated = time.perf_counter()
+        if self.ticks % self.snapshot_interval == 0:
+            for session in self.sessions:
+                session.capture(self.quantum)
+                for client in session.clients():
+                    self.snapshot(session, client)
+        end = time.perf_counter()
+        self.tick_times.append(end - start)
+        self.snapshot_times.append(end - simulated)
+
+    async def run(self, duration=None, report_interval=REPORT_INTERVAL, report=print):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.tick_rate
+        start = next_tick = loop.time()
+        next_report = start + report_interval
+        while duration is None or loop.time() - start < duration:
+            self.step()
+            next_tick += period
+            now = loop.time()
+            if now > next_tick:
+                # Late: carry on from now rather than bursting to catch up
+                self.late_ticks += 1
+                next_tick = now
+            if report is not None and now >= next_report:
+                report(self.format_report(self.report()))
+                next_report += report_interval
+            await asyncio.sleep(next_tick - now)
+
+    def report(self):
+        # Metrics since the previous report
+        now = time.perf_counter()
+        cpu = time.process_time()
+        wall = now - self.window_start
+        bytes_out = self.bytes_out_closed + sum(client.bytes_sent for client in self.clients)
+        budget = 1.0 / self.tick_rate
+        summary = {
+            'sessions': len(self.sessions),
+            'clients': len(self.clients),
+            'ticks': len(self.tick_times),
+            'tick_ms_p50': percentile(self.tick_times, 50) * 1000,
+            'tick_ms_p99': percentile(self.tick_times, 99) * 1000,
+            'tick_ms_max': max(self.tick_times, default=0.0) * 1000,
+            'snapshot_ms_p50': percentile(self.snapshot_times, 50) * 1000,
+            'tick_budget_used': sum(self.tick_times) / max(wall, 1e-9),
+            'late_ticks': self.late_ticks,
+            'cpu': (cpu - self.window_cpu) / max(wall, 1e-9),
+            'out_bytes_per_s': (bytes_out - self.window_bytes_out) / max(wall, 1e-9),
+            'in_bytes_per_s': self.bytes_in / max(wall, 1e-9),
+            'full_snapshots': self.full_snapshots,
+            'delta_snapshots': self.delta_snapshots,
+            'queue_drops': self.queue_drops,
+            'budget_ms': budget * 1000,
+        }
+        self.tick_times = []
+        self.snapshot_times = []
+        self.late_ticks = 0
+        self.full_snapshots = self.delta_snapshots = 0
+        self.queue_drops = 0
+        self.bytes_in = 0
+        self.window_start, self.window_cpu, self.window_bytes_out = now, cpu, bytes_out
+        return summary
+
+    @staticmethod
+    def format_report(summary):
+        # Bytes of clients that left during the window count in the total,
+        # but make no per-client figure when nobody is connected
+        per_client = ''
+        if summary['clients']:
+            per_client = f" ({summary['out_bytes_per_s'] / summary['clients']:.0f} B/s per client)"
+        return (f"{summary['sessions']} sessions, {summary['clients']} clients | "
+                f"tick p50 {summary['tick_ms_p50']:.2f} ms, p99 {summary['tick_ms_p99']:.2f} ms, "
+                f"max {summary['tick_ms_max']:.2f} ms (snapshots p50 {summary['snapshot_ms_p50']:.2f} ms), "
+                f"{summary['late_ticks']} late | cpu {summary['cpu'] * 100:.0f}% | "
+                f"out {summary['out_bytes_per_s'] / 1024:.1f} kB/s{per_client}, "
+                f"in {summary['in_bytes_per_s'] / 1024:.1f} kB/s | "
+                f"{summary['delta_snapshots']} delta / {summary['full_snapshots']} full snapshots, "
+                f"{summary['queue_drops']} dropped")
+
+
+async def serve(host, port, duration=None, report_interval=REPORT_INTERVAL, **options):
+    server = Server(**options)
+    listener = await asyncio.start_server(server.handle_client, host, port)
+    async with listener:
+        await server.run(duration, report_interval)
+    return server
+
+
+class ClientWorld:
+    # The game state a client rebuilds from the snapshots it receives
+    def __init__(self, quantum=DEFAULT_QUANTUM):
+        self.quantum = quantum
+        self.states = {}      # tick -> state, baselines for the next deltas
+        self.tick = 0
+        self.score = 0
+        self.escaped = 0
+        self.players = []
+        self.state = [{} for _ in KINDS]
+
+    def apply(self, body):
+        tick, self.score, self.escaped, self.players, self.state = decode_snapshot(body, self.states)
+        self.states[tick] = self.state
+        self.tick = max(self.tick, tick)
+        if len(self.states) > HISTORY:
+            del self.states[min(self.states)]
+
+    def positions(self, kind):
+        # (id, x, y, *extra) of every entity of a kind, in pixels
+        quantum = self.quantum
+        return [(entity, dequantize(values[0], quantum), dequantize(values[1], quantum)) + values[2:]
+                for entity, values in self.state[KIND_NAMES.index(kind)].items()]
+
+
+async def connect(host, port, character):
+    # (reader, writer, welcome fields); raises ConnectionError if the server is full
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(HELLO, HELLO_BODY.pack(CHARACTERS.index(character))))
+    kind, body = await read_message(reader)
+    if kind != WELCOME:
+        writer.close()
+        raise ConnectionError("Server is full")
+    return reader, writer, WELCOME_BODY.unpack(body)
+
+
+async def receive_snapshots(reader, world, stats):
+    try:
+        while True:
+            kind, body = await read_message(reader)
+            if kind == SNAPSHOT:
+                world.apply(body)
+                stats['snapshots'] += 1
+                stats['bytes'] += FRAME.size + len(body)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+
+
+async def run_bot(host, port, character, seconds, stats, rng, input_rate=30):
+    # A client pressing random buttons, for load tests
+    try:
+        reader, writer, (_, _, _, _, quantum) = await connect(host, port, character)
+    except ConnectionError:
+        stats['refused'] += 1
+        return
+    world = ClientWorld(quantum)
+    receiver = asyncio.create_task(receive_snapshots(reader, world, stats))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    sequence = 0
+    held = 0
+    try:
+        while loop.time() < deadline and not receiver.done():
+            if rng.random() < 0.1:
+                held = rng.choice((0, LEFT, RIGHT))
+            shots = 1 if rng.random() < 0.2 else 0
+            writer.write(message(INPUT, INPUT_BODY.pack(sequence, held, shots, world.tick)))
+            sequence += 1
+            await writer.drain()
+            await asyncio.sleep(1.0 / input_rate)
+    except ConnectionError:
+        pass
+    finally:
+        receiver.cancel()
+        writer.close()
+
+
+async def run_bots(host, port, clients, seconds, seed=None):
+    # Bots take the characters in turn, filling sessions three at a time
+    stats = {'snapshots': 0, 'bytes': 0, 'refused': 0}
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(run_bot(host, port, CHARACTERS[i % len(CHARACTERS)], seconds, stats,
+                                   random.Random(rng.random())) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    print(f"{clients} bots for {elapsed:.1f}s: {stats['snapshots']} snapshots "
+          f"({stats['snapshots'] / elapsed / max(1, clients):.1f}/s per bot), "
+          f"{stats['bytes'] / elapsed / 1024:.1f} kB/s in total, {stats['refused']} refused")
+    return stats
+
+
+async def play(host, port, character):
+    # A window showing the server's game, drawn with it-crowd's entities
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    from text_cache import render_text
+    module = headless.load_variant(VARIANT)
+    reader, writer, (session, seat, tick_rate, interval, quantum) = await connect(host, port, character)
+    pygame.init()
+    screen = pygame.display.set_mode((module.SCREEN_WIDTH, module.SCREEN_HEIGHT))
+    pygame.display.set_caption(f"IT Crowd: Debug the System! (session {session})")
+    world = ClientWorld(quantum)
+    stats = {'snapshots': 0, 'bytes': 0}
+    receiver = asyncio.create_task(receive_snapshots(reader, world, stats))
+    players = [module.Player(0, module.SCREEN_HEIGHT - 80, name) for name in CHARACTERS]
+    explosions = {}
+    loop = asyncio.get_running_loop()
+    period = 1.0 / tick_rate
+    sequence = 0
+    try:
+        while not receiver.done():
+            frame_start = loop.time()
+            shots = 0
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    return
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    shots += 1
+            keys = pygame.key.get_pressed()
+            held = (LEFT if keys[pygame.K_LEFT] or keys[pygame.K_a] else 0) | \
+                (RIGHT if keys[pygame.K_RIGHT] or keys[pygame.K_d] else 0)
+            writer.write(message(INPUT, INPUT_BODY.pack(sequence, held, shots, world.tick)))
+            sequence += 1
+
+            screen.fill(module.BLACK)
+            for entity, x, y in world.positions('bullets'):
+                module.Bullet(x, y).draw(screen)
+            for entity, x, y, enemy_type in world.positions('enemies'):
+                module.Enemy(x, y, module.ENEMY_TYPES[enemy_type]).draw(screen)
+            # Explosions animate locally from when they were first seen
+            current = {}
+            for entity, x, y, timer in world.positions('explosions'):
+                explosion = explosions.get(entity)
+                if explosion is None:
+                    explosion = module.Explosion(x, y)
+                    explosion.timer = timer
+                explosion.update()
+                if not explosion.is_finished():
+                    explosion.draw(screen)
+                current[entity] = explosion
+            explosions = current
+            for player_seat, x in world.players:
+                player = players[player_seat]
+                player.x = dequantize(x, quantum)
+                player.update()
+                player.draw(screen)
+            hud = render_text(f"{character.upper()} - SYSTEM INTEGRITY: {world.score}%   "
+                              f"ESCAPED: {world.escaped}", 24, module.TERMINAL_GREEN)
+            screen.blit(hud, (10, 12))
+            pygame.display.flip()
+            await writer.drain()
+            await asyncio.sleep(max(0.0, frame_start + period - loop.time()))
+    finally:
+        receiver.cancel()
+        writer.close()
+        pygame.quit()
+
+
+def bench(session_counts, seconds, host='127.0.0.1', port=DEFAULT_PORT, **options):
+    # Hosts each number of full sessions, with the bots in a separate
+    # process so that the server's CPU use is its own
+    print(f"{'sessions':>9}{'clients':>9}{'tick p50 ms':>13}{'tick p99 ms':>13}{'late':>6}{'cpu':>6}"
+          f"{'out kB/s':>10}{'B/s/client':>11}{'est. max sessions':>19}")
+    for sessions in session_counts:
+        clients = sessions * len(CHARACTERS)
+        command = [sys.executable, os.path.abspath(__file__), 'bots', '--host', host, '--port', str(port),
+                   '--clients', str(clients), '--seconds', str(seconds + 1)]
+        summaries = []
+
+        async def measure():
+            server = Server(**options)
+            listener = await asyncio.start_server(server.handle_client, host, port)
+            async with listener:
+                bots = await asyncio.create_subprocess_exec(*command, stdout=subprocess.DEVNULL)
+                # Let every bot connect, then measure a steady window
+                await server.run(1.0, report=None)
+                server.report()
+                await server.run(seconds - 1.0, report=None)
+                summaries.append(server.report())
+                await bots.wait()
+
+        asyncio.run(measure())
+        summary = summaries[0]
+        # Sessions one core could host with the tick loop's CPU use
+        capacity = summary['sessions'] / summary['cpu'] if summary['cpu'] > 0 else 0
+        per_client = f"{summary['out_bytes_per_s'] / summary['clients']:.0f}" if summary['clients'] else '-'
+        print(f"{summary['sessions']:>9}{summary['clients']:>9}{summary['tick_ms_p50']:>13.2f}"
+              f"{summary['tick_ms_p99']:>13.2f}{summary['late_ticks']:>6}{summary['cpu'] * 100:>5.0f}%"
+              f"{summary['out_bytes_per_s'] / 1024:>10.1f}"
+              f"{per_client:>11}{capacity:>19.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Network multiplayer for it-crowd.py.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def server_options(command):
+        command.add_argument('--send-rate', type=int, default=DEFAULT_SEND_RATE, help="snapshots per second")
+        command.add_argument('--tick-rate', type=int, default=DEFAULT_TICK_RATE, help="simulation ticks per second")
+        command.add_argument('--quantum', type=int, default=DEFAULT_QUANTUM,
+                             help="position quantization step, in pixels")
+        command.add_argument('--interest', type=int, default=0,
+                             help="only send entities within this many pixels of the player (0: all)")
+        command.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                             help="snapshots queued per client before the oldest is dropped")
+        command.add_argument('--seed', type=int, default=None)
+
+    for name in ('server', 'client', 'bots', 'bench'):
+        command = commands.add_parser(name)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+        if name == 'server':
+            server_options(command)
+            command.add_argument('--max-sessions', type=int, default=None)
+            command.add_argument('--report-interval', type=float, default=REPORT_INTERVAL)
+        elif name == 'client':
+            command.add_argument('--character', choices=CHARACTERS, default='moss')
+        elif name == 'bots':
+            command.add_argument('--clients', type=int, default=30)
+            command.add_argument('--seconds', type=float, default=30)
+            command.add_argument('--seed', type=int, default=None)
+        else:
+            server_options(command)
+            command.add_argument('--sessions', default='1,4,16,64',
+                                 help="comma-separated session counts to measure")
+            command.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command in ('server', 'bench'):
+        options = dict(send_rate=args.send_rate, tick_rate=args.tick_rate, quantum=args.quantum,
+                       interest=args.interest, queue_size=args.queue_size, seed=args.seed)
+    if args.command == 'server':
+        print(f"Serving {VARIANT} on {args.host}:{args.port}")
+        try:
+            asyncio.run(serve(args.host, args.port, report_interval=args.report_interval,
+                              max_sessions=args.max_sessions, **options))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'client':
+        asyncio.run(play(args.host, args.port, args.character))
+    elif args.command == 'bots':
+        asyncio.run(run_bots(args.host, args.port, args.clients, args.seconds, args.seed))
+    else:
+        bench([int(count) for count in args.sessions.split(',')], args.seconds, args.host, args.port, **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import pygame
+
+from rng import fx_random
+
+try:
+    import numpy as np
+except ImportError:  # the games fall back to per-explosion objects
+    np = None
+
+# Global particle system for explosions. Every live particle sits in
+# preallocated NumPy columns (position, velocity, colour index, age,
+# lifetime), so integration, gravity and expiry are a handful of array
+# operations per frame however many explosions are running. Drawing blits
+# pre-rendered circle stamps (one per radius and colour) in a single
+# Surface.blits() call instead of a pygame.draw.circle per particle.
+#
+# Particles move, fade and draw exactly like the old Explosion particles, and
+# emit() makes the same calls on the cosmetic random stream, so swapping one
+# for the other changes neither the picture nor the rest of the randomness.
+
+GRAVITY = 0.2
+PARTICLES_PER_EXPLOSION = 15
+MAX_SPEED = 5
+LIFETIME = 30       # frames
+RADIUS = 5          # starting radius, shrinking to 1 as the particle ages
+
+
+def available():
+    return np is not None
+
+
+class ParticleSystem:
+    def __init__(self, colors, capacity=4096):
+        if np is None:
+            raise RuntimeError("ParticleSystem requires NumPy")
+        self.colors = list(colors)
+        self.count = 0
+        self.capacity = 0
+        self.x = self.y = self.vx = self.vy = np.zeros(0)
+        self.color = self.age = self.lifetime = np.zeros(0, dtype=np.int64)
+        self._grow(capacity)
+        # Circle surfaces indexed [radius, colour index], so a whole frame's
+        # stamps are one fancy-indexing lookup
+        self._stamps = np.empty((0, len(self.colors)), dtype=object)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        for name, dtype in (('x', np.float64), ('y', np.float64), ('vx', np.float64),
+                            ('vy', np.float64), ('color', np.int64), ('age', np.int64),
+                            ('lifetime', np.int64)):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def emit(self, x, y, count=PARTICLES_PER_EXPLOSION, lifetime=LIFETIME):
+        # One explosion's worth of particles at (x, y)
+        if self.count + count > self.capacity:
+            self._grow(max(self.capacity * 2, self.count + count))
+        start = self.count
+        end = start + count
+        n_colors = len(self.colors)
+        for i in range(start, end):
+            self.vx[i] = fx_random.randint(-MAX_SPEED, MAX_SPEED)
+            self.vy[i] = fx_random.randint(-MAX_SPEED, MAX_SPEED)
+            # Same draw as fx_random.choice(self.colors)
+            self.color[i] = fx_random.randrange(n_colors)
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.age[start:end] = 0
+        self.lifetime[start:end] = lifetime
+        self.count = end
+
+    def clear(self):
+        self.count = 0
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        self.age[:n] += 1
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vy[:n] += GRAVITY
+
+        # Expire in one pass, keeping the survivors in emission order
+        alive = self.age[:n] < self.lifetime[:n]
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            for column in (self.x, self.y, self.vx, self.vy, self.color, self.age, self.lifetime):
+                column[:len(keep)] = column[keep]
+            self.count = len(keep)
+
+    def _screen_geometry(self, camera):
+        # Integer centres and radii, as Explosion.draw computes them
+        n = self.count
+        radius = np.maximum(1, (RADIUS * (1 - self.age[:n] / self.lifetime[:n])).astype(np.int64))
+        x, y = self.x[:n], self.y[:n]
+        if camera is not None and camera.alpha < 1:
+            # Back towards the previous tick's position; particles emitted
+            # this tick have none and are drawn where they are
+            back = np.where(self.age[:n] > 0, 1 - camera.alpha, 0.0)
+            x = x - self.vx[:n] * back
+            y = y - (self.vy[:n] - GRAVITY) * back
+        cx = x.astype(np.int64)
+        cy = y.astype(np.int64)
+        if camera is not None:
+            cx = np.rint(cx * camera.zoom + camera.offset_x).astype(np.int64)
+            cy = np.rint(cy * camera.zoom + camera.offset_y).astype(np.int64)
+            radius = np.maximum(1, np.rint(radius * camera.zoom).astype(np.int64))
+        return cx, cy, radius
+
+    def _stamp_table(self, max_radius):
+        # Pre-renders circles up to max_radius (larger ones appear when the
+        # camera zooms in)
+        stamps = self._stamps
+        if max_radius < len(stamps):
+            return stamps
+        table = np.empty((max_radius + 1, len(self.colors)), dtype=object)
+        table[:len(stamps)] = stamps
+        for radius in range(max(1, len(stamps)), max_radius + 1):
+            size = 2 * radius + 1
+            for index, color in enumerate(self.colors):
+                stamp = pygame.Surface((size, size))
+                stamp.fill((0, 0, 0))
+                stamp.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+                pygame.draw.circle(stamp, color, (radius, radius), radius)
+                table[radius, index] = stamp
+        self._stamps = table
+        return table
+
+    def draw(self, screen, camera=None):
+        if self.count == 0:
+            return
+        cx, cy, radius = self._screen_geometry(camera)
+        stamps = self._stamp_table(int(radius.max()))[radius, self.color[:self.count]]
+        screen.blits(zip(stamps.tolist(), zip((cx - radius).tolist(), (cy - radius).tolist())),
+                     doreturn=False)
+
+    def bounds(self, camera=None):
+        # Screen rect covering every particle as draw() is about to draw it
+        if self.count == 0:
+            return None
+        cx, cy, radius = self._screen_geometry(camera)
+        left = int((cx - radius).min())
+        top = int((cy - radius).min())
+        return pygame.Rect(left, top, int((cx + radius).max()) - left + 1,
+                           int((cy + radius).max()) - top + 1)
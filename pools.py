@@ -0,0 +1,60 @@
+# Object pools for short-lived entities (bullets, enemies, explosions).
+#
+# A pool preallocates blank instances of a class and hands them out with
+# acquire(*args), which initialises one through the class's reset(*args)
+# (the same arguments its constructor takes). release() puts it back for
+# reuse, so steady-state gameplay creates no new entity objects and leaves
+# nothing for the garbage collector. When a pool runs dry it allocates a new
+# instance, keeps it from then on, and counts the exhaustion.
+
+
+class ObjectPool:
+    def __init__(self, cls, capacity=64):
+        self.cls = cls
+        self.capacity = capacity
+        self.free = [cls.__new__(cls) for _ in range(capacity)]
+        self.in_use = 0
+
+        # Stats
+        self.acquired = 0
+        self.released = 0
+        self.exhaustions = 0      # acquires that found the pool empty
+        self.peak_in_use = 0
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+        else:
+            obj = self.cls.__new__(self.cls)
+            self.exhaustions += 1
+            self.capacity += 1
+        obj.reset(*args)
+        self.acquired += 1
+        self.in_use += 1
+        if self.in_use > self.peak_in_use:
+            self.peak_in_use = self.in_use
+        return obj
+
+    def release(self, obj):
+        # The caller must drop every reference to obj: the next acquire()
+        # may hand it out again
+        self.free.append(obj)
+        self.released += 1
+        self.in_use -= 1
+
+    def release_all(self, objs):
+        for obj in objs:
+            self.release(obj)
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'in_use': self.in_use,
+            'peak_in_use': self.peak_in_use,
+            'acquired': self.acquired,
+            'released': self.released,
+            'exhaustions': self.exhaustions,
+        }
@@ -0,0 +1,282 @@
+import cProfile
+import json
+import marshal
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+# Targeted profiler captures. A capture covers exactly the next N frames of
+# Game.run (from a frame boundary to a frame boundary), so a profile of a
+# heavy moment is not diluted by menus or idle play. Press F9 in a game, or
+# start one with --profile-after FRAME; every capture writes
+#
+#   <prefix>.pstats     pstats file (python -m pstats, snakeviz, ...)
+#   <prefix>.collapsed  collapsed stacks ("a;b;c count") for flamegraph.pl,
+#                       speedscope, inferno, ...
+#   <prefix>.json       tags: variant, game state, entity counts, frames
+#
+# Two modes:
+#   cprofile  deterministic cProfile for the pstats file; the collapsed
+#             stacks are built from its call graph (microseconds, each
+#             function's time split between its callers in proportion)
+#   sample    only the stack sampler (much lower overhead); the pstats file
+#             is built from the samples (call counts are sample counts)
+#
+# The sampler does not run alongside cProfile, which would profile its
+# signal handler along with the game.
+#
+# The sampler uses a CPU-time interval timer (SIGPROF) where there is one,
+# so time spent sleeping in clock.tick() is not sampled, and time in C
+# calls (blits, flips, NumPy) is charged to the Python function making them.
+# Elsewhere (Windows) a background thread samples wall-clock time instead.
+#
+# Every collapsed stack starts with a "<variant> [<state>]" frame, so
+# captures of different variants and states can be merged into one graph.
+# (cProfile cannot tell states apart: its stacks are all tagged with the
+# state the capture started in.)
+
+MODES = ('cprofile', 'sample')
+DEFAULT_FRAMES = 120
+SAMPLE_INTERVAL = 0.001  # seconds
+
+
+def game_state(game):
+    # retro_game.py and retro_game_it_crowd.py have no menu
+    return getattr(game, 'state', 'playing')
+
+
+def write_collapsed(stacks, path):
+    # stacks: (root, ((filename, line, name), ...) outermost first) -> count
+    with open(path, 'w') as f:
+        for (root, stack), count in sorted(stacks.items()):
+            names = [root] + [f"{name} ({os.path.basename(filename)}:{line})" if filename != '~' else name
+                              for filename, line, name in stack]
+            f.write(';'.join(names) + f" {count}\n")
+
+
+def collapse_profile(stats, root):
+    # Collapsed stacks from pstats data, which only has caller -> callee
+    # edges: each function's time under a caller is shared out over that
+    # caller's stacks in proportion to their time. Recursion is cut at the
+    # first repeat of a function.
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    stacks = Counter()
+
+    def visit(func, stack, share):
+        stack = stack + (func,)
+        own = round(stats[func][2] * share * 1e6)
+        if own > 0:
+            stacks[(root, stack)] += own
+        for callee in callees.get(func, ()):
+            total = stats[callee][3]
+            if callee in stack or total <= 0:
+                continue
+            edge = stats[callee][4][func][3]
+            visit(callee, stack, share * edge / total)
+
+    for func, (_, _, _, _, callers) in stats.items():
+        # Entered from outside the capture (cProfile started mid-frame)
+        if not callers:
+            visit(func, (), 1.0)
+    return stacks
+
+
+def entity_counts(game):
+    particles = getattr(game, 'particles', None)
+    return {
+        'bullets': len(game.bullets),
+        'enemies': len(game.enemies),
+        'explosions': len(getattr(game, 'explosions', ())),
+        'particles': len(particles) if particles is not None else 0,
+    }
+
+
+class StackSampler:
+    # Samples the calling thread's Python stack every interval seconds
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()  # (root, (code key, ...) outermost first) -> count
+        self.root = ''
+        self.thread_id = None
+        self.thread = None
+        self.running = False
+        self.previous_handler = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+            return
+        self.running = False
+        self.thread.join()
+        self.thread = None
+
+    def _on_signal(self, signum, frame):
+        self._record(frame)
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.interval)
+            self._record(sys._current_frames().get(self.thread_id))
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            stack.reverse()
+            self.samples[(self.root, tuple(stack))] += 1
+
+    def write_collapsed(self, path):
+        write_collapsed(self.samples, path)
+
+    def write_pstats(self, path):
+        # pstats layout: func -> (primitive calls, calls, own time,
+        # cumulative time, {caller: (calls, primitive calls, own, cumulative)})
+        interval = self.interval
+        stats = {}
+        for (_, stack), count in self.samples.items():
+            seen = set()
+            caller = None
+            for depth, func in enumerate(stack):
+                leaf = depth == len(stack) - 1
+                cc, nc, tt, ct, callers = stats.get(func, (0, 0, 0.0, 0.0, {}))
+                if leaf:
+                    cc += count
+                    nc += count
+                    tt += count * interval
+                if func not in seen:
+                    ct += count * interval
+                    seen.add(func)
+                if caller is not None:
+                    c_nc, c_cc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c_nc + count, c_cc + count,
+                                       c_tt + (count * interval if leaf else 0.0), c_ct + count * interval)
+                stats[func] = (cc, nc, tt, ct, callers)
+                caller = func
+        with open(path, 'wb') as f:
+            marshal.dump(stats, f)
+
+
+class ProfilerCapture:
+    def __init__(self, variant, frames=DEFAULT_FRAMES, mode='cprofile', output_dir='.',
+                 interval=SAMPLE_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode {mode!r}, expected one of: {', '.join(MODES)}")
+        self.variant = variant
+        self.frames = frames
+        self.mode = mode
+        self.output_dir = output_dir
+        self.interval = interval
+
+        self.frame = 0          # frames finished so far
+        self.start_at = None    # frame number the next capture starts at
+        self.remaining = 0
+        self.profile = None
+        self.sampler = None
+        self.tags = None
+        self.started = None
+        self.captures = []      # prefixes of the files written
+
+    @property
+    def active(self):
+        return self.remaining > 0
+
+    def request(self, after=0):
+        # Capture the frames starting `after` frames from now (F9, or the
+        # --profile-after flag before the first frame)
+        if not self.active:
+            self.start_at = self.frame + after
+
+    def end_frame(self, game):
+        # Called by Game.run after every frame
+        self.frame += 1
+        if self.active:
+            state = game_state(game)
+            if self.sampler is not None:
+                self.sampler.root = f"{self.variant} [{state}]"
+            self.tags['states'][state] = self.tags['states'].get(state, 0) + 1
+            self.remaining -= 1
+            if not self.active:
+                self._stop(game)
+        elif self.start_at is not None and self.frame >= self.start_at:
+            self.start_at = None
+            self._start(game)
+
+    def close(self, game):
+        # Writes a capture cut short by the game exiting
+        if self.active:
+            self.tags['frames'] = self.frames - self.remaining
+            self.remaining = 0
+            self._stop(game)
+
+    def _start(self, game):
+        self.remaining = self.frames
+        self.tags = {
+            'variant': self.variant,
+            'mode': self.mode,
+            'state': game_state(game),
+            'states': {},  # state -> frames captured in it
+            'first_frame': self.frame,
+            'frames': self.frames,
+            'entities_at_start': entity_counts(game),
+            'score': game.score,
+        }
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = StackSampler(self.interval)
+            self.sampler.root = f"{self.variant} [{game_state(game)}]"
+            self.sampler.start()
+        print(f"Profiling frames {self.frame}-{self.frame + self.frames - 1} ({self.mode})")
+
+    def _stop(self, game):
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self.sampler.stop()
+        tags = self.tags
+        tags['seconds'] = time.perf_counter() - self.started
+        tags['entities_at_end'] = entity_counts(game)
+        if self.sampler is not None:
+            tags['samples'] = sum(self.sampler.samples.values())
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"profile-{self.variant}-{tags['state']}-"
+                                               f"{time.strftime('%Y%m%d-%H%M%S')}-f{tags['first_frame']}")
+        if self.profile is not None:
+            self.profile.dump_stats(prefix + '.pstats')
+            write_collapsed(collapse_profile(self.profile.stats, f"{self.variant} [{tags['state']}]"),
+                            prefix + '.collapsed')
+        else:
+            self.sampler.write_pstats(prefix + '.pstats')
+            self.sampler.write_collapsed(prefix + '.collapsed')
+        with open(prefix + '.json', 'w') as f:
+            json.dump(tags, f, indent=2)
+
+        self.profile = None
+        self.sampler = None
+        self.captures.append(prefix)
+        detail = f", {tags['samples']} samples" if 'samples' in tags else ''
+        print(f"Profile of {tags['frames']} frames ({tags['seconds']:.2f}s{detail}) "
+              f"written to {prefix}.pstats/.collapsed/.json")
@@ -0,0 +1,174 @@
+import zlib
+
+# Compact binary input recordings. A recording holds the game's seed and the
+# input of every simulation tick, which together reproduce the simulation
+# exactly; `python headless.py --replay FILE` replays one at full speed.
+#
+# Format (integers are unsigned LEB128 varints):
+#   header   b'IRPL', version byte, variant (varint length + UTF-8),
+#            start character (same), seed, tick rate
+#   records  run, flags byte, [key count, key codes...]
+#            run ticks with the same held keys; flags bit 0 = left held,
+#            bit 1 = right held, bit 2 = key presses follow, which happen on
+#            the first tick of the run
+#   trailer  0 (a zero run), tick count, CRC-32 of the final simulation state
+#            (4 bytes, little-endian)
+
+MAGIC = b'IRPL'
+VERSION = 1
+
+LEFT = 1
+RIGHT = 2
+KEYS = 4
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_string(out, text):
+    encoded = text.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out.extend(encoded)
+
+
+def _read_string(data, pos):
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode('utf-8'), pos + length
+
+
+def state_digest(game):
+    # CRC of everything the simulation carries from tick to tick. Entities
+    # are sorted: the entity store keeps them in a different order.
+    player = game.player
+    state = (
+        game.score,
+        game.enemy_spawn_timer,
+        (player.x, player.y) if player is not None else None,
+        sorted((bullet.x, bullet.y) for bullet in game.bullets),
+        sorted((enemy.x, enemy.y, getattr(enemy, 'enemy_type', '')) for enemy in game.enemies),
+        getattr(game, 'state', None),
+        game.sim_random.getstate(),
+    )
+    return zlib.crc32(repr(state).encode('utf-8'))
+
+
+class InputRecorder:
+    def __init__(self, path, variant, seed, tick_rate, character='moss', flush_bytes=64 * 1024):
+        self.file = open(path, 'wb')
+        self.flush_bytes = flush_bytes
+        self.ticks = 0
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        _write_string(self.buffer, variant)
+        _write_string(self.buffer, character)
+        _write_varint(self.buffer, seed)
+        _write_varint(self.buffer, tick_rate)
+
+        # Run being accumulated
+        self.run = 0
+        self.flags = 0
+        self.keys = []
+
+    def record(self, keydowns, left, right):
+        # Called once per simulation tick with the input applied to it
+        flags = (LEFT if left else 0) | (RIGHT if right else 0)
+        self.ticks += 1
+        if self.run and not keydowns and flags == self.flags & (LEFT | RIGHT):
+            self.run += 1
+            return
+        self._end_run()
+        self.run = 1
+        self.flags = flags | (KEYS if keydowns else 0)
+        self.keys = list(keydowns)
+
+    def _end_run(self):
+        if not self.run:
+            return
+        buffer = self.buffer
+        _write_varint(buffer, self.run)
+        buffer.append(self.flags)
+        if self.flags & KEYS:
+            _write_varint(buffer, len(self.keys))
+            for key in self.keys:
+                _write_varint(buffer, key)
+        self.run = 0
+        if len(buffer) >= self.flush_bytes:
+            self.file.write(buffer)
+            buffer.clear()
+
+    def close(self, game):
+        self._end_run()
+        _write_varint(self.buffer, 0)
+        _write_varint(self.buffer, self.ticks)
+        self.buffer.extend(state_digest(game).to_bytes(4, 'little'))
+        self.file.write(self.buffer)
+        self.file.close()
+
+
+class Replay:
+    # A loaded recording; frame(n) is the input of tick n, like the
+    # headless input scripts
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path} is not an input recording")
+        if data[4] != VERSION:
+            raise ValueError(f"{path}: unsupported recording version {data[4]}")
+        pos = 5
+        self.variant, pos = _read_string(data, pos)
+        self.character, pos = _read_string(data, pos)
+        self.seed, pos = _read_varint(data, pos)
+        self.tick_rate, pos = _read_varint(data, pos)
+
+        # One entry per tick; repeated ticks share one tuple
+        self.inputs = []
+        while True:
+            run, pos = _read_varint(data, pos)
+            if run == 0:
+                break
+            flags = data[pos]
+            pos += 1
+            left = bool(flags & LEFT)
+            right = bool(flags & RIGHT)
+            held = ([], left, right)
+            if flags & KEYS:
+                count, pos = _read_varint(data, pos)
+                keys = []
+                for _ in range(count):
+                    key, pos = _read_varint(data, pos)
+                    keys.append(key)
+                self.inputs.append((keys, left, right))
+                run -= 1
+            self.inputs.extend([held] * run)
+        self.ticks, pos = _read_varint(data, pos)
+        self.digest = int.from_bytes(data[pos:pos + 4], 'little')
+        if self.ticks != len(self.inputs):
+            raise ValueError(f"{path}: {len(self.inputs)} ticks of input, trailer says {self.ticks}")
+
+    def __len__(self):
+        return self.ticks
+
+    def frame(self, n):
+        if n < len(self.inputs):
+            return self.inputs[n]
+        return [], False, False
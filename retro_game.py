@@ -1,9 +1,26 @@
+import argparse
 import pygame
 import sys
 import random
 
-# Initialize Pygame
-pygame.init()
+from dirty_rects import DirtyRectRenderer
+from entity_store import EntityStore, find_hits
+from frame_export import LAYERS as FRAME_LAYERS, FrameExporter
+from frame_metrics import NULL_METRICS, FrameMetrics
+from frame_shm import FramePublisher
+from input_latency import InputPipeline
+from pools import ObjectPool
+from profiler_capture import DEFAULT_FRAMES as PROFILE_FRAMES, MODES as PROFILER_MODES, ProfilerCapture
+from replay import InputRecorder
+from rng import new_seed, seed_fx
+from session_recorder import POLICIES as RECORD_POLICIES, SessionRecorder
+from spatial_hash import SpatialHash
+from startup import StartupTimer, init_subsystems
+from text_cache import render_text
+from timestep import DEFAULT_TICK_RATE, FixedTimestep, interpolate
+
+# Variant name, as headless.py and recordings know it
+VARIANT = 'retro_game'
 
 # Game constants
 SCREEN_WIDTH = 800
@@ -20,10 +37,19 @@ PLAYER_SPEED = 5
 BULLET_SPEED = 7
 ENEMY_SPEED = 1
 
+# Preallocated entities per object pool (pools grow when exhausted)
+POOL_SIZES = {'bullet': 64, 'enemy': 64}
+
+# Fixed HUD areas (score, instructions) for the dirty-rect renderer
+HUD_BLOCKS = [(0, 0, SCREEN_WIDTH, 40), (0, SCREEN_HEIGHT - 60, SCREEN_WIDTH, 50)]
+
 class Player:
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        # Position before the latest simulation tick, for interpolated drawing
+        self.prev_x = x
+        self.prev_y = y
         self.width = 50
         self.height = 30
         self.speed = PLAYER_SPEED
@@ -47,14 +73,22 @@ class Player:
         ])
 
 class Bullet:
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed')
+    
     def __init__(self, x, y):
+        self.reset(x, y)
+    
+    def reset(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.width = 4
         self.height = 10
         self.speed = BULLET_SPEED
         
     def update(self):
+        self.prev_x, self.prev_y = self.x, self.y
         self.y -= self.speed
         
     def draw(self, screen):
@@ -64,15 +98,30 @@ class Bullet:
         return self.y < 0
 
 class Enemy:
-    def __init__(self, x, y):
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'width', 'height', 'speed', 'spatial_hash')
+    
+    def __init__(self, x, y, spatial_hash=None):
+        self.reset(x, y, spatial_hash)
+    
+    def reset(self, x, y, spatial_hash=None):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.width = 40
         self.height = 30
         self.speed = ENEMY_SPEED
         
+        # Broad-phase grid kept in sync as the enemy moves
+        self.spatial_hash = spatial_hash
+        if spatial_hash is not None:
+            spatial_hash.insert(self)
+        
     def update(self):
+        self.prev_x, self.prev_y = self.x, self.y
         self.y += self.speed
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(self)
         
     def draw(self, screen):
         # Draw a simple retro enemy
@@ -85,93 +134,303 @@ class Enemy:
         return self.y > SCREEN_HEIGHT
 
 class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Retro Space Shooter")
+    def __init__(self, headless=False, entity_store=False, dirty_rects=False, dirty_log=None,
+                 pool_sizes=None, seed=None, frame_metrics=False, frame_export=False, startup=None):
+        # Start-up phases are timed from here unless the caller started the timer
+        self.startup = startup or StartupTimer()
+        
+        # Simulation randomness comes from this game's own seeded stream,
+        # cosmetic randomness from rng.fx_random
+        self.seed = new_seed() if seed is None else seed
+        self.sim_random = random.Random(self.seed)
+        seed_fx(self.seed)
+        
+        # Headless games never open a window and are never drawn
+        self.headless = headless
+        if headless:
+            self.screen = None
+        else:
+            init_subsystems()
+            self.startup.mark('subsystems')
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.startup.mark('window')
+            pygame.display.set_caption("Retro Space Shooter")
         self.clock = pygame.time.Clock()
         
+        # Input gathered by handle_events for the next tick
+        self.pending_keydowns = []
+        self.held_left = self.held_right = False
+        # Optional replay.InputRecorder, fed every tick's input
+        self.recorder = None
+        # Optional session_recorder.SessionRecorder, fed every drawn frame
+        self.session_recorder = None
+        # Optional frame_shm.FramePublisher, fed every drawn frame
+        self.frame_publisher = None
+        # Optional input_latency.InputPipeline: timestamped input, late input
+        self.input_pipeline = None
+        
+        # Per-phase frame timing, shown with F3 (see frame_metrics.py)
+        self.metrics = FrameMetrics() if frame_metrics else NULL_METRICS
+        # Profiles the next frames on F9 (see profiler_capture.py)
+        self.profiler = ProfilerCapture(VARIANT)
+        # NumPy views of the drawn frames (see frame_export.py): True for
+        # the default FrameExporter, or a configured one
+        self.frame_export = FrameExporter() if frame_export is True else (frame_export or None)
+        
+        # Opt-in dirty-rectangle rendering
+        self.dirty_renderer = None
+        if dirty_rects and not headless:
+            self.dirty_renderer = DirtyRectRenderer((SCREEN_WIDTH, SCREEN_HEIGHT), log=dirty_log)
+        
         # Game objects
         self.player = Player(SCREEN_WIDTH // 2 - 25, SCREEN_HEIGHT - 50)
         self.bullets = []
         self.enemies = []
+        self.enemy_grid = SpatialHash(64)
+        # Pooled entities: acquired instead of constructed, released when they
+        # leave the game
+        pool_sizes = dict(POOL_SIZES, **(pool_sizes or {}))
+        self.bullet_pool = ObjectPool(Bullet, pool_sizes['bullet'])
+        self.enemy_pool = ObjectPool(Enemy, pool_sizes['enemy'])
+        
+        # Optional NumPy-backed bullets and enemies; the lists become the
+        # stores' live view lists
+        self.entity_store = entity_store
+        if entity_store:
+            self.bullet_store = EntityStore(Bullet)
+            self.enemy_store = EntityStore(Enemy, kinds=())
+            self.bullets = self.bullet_store.views
+            self.enemies = self.enemy_store.views
+        
         self.score = 0
-        self.font = pygame.font.Font(None, 36)
+        # Enemies that reached the bottom of the screen unharmed
+        self.enemies_escaped = 0
         
         # Enemy spawn timer
         self.enemy_spawn_timer = 0
         self.enemy_spawn_delay = 60  # frames
+        self.startup.mark('game objects')
         
     def handle_events(self):
-        for event in pygame.event.get():
+        # Key presses are queued for the next simulation tick; held keys are
+        # sampled once per rendered frame and apply to every tick
+        events = pygame.event.get() if self.input_pipeline is None else self.input_pipeline.events()
+        for event in events:
             if event.type == pygame.QUIT:
                 return False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_metrics_overlay()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+                self.profiler.request()
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    # Shoot bullet
-                    bullet_x = self.player.x + self.player.width // 2 - 2
-                    bullet_y = self.player.y
-                    self.bullets.append(Bullet(bullet_x, bullet_y))
+                self.pending_keydowns.append(event.key)
+            elif event.type == pygame.VIDEOEXPOSE and self.dirty_renderer is not None:
+                self.dirty_renderer.invalidate()
         
         # Handle continuous key presses
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            self.player.move_left()
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            self.player.move_right()
+        self.held_left = keys[pygame.K_LEFT] or keys[pygame.K_a]
+        self.held_right = keys[pygame.K_RIGHT] or keys[pygame.K_d]
             
         return True
     
+    def tick(self):
+        # One fixed simulation step
+        keydowns = self.pending_keydowns
+        self.pending_keydowns = []
+        self.player.prev_x, self.player.prev_y = self.player.x, self.player.y
+        if self.recorder is not None:
+            self.recorder.record(keydowns, self.held_left, self.held_right)
+        if self.input_pipeline is not None:
+            self.input_pipeline.apply_input(self, keydowns, self.held_left, self.held_right)
+        else:
+            self.apply_input(keydowns, self.held_left, self.held_right)
+        self.metrics.lap('update:input')
+        self.update()
+    
+    def toggle_metrics_overlay(self):
+        # Measuring starts with the first F3 when the game was started without it
+        if not self.metrics.enabled:
+            self.metrics = FrameMetrics()
+        self.metrics.toggle_overlay()
+        if self.dirty_renderer is not None:
+            self.dirty_renderer.invalidate()
+    
+    def apply_input(self, keydowns, left, right):
+        # Shared by tick() and scripted (headless) input
+        for key in keydowns:
+            if key == pygame.K_SPACE:
+                self.shoot()
+        
+        if left:
+            self.player.move_left()
+        if right:
+            self.player.move_right()
+    
+    def shoot(self):
+        bullet_x = self.player.x + self.player.width // 2 - 2
+        bullet_y = self.player.y
+        bullet = self.bullet_pool.acquire(bullet_x, bullet_y)
+        if self.entity_store:
+            # The store copies the bullet, so it goes straight back
+            self.bullet_store.add(bullet)
+            self.bullet_pool.release(bullet)
+        else:
+            self.bullets.append(bullet)
+    
     def update(self):
+        metrics = self.metrics
         # Update bullets
-        for bullet in self.bullets[:]:
-            bullet.update()
-            if bullet.is_off_screen():
-                self.bullets.remove(bullet)
+        if self.entity_store:
+            self.bullet_store.move(-1)
+            self.bullet_store.cull(min_y=0)
+            metrics.lap('update:bullets')
+            self.enemy_store.move(1)
+            self.enemies_escaped += self.enemy_store.cull(max_y=SCREEN_HEIGHT)
+            metrics.lap('update:enemies')
+        else:
+            for bullet in self.bullets[:]:
+                bullet.update()
+                if bullet.is_off_screen():
+                    self.bullets.remove(bullet)
+                    self.bullet_pool.release(bullet)
+            metrics.lap('update:bullets')
         
-        # Update enemies
-        for enemy in self.enemies[:]:
-            enemy.update()
-            if enemy.is_off_screen():
-                self.enemies.remove(enemy)
+            # Update enemies
+            for enemy in self.enemies[:]:
+                enemy.update()
+                if enemy.is_off_screen():
+                    self.enemies.remove(enemy)
+                    self.enemy_grid.remove(enemy)
+                    self.enemy_pool.release(enemy)
+                    self.enemies_escaped += 1
+            metrics.lap('update:enemies')
         
         # Spawn enemies
         self.enemy_spawn_timer += 1
         if self.enemy_spawn_timer >= self.enemy_spawn_delay:
-            enemy_x = random.randint(0, SCREEN_WIDTH - 40)
-            self.enemies.append(Enemy(enemy_x, -30))
+            enemy_x = self.sim_random.randint(0, SCREEN_WIDTH - 40)
+            self.spawn_enemy(enemy_x, -30)
             self.enemy_spawn_timer = 0
+        metrics.lap('update:spawning')
         
         # Check collisions
         self.check_collisions()
+        metrics.lap('update:collisions')
+    
+    def spawn_enemy(self, x, y):
+        # Returns the enemy (or its entity store view)
+        if self.entity_store:
+            # The store copies the enemy, so it goes straight back
+            enemy = self.enemy_pool.acquire(x, y)
+            view = self.enemy_store.add(enemy)
+            self.enemy_pool.release(enemy)
+            return view
+        enemy = self.enemy_pool.acquire(x, y, self.enemy_grid)
+        self.enemies.append(enemy)
+        return enemy
     
     def check_collisions(self):
-        # Bullet-enemy collisions
-        for bullet in self.bullets[:]:
-            for enemy in self.enemies[:]:
-                if (bullet.x < enemy.x + enemy.width and
-                    bullet.x + bullet.width > enemy.x and
-                    bullet.y < enemy.y + enemy.height and
-                    bullet.y + bullet.height > enemy.y):
-                    
-                    self.bullets.remove(bullet)
-                    self.enemies.remove(enemy)
-                    self.score += 10
-                    break
+        if self.entity_store:
+            self.check_collisions_batched()
+            return
+        
+        # Bullet-enemy collisions. Each bullet only tests the enemies sharing
+        # a grid cell with it and hits the earliest spawned one it overlaps.
+        hit_bullets = set()
+        for bullet in self.bullets:
+            enemy = self.enemy_grid.first_overlap(bullet)
+            if enemy is not None:
+                self.enemy_grid.remove(enemy)
+                hit_bullets.add(bullet)
+                self.score += 10
+        
+        if hit_bullets:
+            self.bullet_pool.release_all([b for b in self.bullets if b in hit_bullets])
+            self.bullets[:] = [b for b in self.bullets if b not in hit_bullets]
+            self.enemy_pool.release_all([e for e in self.enemies if e not in self.enemy_grid])
+            self.enemies[:] = [e for e in self.enemies if e in self.enemy_grid]
     
-    def draw(self):
+    def check_collisions_batched(self):
+        # Same hits as check_collisions, found with vectorized overlap tests
+        hits = find_hits(self.bullet_store, self.enemy_store)
+        self.score += 10 * len(hits)
+        if hits:
+            self.bullet_store.remove([bullet for bullet, _ in hits])
+            self.enemy_store.remove([enemy for _, enemy in hits])
+    
+    def draw(self, alpha=1.0):
+        # alpha: how far between the last two simulation ticks to draw
+        if self.frame_export is not None:
+            # Views of the last frame lock the surfaces about to be drawn on
+            self.frame_export.release(alpha)
+        if self.dirty_renderer is not None:
+            self.draw_dirty(alpha)
+            return
+        
+        metrics = self.metrics
         self.screen.fill(BLACK)
+        metrics.lap('draw:clear')
+        self.draw_game_layer(alpha)
+        metrics.lap('draw:sprites')
+        self.draw_ui()
+        metrics.lap('draw:ui')
+        metrics.draw_overlay(self.screen)
+        metrics.lap('draw:metrics')
         
-        # Draw game objects
-        self.player.draw(self.screen)
+        pygame.display.flip()
+        metrics.lap('present')
+    
+    def draw_game_layer(self, alpha=1.0, screen=None):
+        # Draw game objects (onto the screen unless given another surface)
+        if screen is None:
+            screen = self.screen
+        self.draw_entity(self.player, alpha, screen)
         
         for bullet in self.bullets:
-            bullet.draw(self.screen)
+            self.draw_entity(bullet, alpha, screen)
             
         for enemy in self.enemies:
-            enemy.draw(self.screen)
-        
+            self.draw_entity(enemy, alpha, screen)
+    
+    def draw_entity(self, entity, alpha, screen):
+        # Drawn at its interpolated position, which only lasts for the draw
+        x, y = entity.x, entity.y
+        draw_x, draw_y = interpolate(entity, alpha)
+        entity.x, entity.y = round(draw_x), round(draw_y)
+        try:
+            entity.draw(screen)
+        finally:
+            entity.x, entity.y = x, y
+    
+    def frame_array(self, layer='frame'):
+        # The last drawn frame (or another of frame_export.LAYERS) as a
+        # (height, width, 3) uint8 view of its pixels, valid until the next
+        # draw()
+        return self.frame_export.view(layer, self.frame_surface(layer))
+    
+    def observation(self, layer='frame', out=None):
+        # The same, downsampled and/or grayscale as frame_export is set up
+        return self.frame_export.observation(layer, self.frame_surface(layer), out)
+    
+    def frame_surface(self, layer):
+        if self.screen is None:
+            raise RuntimeError("Headless games are never drawn")
+        if self.frame_export is None:
+            self.frame_export = FrameExporter()
+        if layer == 'frame':
+            return self.screen
+        if layer not in FRAME_LAYERS:
+            raise ValueError(f"Unknown layer {layer!r}, expected one of: {', '.join(FRAME_LAYERS)}")
+        surface, stale = self.frame_export.layer_surface(layer, self.screen.get_size())
+        if stale:
+            surface.fill(BLACK)
+            self.draw_game_layer(self.frame_export.alpha, surface)
+        return surface
+    
+    def draw_ui(self):
         # Draw score
-        score_text = self.font.render(f"Score: {self.score}", True, WHITE)
+        score_text = render_text(f"Score: {self.score}", 36, WHITE)
         self.screen.blit(score_text, (10, 10))
         
         # Draw instructions
@@ -180,22 +439,158 @@ class Game:
             "Space: Shoot"
         ]
         for i, instruction in enumerate(instructions):
-            text = pygame.font.Font(None, 24).render(instruction, True, WHITE)
+            text = render_text(instruction, 24, WHITE)
             self.screen.blit(text, (10, SCREEN_HEIGHT - 60 + i * 25))
-        
-        pygame.display.flip()
     
-    def run(self):
+    def draw_rects(self, alpha=1.0):
+        # Everything draw_game_layer is about to touch
+        rects = []
+        for entity in [self.player] + self.bullets + self.enemies:
+            x, y = interpolate(entity, alpha)
+            rects.append(pygame.Rect(round(x), round(y), entity.width, entity.height))
+        # (grown by a pixel: the ship's nose polygon includes its bottom edge)
+        rects[0].inflate_ip(2, 2)
+        if self.metrics.visible:
+            rects.append(self.metrics.overlay_rect())
+        return rects
+    
+    def draw_dirty(self, alpha=1.0):
+        # Same frame as draw(), but only the regions that changed since the
+        # last frame are cleared, redrawn and presented
+        renderer = self.dirty_renderer
+        metrics = self.metrics
+        renderer.begin_frame(self.draw_rects(alpha), HUD_BLOCKS, self.score)
+        renderer.erase(self.screen)
+        metrics.lap('draw:clear')
+        self.draw_game_layer(alpha)
+        metrics.lap('draw:sprites')
+        renderer.draw_hud(self.screen, self.draw_ui)
+        metrics.lap('draw:ui')
+        metrics.draw_overlay(self.screen)
+        metrics.lap('draw:metrics')
+        renderer.present()
+        metrics.lap('present')
+    
+    def run(self, tick_rate=DEFAULT_TICK_RATE, max_fps=60, metrics_path=None):
+        # The simulation runs at tick_rate ticks per second whatever the
+        # frame rate; max_fps caps rendering (0 for uncapped). metrics_path:
+        # CSV or JSON file the frame metrics are written to on exit.
+        timestep = FixedTimestep(tick_rate)
         running = True
-        while running:
-            running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(60)  # 60 FPS
-        
-        pygame.quit()
+        # The teardown runs however the loop ends (an exception, Ctrl+C), so
+        # recordings, captures and exports are always completed
+        try:
+            while running:
+                metrics = self.metrics
+                metrics.begin_frame()
+                running = self.handle_events()
+                metrics.lap('events')
+                ticks = timestep.advance()
+                if self.input_pipeline is not None:
+                    ticks = self.input_pipeline.schedule(timestep, ticks, self.pending_keydowns)
+                for _ in range(ticks):
+                    self.tick()
+                self.draw(timestep.alpha)
+                if self.input_pipeline is not None:
+                    self.input_pipeline.presented(timestep.alpha)
+                if self.session_recorder is not None:
+                    self.session_recorder.capture(self.screen, timestep.frames, timestep.ticks)
+                    metrics.lap('record')
+                if self.frame_publisher is not None:
+                    self.frame_publisher.publish_game(self)
+                    metrics.lap('publish')
+                if self.input_pipeline is not None:
+                    self.input_pipeline.wait(self.clock, max_fps)
+                else:
+                    self.clock.tick(max_fps)
+                metrics.lap('idle')
+                metrics.end_frame()
+                self.profiler.end_frame(self)
+                if timestep.frames == 1:
+                    self.startup.mark('first frame')
+                    print(self.startup.report())
+        finally:
+            self.profiler.close(self)
+            
+            print(f"Simulated {timestep.ticks} ticks in {timestep.frames} frames, "
+                  f"dropped {timestep.dropped_ticks} ticks")
+            if self.recorder is not None:
+                self.recorder.close(self)
+            if self.session_recorder is not None:
+                self.session_recorder.close()
+            if self.frame_publisher is not None:
+                self.frame_publisher.close()
+            if self.input_pipeline is not None:
+                self.input_pipeline.close()
+            
+            if self.metrics.enabled and metrics_path:
+                self.metrics.export(metrics_path)
+                frame = self.metrics.summary()['frame']
+                if frame is not None:
+                    print(f"Frame metrics for the last {len(self.metrics)} frames written to {metrics_path}: "
+                          f"mean {frame['mean_ms']:.2f} ms, p99 {frame['p99_ms']:.2f} ms, max {frame['max_ms']:.2f} ms")
+            
+            if self.dirty_renderer is not None:
+                renderer = self.dirty_renderer
+                print(f"Dirty rects: {renderer.mean_dirty_percent():.1f}% of the screen per frame on average, "
+                      f"{renderer.full_frames} of {renderer.frame} frames drawn in full")
+            
+            pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser(description="Retro Space Shooter")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="redraw and present only the screen regions that changed")
+    parser.add_argument('--dirty-log', type=argparse.FileType('w'), default=None,
+                        help="write the dirty-area percentage of every frame to this CSV file")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for the simulation (random if omitted)")
+    parser.add_argument('--record', metavar='FILE', default=None,
+                        help="record the session's input to FILE for headless.py --replay")
+    parser.add_argument('--record-frames', metavar='FILE', default=None,
+                        help="record the drawn frames to FILE (compressed, with a FILE.timing.csv sidecar)")
+    parser.add_argument('--record-pipe', metavar='COMMAND', default=None,
+                        help="stream raw frames to COMMAND's stdin, e.g. an ffmpeg command line using "
+                             "{width}, {height}, {pix_fmt} and {fps}")
+    parser.add_argument('--record-policy', choices=RECORD_POLICIES, default='decimate',
+                        help="what frame recording does when the writer falls behind")
+    parser.add_argument('--publish-frames', metavar='NAME', default=None,
+                        help="publish every drawn frame to the shared memory NAME (see frame_shm.py)")
+    parser.add_argument('--input-latency', metavar='FILE', default=None,
+                        help="measure key-press-to-screen latency and write its histograms to FILE (.csv or .json) on exit")
+    parser.add_argument('--late-input', action='store_true',
+                        help="act on key presses as soon as they arrive instead of at the next frame")
+    parser.add_argument('--tick-rate', type=int, default=DEFAULT_TICK_RATE,
+                        help="simulation ticks per second")
+    parser.add_argument('--fps', type=int, default=60,
+                        help="rendering frame rate cap (0 for uncapped)")
+    parser.add_argument('--metrics', metavar='FILE', default=None,
+                        help="time every frame's phases and write them to FILE (.csv or .json) on exit")
+    parser.add_argument('--profile-frames', type=int, default=PROFILE_FRAMES,
+                        help="frames covered by each profiler capture (F9 starts one)")
+    parser.add_argument('--profile-after', type=int, metavar='FRAME', default=None,
+                        help="also start a profiler capture once FRAME frames have been drawn")
+    parser.add_argument('--profiler', choices=PROFILER_MODES, default='cprofile',
+                        help="cProfile, or the lower-overhead stack sampler")
+    parser.add_argument('--profile-dir', default='.',
+                        help="directory profiler captures are written to")
+    args = parser.parse_args()
+    
+    # Times interpreter start-up and imports too
+    startup = StartupTimer(from_process_start=True)
+    game = Game(dirty_rects=args.dirty_rects or args.dirty_log is not None, dirty_log=args.dirty_log,
+                seed=args.seed, frame_metrics=args.metrics is not None, startup=startup)
+    game.profiler = ProfilerCapture(VARIANT, args.profile_frames, args.profiler, args.profile_dir)
+    if args.profile_after is not None:
+        game.profiler.request(args.profile_after)
+    if args.record:
+        game.recorder = InputRecorder(args.record, VARIANT, game.seed, args.tick_rate, 'moss')
+    if args.record_frames or args.record_pipe:
+        game.session_recorder = SessionRecorder(args.record_frames, args.record_pipe, policy=args.record_policy,
+                                                fps=args.fps or args.tick_rate, variant=VARIANT)
+    if args.publish_frames:
+        game.frame_publisher = FramePublisher(args.publish_frames, game.screen.get_size())
+    if args.input_latency or args.late_input:
+        game.input_pipeline = InputPipeline(late=args.late_input, path=args.input_latency)
+    game.run(tick_rate=args.tick_rate, max_fps=args.fps, metrics_path=args.metrics)
@@ -0,0 +1,20 @@
+import random
+
+# Random streams. Each Game owns a seeded random.Random for everything that
+# affects the simulation (enemy spawn positions and types), so a game's
+# simulation depends only on its seed and its input. Everything cosmetic
+# (glitches, bug legs, hair jitter, screen shake, matrix rain, explosion
+# particles, baked sprite variants) draws from fx_random instead; rendering
+# can consume it at any rate without disturbing the simulation.
+
+fx_random = random.Random()
+
+
+def new_seed():
+    # Seed for a game started without one, so every session can be recorded
+    return random.SystemRandom().randrange(2 ** 32)
+
+
+def seed_fx(seed):
+    # Cosmetic stream of a seeded game, distinct from its simulation stream
+    fx_random.seed(f"fx-{seed}")
@@ -0,0 +1,625 @@
+import argparse
+import inspect
+import random
+import struct
+import sys
+import time
+import timeit
+
+import pygame
+
+import headless
+from replay import state_digest
+
+# Rollback netcode (GGPO style) for peer-to-peer play. Every peer runs the
+# whole simulation. Remote input that has not arrived yet is predicted (the
+# peer keeps doing what it did last); when the real input turns out to
+# differ, the game is rolled back to the snapshot saved before that frame
+# and the frames since are simulated again with the corrected input.
+#
+#   python rollback.py                                  # all benchmarks
+#   python rollback.py --variant it-crowd --delay 6 --loss 0.2 --frames 3000
+#
+# GameSnapshots saves what the simulation carries from frame to frame, in
+# one struct.pack call: score, escaped enemies, spawn timer, screen shake,
+# game state, players, and the position (plus type and animation timer) of
+# every bullet, enemy and explosion. sim_random is replaced by a
+# CountingRandom that counts the generator words it used, so a snapshot
+# only stores that count: the generator's 2.5 KB state is looked up by it
+# on restore, and getstate() runs only on frames where it moved (enemy
+# spawns). Restoring hands the entities back to their pools and acquires
+# them again, which also rebuilds the spatial hash in spawn order.
+#
+# Cosmetics are not rolled back: matrix rain, explosion particles (an
+# explosion restarts its particles from its position) and the NumPy
+# particle system. While frames are simulated again, game.resimulating is
+# set, and the rain and particle system neither move nor emit, so a
+# re-simulated hit does not explode a second time on screen (an explosion
+# only a mispredicted frame had stays). Games with entity_store=True are
+# not supported.
+#
+# Peer 0 is game.player, driven through Game.apply_input; more peers need a
+# Game.shoot(player) (it-crowd.py) and get a Player of their own.
+
+# Input bits, one byte per peer and frame
+LEFT, RIGHT, FIRE = 1, 2, 4
+
+FRAME_BUDGET = 1 / 60
+
+DEFAULT_INPUT_DELAY = 2
+DEFAULT_MAX_ROLLBACK = 8
+
+# Generator states kept for restores (one per frame the generator moved on)
+RNG_STATES = 64
+
+# score, escaped, spawn timer, generator words used, screen shake, state,
+# players, bullets, enemies, explosions
+HEADER_FORMAT = '<iIIIHBBHHH'
+HEADER = struct.Struct(HEADER_FORMAT)
+# Entity fields follow column by column (all x, then all y, ...), which
+# keeps the format strings short whatever the entity counts
+PLAYER_FORMAT = '{0}h{0}h{0}I'          # x, y, blink timer
+BULLET_FORMAT = '{0}h{0}h'              # x, y
+ENEMY_FORMAT = '{0}h{0}h{0}B{0}H'       # x, y, type, animation timer
+EXPLOSION_FORMAT = '{0}h{0}h{0}B'       # x, y, timer
+
+# Compiled layouts kept per entity counts
+LAYOUT_CACHE = 1024
+
+STATES = ('playing', 'character_select')
+
+
+class CountingRandom(random.Random):
+    # Drop-in sim_random that counts the 32-bit words it draws from the
+    # Mersenne Twister: its state is then a function of that count.
+    # (gauss() keeps extra state and is not covered.)
+    def __init__(self, state):
+        super().__init__()
+        self.setstate(state)
+        self.words = 0
+
+    def getrandbits(self, k):
+        self.words += (k + 31) // 32
+        return super().getrandbits(k)
+
+    def random(self):
+        self.words += 2
+        return super().random()
+
+
+class GameSnapshots:
+    # Saves and restores a game's simulation state as compact bytes.
+    # players: Players beyond game.player (rollback peers 1, 2, ...)
+    def __init__(self, game, players=()):
+        if game.entity_store:
+            raise ValueError("Rollback snapshots need the object entities (entity_store=False)")
+        self.game = game
+        self.module = sys.modules[type(game).__module__]
+        self.extra_players = list(players)
+        self.enemy_types = getattr(self.module, 'ENEMY_TYPES', None)
+        self.has_explosions = hasattr(game, 'explosions')
+        if not isinstance(game.sim_random, CountingRandom):
+            game.sim_random = CountingRandom(game.sim_random.getstate())
+        self.rng = game.sim_random
+        self.rng_states = {self.rng.words: self.rng.getstate()}
+        self.structs = {}
+
+    def _struct(self, players, bullets, enemies, explosions):
+        key = (players, bullets, enemies, explosions)
+        layout = self.structs.get(key)
+        if layout is None:
+            if len(self.structs) >= LAYOUT_CACHE:
+                self.structs.clear()
+            layout = struct.Struct(HEADER_FORMAT + PLAYER_FORMAT.format(players) + BULLET_FORMAT.format(bullets) +
+                                   ENEMY_FORMAT.format(enemies) + EXPLOSION_FORMAT.format(explosions))
+            self.structs[key] = layout
+        return layout
+
+    def save(self):
+        game = self.game
+        rng = self.rng
+        if rng.words not in self.rng_states:
+            self.rng_states[rng.words] = rng.getstate()
+            if len(self.rng_states) > RNG_STATES:
+                del self.rng_states[next(iter(self.rng_states))]
+
+        players = ([game.player] if game.player is not None else []) + self.extra_players
+        values = [player.x for player in players]
+        values += [player.y for player in players]
+        values += [getattr(player, 'blink_timer', 0) for player in players]
+        bullets = game.bullets
+        values += [bullet.x for bullet in bullets]
+        values += [bullet.y for bullet in bullets]
+        enemies = game.enemies
+        values += [enemy.x for enemy in enemies]
+        values += [enemy.y for enemy in enemies]
+        if self.enemy_types:
+            index = self.enemy_types.index
+            values += [index(enemy.enemy_type) for enemy in enemies]
+            values += [enemy.animation_timer for enemy in enemies]
+        else:
+            values += [0] * (2 * len(enemies))
+        explosions = game.explosions if self.has_explosions else ()
+        values += [explosion.x for explosion in explosions]
+        values += [explosion.y for explosion in explosions]
+        values += [explosion.timer for explosion in explosions]
+        layout = self._struct(len(players), len(game.bullets), len(game.enemies), len(explosions))
+        return layout.pack(game.score, game.enemies_escaped, game.enemy_spawn_timer, rng.words,
+                           getattr(game, 'screen_shake', 0), STATES.index(getattr(game, 'state', 'playing')),
+                           len(players), len(game.bullets), len(game.enemies), len(explosions), *values)
+
+    def load(self, data):
+        game = self.game
+        header = HEADER.unpack_from(data)
+        _, _, _, words, _, _, player_count, bullet_count, enemy_count, explosion_count = header
+        values = self._struct(player_count, bullet_count, enemy_count, explosion_count).unpack(data)
+        (game.score, game.enemies_escaped, game.enemy_spawn_timer, _, screen_shake, state) = values[:6]
+        if hasattr(game, 'screen_shake'):
+            game.screen_shake = screen_shake
+        if hasattr(game, 'state'):
+            game.state = STATES[state]
+        rng = self.rng
+        if rng.words != words:
+            if words not in self.rng_states:
+                raise ValueError("Snapshot is older than the generator states kept")
+            rng.setstate(self.rng_states[words])
+            rng.words = words
+        pos = len(header)
+
+        def column(count):
+            nonlocal pos
+            pos += count
+            return values[pos - count:pos]
+
+        players = self.extra_players
+        if player_count > len(players):
+            players = [game.player] + players
+        for player, x, y, blink_timer in zip(players, column(player_count), column(player_count),
+                                             column(player_count)):
+            player.x = player.prev_x = x
+            player.y = player.prev_y = y
+            if hasattr(player, 'blink_timer'):
+                player.blink_timer = blink_timer
+
+        # Entities go back to their pools and are acquired again, which
+        # re-inserts the enemies into the spatial hash in spawn order
+        game.bullet_pool.release_all(game.bullets)
+        acquire = game.bullet_pool.acquire
+        game.bullets = [acquire(x, y) for x, y in zip(column(bullet_count), column(bullet_count))]
+
+        game.enemy_pool.release_all(game.enemies)
+        game.enemy_grid.clear()
+        acquire = game.enemy_pool.acquire
+        grid = game.enemy_grid
+        xs, ys, types, timers = (column(enemy_count) for _ in range(4))
+        enemy_types = self.enemy_types
+        if enemy_types:
+            enemies = [acquire(x, y, enemy_types[kind], grid) for x, y, kind in zip(xs, ys, types)]
+            for enemy, timer in zip(enemies, timers):
+                enemy.animation_timer = timer
+        else:
+            enemies = [acquire(x, y, grid) for x, y in zip(xs, ys)]
+        game.enemies = enemies
+
+        if self.has_explosions:
+            game.explosion_pool.release_all(game.explosions)
+            acquire = game.explosion_pool.acquire
+            explosions = []
+            for x, y, timer in zip(column(explosion_count), column(explosion_count), column(explosion_count)):
+                explosion = acquire(x, y)
+                explosion.timer = timer
+                explosions.append(explosion)
+            game.explosions = explosions
+
+
+def hosts_peers(module):
+    # Whether a variant can play with more than one peer: it needs
+    # Game.shoot(player) and a Player taking a character (it-crowd.py)
+    return 'player' in inspect.signature(module.Game.shoot).parameters
+
+
+def make_players(game, peers):
+    # Players for peers 1, 2, ... next to game.player
+    module = sys.modules[type(game).__module__]
+    if peers > 1 and not hosts_peers(module):
+        raise ValueError(f"{module.VARIANT} has no Game.shoot(player) and plays with one peer only")
+    players = []
+    for peer in range(1, peers):
+        character = headless.CHARACTERS[peer % len(headless.CHARACTERS)]
+        x = module.SCREEN_WIDTH * (peer + 1) // (peers + 1) - game.player.width // 2
+        players.append(module.Player(x, game.player.y, character))
+    return players
+
+
+def simulate(game, players, inputs):
+    # One frame with one input byte per peer
+    bits = inputs[0]
+    game.player.prev_x, game.player.prev_y = game.player.x, game.player.y
+    game.apply_input([pygame.K_SPACE] if bits & FIRE else [], bits & LEFT, bits & RIGHT)
+    for player, bits in zip(players, inputs[1:]):
+        player.prev_x = player.x
+        if bits & FIRE:
+            game.shoot(player)
+        if bits & LEFT:
+            player.move_left()
+        if bits & RIGHT:
+            player.move_right()
+        player.update()
+    game.update()
+
+
+class RollbackSession:
+    # One peer's view of a game played by `peers` peers. Every frame:
+    # advance(local_input) sends the input (applied input_delay frames
+    # later), rolls back when remote input contradicted a prediction, and
+    # simulates the next frame. It returns False without simulating when
+    # the oldest unconfirmed frame is max_rollback frames behind.
+    def __init__(self, game, peer, peers, transport, input_delay=DEFAULT_INPUT_DELAY,
+                 max_rollback=DEFAULT_MAX_ROLLBACK):
+        self.game = game
+        self.peer = peer
+        self.peers = peers
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.players = make_players(game, peers)
+        self.codec = GameSnapshots(game, self.players)
+
+        self.frame = 0                  # next frame to simulate
+        self.inputs = {}                # frame -> list of input bytes (confirmed or predicted)
+        self.confirmed = [dict() for _ in range(peers)]   # per peer, frame -> input
+        self.last_confirmed = [-1] * peers                  # per peer, newest contiguous confirmed frame
+        self.snapshots = {}             # frame -> state before simulating it
+        self.rollback_to = None         # earliest frame whose prediction was wrong
+        self.acked = [-1] * peers       # per peer, newest frame of our input it has
+
+        # The first input_delay frames have no input
+        for frame in range(input_delay):
+            for confirmed in self.confirmed:
+                confirmed[frame] = 0
+        self.last_confirmed = [input_delay - 1] * peers
+
+        # Stats
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.max_depth = 0
+        self.stalls = 0
+        self.save_time = 0.0
+        self.load_time = 0.0
+
+    def input_for(self, peer, frame):
+        confirmed = self.confirmed[peer]
+        if frame in confirmed:
+            return confirmed[frame]
+        # Prediction: the newest confirmed input
+        return confirmed.get(self.last_confirmed[peer], 0)
+
+    def receive(self):
+        for sender, first, data, ack in self.transport.receive(self.peer):
+            self.acked[sender] = max(self.acked[sender], ack)
+            confirmed = self.confirmed[sender]
+            for offset, bits in enumerate(data):
+                frame = first + offset
+                if frame <= self.last_confirmed[sender] or frame in confirmed:
+                    continue
+                confirmed[frame] = bits
+                if frame < self.frame and self.inputs[frame][sender] != bits:
+                    if self.rollback_to is None or frame < self.rollback_to:
+                        self.rollback_to = frame
+            last = self.last_confirmed[sender]
+            while last + 1 in confirmed:
+                last += 1
+            self.last_confirmed[sender] = last
+
+    def send(self):
+        # Every local input the others have not confirmed yet, so that a
+        # lost packet is covered by the next one
+        own = self.confirmed[self.peer]
+        newest = self.last_confirmed[self.peer]
+        for peer in range(self.peers):
+            if peer == self.peer:
+                continue
+            first = self.acked[peer] + 1
+            data = bytes(own[frame] for frame in range(first, newest + 1))
+            # The ack tells the peer how much of its input arrived
+            self.transport.send(self.peer, peer, first, data, self.last_confirmed[peer])
+
+    def confirmed_frame(self):
+        return min(self.last_confirmed)
+
+    def advance(self, local_input):
+        own = self.confirmed[self.peer]
+        target = self.frame + self.input_delay
+        if target not in own:
+            own[target] = local_input
+            self.last_confirmed[self.peer] = target
+        self.synchronize()
+        if self.frame - self.confirmed_frame() > self.max_rollback:
+            self.stalls += 1
+            return False
+        self.step()
+        self.forget(self.confirmed_frame())
+        return True
+
+    def synchronize(self):
+        # Exchanges input with the other peers and corrects mispredictions
+        self.receive()
+        self.send()
+        if self.rollback_to is not None:
+            self.roll_back(self.rollback_to)
+            self.rollback_to = None
+
+    def step(self):
+        frame = self.frame
+        start = time.perf_counter()
+        self.snapshots[frame] = self.codec.save()
+        self.save_time += time.perf_counter() - start
+        inputs = [self.input_for(peer, frame) for peer in range(self.peers)]
+        self.inputs[frame] = inputs
+        simulate(self.game, self.players, inputs)
+        self.frame = frame + 1
+
+    def roll_back(self, frame):
+        # Restores the state before frame and simulates up to the current
+        # frame again
+        current = self.frame
+        start = time.perf_counter()
+        self.codec.load(self.snapshots[frame])
+        self.load_time += time.perf_counter() - start
+        self.frame = frame
+        self.game.resimulating = True
+        try:
+            while self.frame < current:
+                self.step()
+        finally:
+            self.game.resimulating = False
+        depth = current - frame
+        self.rollbacks += 1
+        self.resimulated += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def forget(self, confirmed):
+        # Nothing before the newest fully confirmed frame is rolled back to
+        # again. Input of frames not simulated yet stays, and own input
+        # stays until every peer has it.
+        limit = min(confirmed, self.frame)
+        for frame in [frame for frame in self.snapshots if frame < limit]:
+            del self.snapshots[frame]
+            del self.inputs[frame]
+        for peer, inputs in enumerate(self.confirmed):
+            oldest = limit
+            if peer == self.peer:
+                oldest = min([limit] + [ack + 1 for other, ack in enumerate(self.acked) if other != peer])
+            for frame in [frame for frame in inputs if frame < oldest]:
+                del inputs[frame]
+
+    def stats(self):
+        return {
+            'frame': self.frame,
+            'rollbacks': self.rollbacks,
+            'resimulated': self.resimulated,
+            'max_depth': self.max_depth,
+            'stalls': self.stalls,
+        }
+
+
+class LossyTransport:
+    # Local stand-in for UDP between peers: every packet is delayed by
+    # delay +- jitter frames, and dropped with probability loss. Time is
+    # counted in frames, advanced by tick().
+    def __init__(self, delay=3, jitter=1, loss=0.0, seed=0):
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.now = 0
+        self.in_flight = []     # (arrival, receiver, packet)
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def send(self, sender, receiver, first, data, ack):
+        self.sent += 1
+        self.bytes_sent += 12 + len(data)   # sender, first frame, ack, length
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        arrival = self.now + max(0, self.delay + self.random.randint(-self.jitter, self.jitter))
+        self.in_flight.append((arrival, receiver, (sender, first, data, ack)))
+
+    def receive(self, receiver):
+        arrived = [item for item in self.in_flight if item[0] <= self.now and item[1] == receiver]
+        if arrived:
+            self.in_flight = [item for item in self.in_flight if not (item[0] <= self.now and item[1] == receiver)]
+        return [packet for _, _, packet in arrived]
+
+    def tick(self):
+        self.now += 1
+
+
+# Benchmarks
+
+# Rollback depths are measured up to this many frames
+MAX_MEASURED_DEPTH = 600
+
+def new_game(variant, seed=1):
+    # A started headless game whose explosions are Explosion objects
+    module = headless.load_variant(variant)
+    options = {'particle_system': False} if hasattr(module, 'ParticleSystem') else {}
+    return headless.create_game(module, 'moss', seed=seed, **options)
+
+
+def loaded_game(variant, enemies, bullets, seed=1):
+    # A game with the given numbers of enemies and bullets on screen
+    game = new_game(variant, seed)
+    module = sys.modules[type(game).__module__]
+    rng = random.Random(seed)
+    for _ in range(enemies):
+        x, y = rng.randint(0, module.SCREEN_WIDTH - 50), rng.randint(-40, 300)
+        if hasattr(module, 'ENEMY_TYPES'):
+            game.spawn_enemy(x, y, rng.choice(module.ENEMY_TYPES))
+        else:
+            game.spawn_enemy(x, y)
+    x = game.player.x
+    for _ in range(bullets):
+        game.player.x = rng.randint(0, module.SCREEN_WIDTH - game.player.width)
+        game.shoot()
+        game.bullets[-1].y = rng.randint(320, module.SCREEN_HEIGHT - 100)
+    game.player.x = x
+    return game
+
+
+def measure_costs(variant, loads, number=2000):
+    # Snapshot size, save, restore and update time per entity load, and the
+    # deepest rollback (a restore, then a save and an update per frame)
+    # that fits in one 60 FPS frame
+    print(f"{variant}:")
+    print(f"{'enemies':>9}{'bullets':>9}{'bytes':>8}{'save us':>9}{'restore us':>12}{'update us':>11}"
+          f"{'max rollback':>14}{'its time ms':>13}")
+    for enemies, bullets in loads:
+        game = loaded_game(variant, enemies, bullets)
+        codec = GameSnapshots(game)
+        data = codec.save()
+        runs = max(20, number * 10 // (10 + enemies + bullets))
+        save = min(timeit.repeat(codec.save, number=runs, repeat=3)) / runs
+        load = min(timeit.repeat(lambda: codec.load(data), number=runs, repeat=3)) / runs
+
+        # Restoring before every update keeps the load the same
+        def frame():
+            codec.load(data)
+            game.update()
+        update = max(0.0, min(timeit.repeat(frame, number=runs, repeat=3)) / runs - load)
+
+        depth = min(MAX_MEASURED_DEPTH, int((FRAME_BUDGET - load) / (save + update)))
+        # Timing that rollback checks the estimate. Left to run, the game
+        # would lose its bullets and enemies within a few frames, so every
+        # frame restarts from the loaded state like the update measurement,
+        # and the extra restores are taken off again.
+        elapsed = None
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(depth):
+                codec.load(data)
+                codec.save()
+                game.update()
+            took = time.perf_counter() - start - max(0, depth - 1) * load
+            elapsed = took if elapsed is None else min(elapsed, took)
+        shown = f"{depth}+" if depth == MAX_MEASURED_DEPTH else str(depth)
+        print(f"{enemies:>9}{bullets:>9}{len(data):>8}{save * 1e6:>9.1f}{load * 1e6:>12.1f}"
+              f"{update * 1e6:>11.1f}{shown:>14}{elapsed * 1000:>13.2f}")
+
+
+def check_restore(variant, frames=2000, seed=1):
+    # Restoring a snapshot must bring back the exact state, and simulating
+    # from it must give the same next state
+    game = new_game(variant, seed)
+    codec = GameSnapshots(game)
+    rng = random.Random(seed)
+    for frame in range(frames):
+        before = codec.save()
+        digest = state_digest(game)
+        inputs = [rng.choice((0, LEFT, RIGHT, FIRE, LEFT | FIRE, RIGHT | FIRE))]
+        simulate(game, [], inputs)
+        after = state_digest(game)
+        codec.load(before)
+        if state_digest(game) != digest:
+            raise AssertionError(f"{variant}: restoring frame {frame} did not bring its state back")
+        simulate(game, [], inputs)
+        if state_digest(game) != after:
+            raise AssertionError(f"{variant}: frame {frame} simulated differently after a restore")
+
+
+def play_match(variant='it-crowd', peers=2, frames=3000, delay=3, jitter=2, loss=0.1,
+               input_delay=DEFAULT_INPUT_DELAY, max_rollback=DEFAULT_MAX_ROLLBACK, seed=1):
+    # Peers pressing random buttons over a LossyTransport, one frame each
+    # per transport tick. Returns the sessions, the transport and whether
+    # every peer ended in the state of one straight simulation with
+    # everybody's real input.
+    transport = LossyTransport(delay, jitter, loss, seed)
+    sessions = [RollbackSession(new_game(variant, seed), peer, peers, transport, input_delay, max_rollback)
+                for peer in range(peers)]
+    rngs = [random.Random(seed * 100 + peer) for peer in range(peers)]
+    pressed = [[] for _ in range(peers)]   # per peer, the input applied input_delay frames later
+    held = [0] * peers
+    while any(session.frame < frames for session in sessions):
+        for peer, session in enumerate(sessions):
+            if session.frame >= frames:
+                session.synchronize()
+                continue
+            rng = rngs[peer]
+            if rng.random() < 0.1:
+                held[peer] = rng.choice((0, LEFT, RIGHT))
+            bits = held[peer] | (FIRE if rng.random() < 0.15 else 0)
+            # advance() keeps the first input given for a frame, retried after a stall
+            if len(pressed[peer]) == session.frame:
+                pressed[peer].append(bits)
+            session.advance(bits)
+        transport.tick()
+    # Let the last input arrive
+    while any(session.confirmed_frame() < frames - 1 or session.rollback_to is not None for session in sessions):
+        for session in sessions:
+            session.synchronize()
+        transport.tick()
+
+    game = new_game(variant, seed)
+    players = make_players(game, peers)
+    for frame in range(frames):
+        simulate(game, players, [pressed[peer][frame - input_delay] if frame >= input_delay else 0
+                                 for peer in range(peers)])
+    expected = (state_digest(game), [(player.x, player.y) for player in players])
+    synced = all((state_digest(session.game), [(player.x, player.y) for player in session.players]) == expected
+                 for session in sessions)
+    return sessions, transport, synced
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rollback snapshot benchmarks and a lossy-network match.")
+    parser.add_argument('--variant', choices=sorted(headless.VARIANTS), default=None,
+                        help="variant to measure (default: all; the match is played with it-crowd)")
+    parser.add_argument('--frames', type=int, default=3000, help="frames of the simulated match")
+    parser.add_argument('--peers', type=int, default=None,
+                        help="peers in the match (default: 2, or 1 for variants that only have one player)")
+    parser.add_argument('--delay', type=int, default=3, help="network delay, in frames")
+    parser.add_argument('--jitter', type=int, default=2, help="network jitter, in frames")
+    parser.add_argument('--loss', type=float, default=0.1, help="packet loss probability")
+    parser.add_argument('--input-delay', type=int, default=DEFAULT_INPUT_DELAY)
+    parser.add_argument('--max-rollback', type=int, default=DEFAULT_MAX_ROLLBACK)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    variant = args.variant or 'it-crowd'
+    hosts = hosts_peers(headless.load_variant(variant))
+    if args.peers is None:
+        args.peers = 2 if hosts else 1
+    elif args.peers < 1:
+        parser.error("--peers must be at least 1")
+    elif args.peers > 1 and not hosts:
+        parser.error(f"{variant} has a single player; matches with --peers {args.peers} need it-crowd")
+
+    for variant in [args.variant] if args.variant else list(headless.VARIANTS):
+        check_restore(variant)
+        measure_costs(variant, [(0, 0), (10, 10), (50, 50), (200, 200)])
+        print()
+
+    variant = args.variant or 'it-crowd'
+    start = time.perf_counter()
+    sessions, transport, synced = play_match(variant, args.peers, args.frames, args.delay, args.jitter, args.loss,
+                                             args.input_delay, args.max_rollback, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Match: {args.peers} peers, {args.frames} frames, delay {args.delay}+-{args.jitter} frames, "
+          f"{args.loss:.0%} loss, input delay {args.input_delay}: {transport.sent} packets "
+          f"({transport.dropped} lost), {transport.bytes_sent / max(1, transport.sent):.1f} bytes each, "
+          f"{elapsed:.1f}s")
+    for session in sessions:
+        stats = session.stats()
+        frames = max(1, stats['frame'])
+        print(f"  peer {session.peer}: {stats['rollbacks']} rollbacks, {stats['resimulated']} frames resimulated "
+              f"({stats['resimulated'] / frames:.2f} per frame), deepest {stats['max_depth']}, "
+              f"{stats['stalls']} stalls, save {session.save_time / max(1, frames + stats['resimulated']) * 1e6:.1f} "
+              f"us, restore {session.load_time / max(1, stats['rollbacks']) * 1e6:.1f} us")
+    print("  all peers ended in the same state as a straight simulation" if synced else
+          "  PEERS DESYNCED")
+    return 0 if synced else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
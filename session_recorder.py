@@ -0,0 +1,254 @@
+import json
+import queue
+import shlex
+import struct
+import subprocess
+import threading
+import time
+import zlib
+
+import pygame
+
+# Gameplay video capture that never holds up the frame loop. After each
+# drawn frame the game blits the screen into a free slot of a small ring of
+# surfaces (a memcpy); a background thread compresses and writes the slots
+# and hands them back. zlib and pipe writes release the GIL, so the writer
+# runs alongside the game instead of between its frames.
+#
+#   python it-crowd.py --record-frames session.frames
+#   python it-crowd.py --record-pipe "ffmpeg -f rawvideo -pix_fmt {pix_fmt} -s {width}x{height} -r {fps} -i - out.mp4"
+#
+# When the writer falls behind, frames are thinned out rather than waited
+# for: with the ring more than three quarters full only every 2nd, then 4th,
+# ... frame is captured (decimated), back up as it drains below a quarter,
+# and a frame arriving with every slot in use is dropped.
+#
+# Frame files: b'RGFS', format version byte, header length (uint32 LE), JSON
+# header (size, pitch, pixel format, ...), then per frame its compressed
+# length (uint32 LE) and the zlib-compressed raw surface pixels. Beside it,
+# <file>.timing.csv has one row per written frame: capture number, game
+# frame, simulation tick and the capture and write times. Pipe recordings
+# stream the raw pixels to the command's stdin, and write the timing file
+# only when asked to.
+
+MAGIC = b'RGFS'
+FORMAT_VERSION = 1
+
+DEFAULT_SLOTS = 32
+MAX_DECIMATION = 8
+COMPRESS_LEVEL = 1
+POLICIES = ('decimate', 'drop')
+
+
+def pixel_format(surface):
+    # Bytes of a pixel in memory order, e.g. 'bgrx' (ffmpeg: bgr0)
+    names = {}
+    for name, mask, shift in zip('rgba', surface.get_masks(), surface.get_shifts()):
+        if mask:
+            names[shift // 8] = name
+    return ''.join(names.get(i, 'x') for i in range(surface.get_bytesize()))
+
+
+def ffmpeg_pixel_format(surface):
+    return pixel_format(surface).replace('x', '0')
+
+
+def read_frames(path):
+    # (header, iterator of raw frame bytes) of a frame file
+    f = open(path, 'rb')
+    if f.read(4) != MAGIC or f.read(1) != bytes([FORMAT_VERSION]):
+        f.close()
+        raise ValueError(f"{path} is not a frame recording of this version")
+    (length,) = struct.unpack('<I', f.read(4))
+    header = json.loads(f.read(length).decode('utf-8'))
+
+    def frames():
+        with f:
+            while True:
+                size = f.read(4)
+                if len(size) < 4:
+                    return
+                yield zlib.decompress(f.read(struct.unpack('<I', size)[0]))
+    return header, frames()
+
+
+class SessionRecorder:
+    def __init__(self, path=None, pipe=None, timing_path=None, slots=DEFAULT_SLOTS, policy='decimate',
+                 fps=60, variant=None, compress_level=COMPRESS_LEVEL):
+        # path: frame file to write, or pipe: shell command to stream raw
+        # frames to ({width}, {height}, {pix_fmt} and {fps} are filled in)
+        if (path is None) == (pipe is None):
+            raise ValueError("Record to either a file or a pipe")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of: {', '.join(POLICIES)}")
+        self.path = path
+        self.pipe_command = pipe
+        self.timing_path = timing_path if timing_path or path is None else path + '.timing.csv'
+        self.slot_count = slots
+        self.policy = policy
+        self.fps = fps
+        self.variant = variant
+        self.compress_level = compress_level
+
+        # Set up by the first capture, when the screen's format is known
+        self.free = queue.SimpleQueue()
+        self.ready = queue.SimpleQueue()
+        self.writer = None
+        self.output = None
+        self.process = None
+        self.timing = None
+        self.error = None
+        self.start = time.perf_counter()
+
+        # Counters
+        self.frames_seen = 0
+        self.captured = 0
+        self.decimated = 0
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.finished = 0        # captured frames the writer is done with
+        self.lag = 0.0           # capture-to-written seconds of the last frame
+        self.max_lag = 0.0
+        self.decimation = 1      # capture every decimation-th frame
+
+    def capture(self, screen, frame=0, tick=0):
+        # Called after every drawn frame; never waits for the writer
+        if self.writer is None:
+            self._open(screen)
+        self.frames_seen += 1
+        if self.error is not None:
+            self.dropped += 1
+            return False
+        if self.policy == 'decimate':
+            self._adjust_decimation()
+            if self.frames_seen % self.decimation:
+                self.decimated += 1
+                return False
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        slot.blit(screen, (0, 0))
+        self.captured += 1
+        self.ready.put((slot, self.captured - 1, frame, tick, time.perf_counter()))
+        return True
+
+    @property
+    def queued(self):
+        # Captured frames not written yet. Each counter has a single
+        # writing thread, so no lock is needed.
+        return self.captured - self.finished
+
+    def _adjust_decimation(self):
+        busy = self.queued / self.slot_count
+        if busy > 0.75 and self.decimation < MAX_DECIMATION:
+            self.decimation *= 2
+        elif busy < 0.25 and self.decimation > 1:
+            self.decimation //= 2
+
+    def _open(self, screen):
+        size = screen.get_size()
+        for _ in range(self.slot_count):
+            self.free.put(screen.copy())
+        slot = screen.copy()
+        header = {
+            'width': size[0],
+            'height': size[1],
+            'pitch': slot.get_pitch(),
+            'pixel_format': pixel_format(slot),
+            'variant': self.variant,
+            'fps': self.fps,
+        }
+        if self.path is not None:
+            self.output = open(self.path, 'wb')
+            encoded = json.dumps(header).encode('utf-8')
+            self.output.write(MAGIC + bytes([FORMAT_VERSION]) + struct.pack('<I', len(encoded)) + encoded)
+        else:
+            # Surface pixels go to the encoder as they are, unless rows are
+            # padded; then they are converted to RGB
+            self.pipe_packed = slot.get_pitch() == size[0] * slot.get_bytesize()
+            pix_fmt = ffmpeg_pixel_format(slot) if self.pipe_packed else 'rgb24'
+            command = self.pipe_command.format(width=size[0], height=size[1], fps=self.fps, pix_fmt=pix_fmt)
+            self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+            self.output = self.process.stdin
+        if self.timing_path is not None:
+            self.timing = open(self.timing_path, 'w')
+            self.timing.write('capture,frame,tick,captured_s,written_s\n')
+        self.writer = threading.Thread(target=self._write_frames, name='session-writer', daemon=True)
+        self.writer.start()
+
+    def _write_frames(self):
+        while True:
+            item = self.ready.get()
+            if item is None:
+                return
+            slot, number, frame, tick, captured_at = item
+            try:
+                if self.error is None:
+                    self._write(slot)
+            except (OSError, ValueError) as e:
+                # A broken pipe or full disk ends the recording, not the game
+                self.error = e
+            finally:
+                self.free.put(slot)
+                self.finished += 1
+            if self.error is not None:
+                continue
+            now = time.perf_counter()
+            self.written += 1
+            self.lag = now - captured_at
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.timing is not None:
+                self.timing.write(f"{number},{frame},{tick},{captured_at - self.start:.6f},"
+                                  f"{now - self.start:.6f}\n")
+
+    def _write(self, slot):
+        if self.process is None:
+            data = zlib.compress(slot.get_buffer(), self.compress_level)
+            self.output.write(struct.pack('<I', len(data)))
+            self.output.write(data)
+            self.bytes_written += 4 + len(data)
+        elif self.pipe_packed:
+            self.output.write(slot.get_buffer())
+            self.bytes_written += slot.get_pitch() * slot.get_height()
+        else:
+            data = pygame.image.tobytes(slot, 'RGB')
+            self.output.write(data)
+            self.bytes_written += len(data)
+
+    def stats(self):
+        return {
+            'frames': self.frames_seen,
+            'captured': self.captured,
+            'decimated': self.decimated,
+            'dropped': self.dropped,
+            'written': self.written,
+            'queued': self.queued,
+            'bytes_written': self.bytes_written,
+            'lag_s': self.lag,
+            'max_lag_s': self.max_lag,
+            'decimation': self.decimation,
+        }
+
+    def close(self):
+        # Writes out the frames still queued
+        if self.writer is None:
+            return
+        self.ready.put(None)
+        self.writer.join()
+        self.writer = None
+        for f in (self.output, self.timing):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        if self.process is not None:
+            self.process.wait()
+        target = self.path or self.pipe_command.split()[0]
+        print(f"Recorded {self.written} of {self.frames_seen} frames to {target} "
+              f"({self.decimated} decimated, {self.dropped} dropped, max writer lag {self.max_lag * 1000:.1f} ms)")
+        if self.error is not None:
+            print(f"Recording stopped early: {self.error}")
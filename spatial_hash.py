@@ -0,0 +1,110 @@
+# Uniform-grid spatial hash used as the broad phase for bullet/enemy
+# collisions. Entities are bucketed by the grid cells their bounding box
+# touches and only re-bucketed when that cell range changes, so moving an
+# entity a few pixels per frame is usually just a range comparison.
+
+
+class SpatialHash:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}    # (cell_x, cell_y) -> {entity: None}
+        self.ranges = {}   # entity -> (x0, y0, x1, y1) cell range it occupies
+        self.order = {}    # entity -> insertion number, used to break ties
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __contains__(self, entity):
+        return entity in self.ranges
+
+    def cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(x // size), int(y // size),
+                int((x + width) // size), int((y + height) // size))
+
+    def insert(self, entity):
+        cell_range = self.cell_range(entity.x, entity.y, entity.width, entity.height)
+        self.ranges[entity] = cell_range
+        self.order[entity] = self.next_order
+        self.next_order += 1
+        self._add_to_cells(entity, cell_range)
+
+    def move(self, entity):
+        # Call after the entity's position changed
+        old_range = self.ranges[entity]
+        new_range = self.cell_range(entity.x, entity.y, entity.width, entity.height)
+        if new_range != old_range:
+            self._remove_from_cells(entity, old_range)
+            self._add_to_cells(entity, new_range)
+            self.ranges[entity] = new_range
+
+    def remove(self, entity):
+        cell_range = self.ranges.pop(entity, None)
+        if cell_range is not None:
+            del self.order[entity]
+            self._remove_from_cells(entity, cell_range)
+
+    def clear(self):
+        self.cells.clear()
+        self.ranges.clear()
+        self.order.clear()
+
+    def query(self, x, y, width, height):
+        # Every entity sharing a cell with the given box (a superset of the
+        # entities actually overlapping it)
+        x0, y0, x1, y1 = self.cell_range(x, y, width, height)
+        cells = self.cells
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return list(found)
+
+    def first_overlap(self, other):
+        # The earliest inserted entity whose box overlaps other's box, or
+        # None. Matches the result of testing a list in insertion order.
+        x, y, width, height = other.x, other.y, other.width, other.height
+        x0, y0, x1, y1 = self.cell_range(x, y, width, height)
+        cells = self.cells
+        order = self.order
+        best = None
+        best_order = None
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for entity in bucket:
+                    if (x < entity.x + entity.width and
+                        x + width > entity.x and
+                        y < entity.y + entity.height and
+                        y + height > entity.y):
+                        entity_order = order[entity]
+                        if best is None or entity_order < best_order:
+                            best = entity
+                            best_order = entity_order
+        return best
+
+    def _add_to_cells(self, entity, cell_range):
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = {entity: None}
+                else:
+                    bucket[entity] = None
+
+    def _remove_from_cells(self, entity, cell_range):
+        x0, y0, x1, y1 = cell_range
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells[(cx, cy)]
+                del bucket[entity]
+                if not bucket:
+                    del cells[(cx, cy)]
@@ -0,0 +1,143 @@
+import time
+
+import pygame
+
+from rng import fx_random
+
+# Sprite baking: each animation phase of an entity is drawn once by the
+# entity's own procedural draw() into a scratch surface, cropped, and packed
+# into a single atlas surface. Drawing the entity is then one blit of its
+# frame. The procedural draw code stays the source of truth; the atlas is
+# just a cache of what it produces (kept on disk by asset_cache.py).
+#
+# bake() only queues an entity's frames. build() bakes whatever is queued
+# and packs the atlas; bake_step(budget) bakes for at most budget seconds,
+# so a game can spread the work over the spare time of its first frames.
+
+ATLAS_WIDTH = 1024
+
+# Room around an entity's box for parts drawn outside it (bug legs, monitor,
+# hair, glitch offsets)
+PADDING = 12
+
+# Seed used while baking, so cosmetic randomness in draw() (glitches, legs,
+# hair) gives the same variants every run without disturbing the cosmetic
+# stream
+BAKE_SEED = 1337
+
+
+class SpriteAtlas:
+    def __init__(self, padding=PADDING):
+        self.padding = padding
+        self.frames = {}     # key -> [(area, offset_x, offset_y)]
+        self.surface = None
+        self._baked = []     # (key, cropped surface, offset_x, offset_y)
+        self._jobs = []      # (key, draw_frames, width, height) still to bake
+        self._next_frame = 0     # of the first job
+        self._job_random = None  # bake stream state inside the first job
+        self._zoomed = {}    # zoom -> scaled copy of this atlas
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    def frame_count(self, key):
+        return len(self.frames[key])
+
+    def bake(self, key, draw_frames, width, height):
+        # draw_frames: one callable per frame, called as draw(surface, x, y)
+        # to draw the entity with its top-left corner at (x, y)
+        self._jobs.append((key, list(draw_frames), width, height))
+
+    def pending(self):
+        return bool(self._jobs)
+
+    def bake_step(self, budget=None):
+        # Bakes queued frames for about budget seconds (all of them when
+        # None); True once nothing is left to bake. Each key's frames see the
+        # cosmetic stream seeded with BAKE_SEED however the work is split.
+        deadline = None if budget is None else time.perf_counter() + budget
+        state = fx_random.getstate()
+        try:
+            while self._jobs:
+                key, draw_frames, width, height = self._jobs[0]
+                if self._job_random is None:
+                    fx_random.seed(BAKE_SEED)
+                else:
+                    fx_random.setstate(self._job_random)
+                while self._next_frame < len(draw_frames):
+                    self._bake_frame(key, draw_frames[self._next_frame], width, height)
+                    self._next_frame += 1
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        self._job_random = fx_random.getstate()
+                        return False
+                self._jobs.pop(0)
+                self._next_frame = 0
+                self._job_random = None
+            return True
+        finally:
+            fx_random.setstate(state)
+
+    def _bake_frame(self, key, draw, width, height):
+        pad = self.padding
+        scratch = pygame.Surface((width + 2 * pad, height + 2 * pad), pygame.SRCALPHA)
+        draw(scratch, pad, pad)
+        bounds = scratch.get_bounding_rect()
+        if bounds.width == 0 or bounds.height == 0:
+            bounds = pygame.Rect(pad, pad, 1, 1)
+        cropped = scratch.subsurface(bounds).copy()
+        self._baked.append((key, cropped, bounds.x - pad, bounds.y - pad))
+
+    def build(self):
+        # Bake anything still queued, then shelf-pack every baked frame into
+        # one surface
+        self.bake_step()
+        x = y = shelf_height = 0
+        placed = []
+        for key, surface, offset_x, offset_y in self._baked:
+            w, h = surface.get_size()
+            if x + w > ATLAS_WIDTH:
+                y += shelf_height
+                x = shelf_height = 0
+            placed.append((key, surface, pygame.Rect(x, y, w, h), offset_x, offset_y))
+            x += w
+            shelf_height = max(shelf_height, h)
+        height = max(1, y + shelf_height)
+
+        atlas = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA)
+        self.frames = {}
+        for key, surface, area, offset_x, offset_y in placed:
+            atlas.blit(surface, area)
+            self.frames.setdefault(key, []).append((area, offset_x, offset_y))
+        # Match the display's pixel format when there is one, so blits are
+        # straight copies
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+        self.surface = atlas
+        self._baked = []
+        return self
+
+    def at_zoom(self, zoom):
+        # Scaled copy of the atlas for a camera zoom, made once per zoom level
+        zoom = round(zoom, 2)
+        if zoom == 1:
+            return self
+        atlas = self._zoomed.get(zoom)
+        if atlas is None:
+            atlas = SpriteAtlas(self.padding)
+            for key, frames in self.frames.items():
+                for area, offset_x, offset_y in frames:
+                    size = (max(1, round(area.width * zoom)), max(1, round(area.height * zoom)))
+                    frame = pygame.transform.smoothscale(self.surface.subsurface(area), size)
+                    atlas._baked.append((key, frame, round(offset_x * zoom), round(offset_y * zoom)))
+            atlas.build()
+            self._zoomed[zoom] = atlas
+        return atlas
+
+    def blit(self, screen, key, index, x, y):
+        area, offset_x, offset_y = self.frames[key][index]
+        return screen.blit(self.surface, (x + offset_x, y + offset_y), area)
+
+    def draw(self, screen, entity):
+        # Entities report which baked frame shows their current state
+        key, index = entity.sprite_frame()
+        return self.blit(screen, key, index, entity.x, entity.y)
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The games and their tools are flat modules in the repository root; the
+# tests run them headless under SDL's dummy drivers
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
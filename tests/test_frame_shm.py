@@ -0,0 +1,35 @@
+import struct
+import time
+from multiprocessing import resource_tracker
+
+import pygame
+
+from frame_shm import HEADER_SIZE, FramePublisher, FrameReader
+
+
+def test_reader_gives_up_on_a_frame_stuck_mid_write(monkeypatch):
+    screen = pygame.Surface((8, 4))
+    publisher = FramePublisher(None, screen.get_size(), slots=2)
+    # The reader shares the publisher's resource tracker, which must keep
+    # the segment registered for the publisher to unlink it
+    with monkeypatch.context() as patch:
+        patch.setattr(resource_tracker, 'unregister', lambda name, rtype: None)
+        reader = FrameReader(publisher.name)
+    try:
+        publisher.publish(screen, score=5)
+        assert reader.latest().score == 5
+        # A publisher that died between marking the newest slot odd and
+        # finishing it
+        offset = HEADER_SIZE + publisher.frame % publisher.slots * publisher.slot_size
+        sequence = struct.unpack_from('<Q', publisher.buf, offset)[0]
+        struct.pack_into('<Q', publisher.buf, offset, sequence + 1)
+        start = time.monotonic()
+        assert reader.latest(poll=0.001, retries=20) is None
+        assert reader.retries == 21
+        assert time.monotonic() - start >= 0.02
+        # Once closed the reader stops at the first failed read
+        publisher.close()
+        assert reader.latest() is None
+        assert reader.retries == 22
+    finally:
+        reader.close()
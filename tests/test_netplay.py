@@ -0,0 +1,180 @@
+import random
+
+import pytest
+
+import netplay
+from netplay import (COUNT, KINDS, MOVED, PLAYER_RECORD, REMOVED, SNAPSHOT_HEADER, Client, ClientWorld, Server,
+                     decode_snapshot, dequantize, encode_snapshot, quantize)
+
+
+def section_counts(body):
+    # Per kind, the (removed, added, moved) counts of an encoded snapshot
+    offset = SNAPSHOT_HEADER.size + SNAPSHOT_HEADER.unpack_from(body, 0)[4] * PLAYER_RECORD.size
+    counts = []
+    for _, _, record, _ in KINDS:
+        kind = []
+        for size in (REMOVED.size, record.size, MOVED.size):
+            (count,) = COUNT.unpack_from(body, offset)
+            offset += COUNT.size + count * size
+            kind.append(count)
+        counts.append(tuple(kind))
+    assert offset == len(body)
+    return counts
+
+
+def test_full_snapshot_round_trip():
+    state = [
+        {1: (10, 20), 2: (300, 5)},
+        {3: (50, 0, 2), 4: (900, 700, 0)},
+        {5: (400, 300, 30)},
+    ]
+    players = [(0, 120), (2, 640)]
+    body = encode_snapshot(42, 0, 1234, 7, players, state, None)
+    assert section_counts(body) == [(0, 2, 0), (0, 2, 0), (0, 1, 0)]
+    assert decode_snapshot(body, {}) == (42, 1234, 7, players, state)
+
+
+def test_delta_snapshot_round_trip():
+    baseline = [
+        {1: (100, 100), 2: (200, 200), 3: (300, 300)},
+        {4: (50, 60, 1), 5: (500, 60, 3)},
+        {},
+    ]
+    state = [
+        # 1 removed, 2 moved, 3 moved too far for a step, 6 added
+        {2: (205, 190), 3: (300, 500), 6: (10, 10)},
+        # 4 unchanged, 5 moved by the largest steps
+        {4: (50, 60, 1), 5: (500 + 127, 60 - 128, 3)},
+        {7: (90, 90, 30)},
+    ]
+    body = encode_snapshot(20, 10, 5, 1, [], state, baseline)
+    assert section_counts(body) == [(1, 2, 1), (0, 0, 1), (0, 1, 0)]
+    assert decode_snapshot(body, {10: baseline}) == (20, 5, 1, [], state)
+
+
+def test_delta_against_unknown_baseline_is_refused():
+    body = encode_snapshot(20, 10, 0, 0, [], [{}, {}, {}], [{}, {}, {}])
+    with pytest.raises(ValueError):
+        decode_snapshot(body, {})
+
+
+@pytest.mark.parametrize('quantum', [1, 2, 4, 8])
+def test_quantized_positions(quantum):
+    for value in (-128, -40, -1, 0, 1, 7, 399, 799):
+        restored = dequantize(quantize(value, quantum), quantum)
+        assert value - quantum < restored <= value
+
+
+def play(server, clients, ticks, seed=1):
+    # Steps the server with random input, and yields every snapshot sent as
+    # (client, world the client rebuilt, the state the server sent it)
+    rng = random.Random(seed)
+    worlds = {client: ClientWorld(server.quantum) for client in clients}
+    for _ in range(ticks):
+        for client in clients:
+            if rng.random() < 0.1:
+                client.held = rng.choice((0, netplay.LEFT, netplay.RIGHT))
+            if rng.random() < 0.3:
+                client.shots += 1
+        server.step()
+        for client in clients:
+            while not client.queue.empty():
+                data = client.queue.get_nowait()
+                length, kind = netplay.FRAME.unpack_from(data, 0)
+                assert kind == netplay.SNAPSHOT and len(data) == netplay.FRAME.size + length
+                world = worlds[client]
+                world.apply(data[netplay.FRAME.size:])
+                # Acknowledged like a client that got everything
+                client.acknowledge(world.tick)
+                yield client, world, client.history[world.tick]
+
+
+def without_timers(state):
+    # An explosion's timer is only sent when it appears; clients animate it
+    bullets, enemies, explosions = state
+    return [bullets, enemies, {entity: values[:2] for entity, values in explosions.items()}]
+
+
+def seat(server, characters):
+    clients = []
+    for character in characters:
+        client = Client(None, netplay.DEFAULT_QUEUE_SIZE)
+        assert server.join(client, character)
+        server.clients.add(client)
+        clients.append(client)
+    return clients
+
+
+@pytest.mark.parametrize('quantum', [1, 4])
+def test_clients_rebuild_the_server_state(quantum):
+    server = Server(send_rate=20, quantum=quantum, seed=1)
+    clients = seat(server, netplay.CHARACTERS)
+    session = clients[0].session
+    snapshots = 0
+    for client, world, sent in play(server, clients, 600):
+        assert without_timers(world.state) == without_timers(session.state) == without_timers(sent)
+        assert world.score == session.game.score
+        assert world.players == session.players
+        snapshots += 1
+        # Dequantized positions are within a quantum of the game's
+        bullets = {(x, y) for _, x, y in world.positions('bullets')}
+        for bullet in session.game.bullets:
+            x, y = dequantize(quantize(bullet.x, quantum), quantum), dequantize(quantize(bullet.y, quantum), quantum)
+            assert (x, y) in bullets
+            assert bullet.x - quantum < x <= bullet.x and bullet.y - quantum < y <= bullet.y
+    assert snapshots == 3 * 600 // server.snapshot_interval
+    assert server.delta_snapshots > server.full_snapshots == len(clients)
+    assert len(session.game.bullets) and len(session.game.enemies)
+
+
+def test_interest_filtered_baselines():
+    server = Server(send_rate=20, interest=150, seed=1)
+    clients = seat(server, netplay.CHARACTERS)
+    session = clients[0].session
+    filtered = 0
+    for client, world, sent in play(server, clients, 600):
+        # The client has exactly what was sent to it, built on the filtered
+        # snapshot it acknowledged before
+        assert without_timers(world.state) == without_timers(sent)
+        center = client.player.x + client.player.width // 2
+        for kind, (_, _, _, half_width) in enumerate(KINDS):
+            expected = {entity: values for entity, values in session.state[kind].items()
+                        if abs(dequantize(values[0], server.quantum) + half_width - center) <= server.interest}
+            assert sent[kind] == expected
+            filtered += len(expected) < len(session.state[kind])
+    assert filtered
+    assert server.delta_snapshots > server.full_snapshots
+
+
+def test_queue_drops_are_counted_per_report_window():
+    server = Server(send_rate=20, queue_size=2, seed=1)
+    client = Client(None, 2, server)
+    assert server.join(client, 'moss')
+    server.clients.add(client)
+    snapshots = 10
+    for _ in range(snapshots * server.snapshot_interval):
+        server.step()
+    assert server.report()['queue_drops'] == snapshots - 2
+    assert server.report()['queue_drops'] == 0
+    # Drops of a client that left still count in their window
+    for _ in range(server.snapshot_interval):
+        server.step()
+    server.leave(client)
+    assert server.report()['queue_drops'] == 1
+
+
+def test_report_has_no_per_client_rate_without_clients():
+    server = Server(send_rate=20, seed=1)
+    client = Client(None, netplay.DEFAULT_QUEUE_SIZE, server)
+    assert server.join(client, 'moss')
+    server.clients.add(client)
+    client.bytes_sent = 5000
+    server.leave(client)
+    summary = server.report()
+    assert summary['clients'] == 0 and summary['out_bytes_per_s'] > 0
+    assert "per client" not in Server.format_report(summary)
+    client = Client(None, netplay.DEFAULT_QUEUE_SIZE, server)
+    assert server.join(client, 'jen')
+    server.clients.add(client)
+    client.bytes_sent = 5000
+    assert "B/s per client" in Server.format_report(server.report())
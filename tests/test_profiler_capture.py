@@ -0,0 +1,56 @@
+import pstats
+
+import pytest
+
+import headless
+from profiler_capture import ProfilerCapture
+
+
+def capture(tmp_path, mode, frames=300):
+    # Profiles headless it-crowd frames, ended the way Game.run ends them;
+    # a headless tick is too quick for the sampler to catch on its own
+    game = headless.create_game(headless.load_variant('it-crowd'), 'moss', seed=1)
+    profiler = ProfilerCapture('it-crowd', frames, mode, str(tmp_path), interval=0.0005)
+    profiler.request()
+    for _ in range(frames + 2):
+        for _ in range(10):
+            game.update()
+        profiler.end_frame(game)
+    assert len(profiler.captures) == 1
+    return profiler.captures[0]
+
+
+def collapsed(prefix):
+    stacks = {}
+    with open(prefix + '.collapsed') as f:
+        for line in f:
+            stack, count = line.rsplit(' ', 1)
+            stacks[stack] = int(count)
+    return stacks
+
+
+@pytest.mark.parametrize('mode', ['cprofile', 'sample'])
+def test_capture_profiles_the_game_and_not_the_sampler(tmp_path, mode):
+    prefix = capture(tmp_path, mode)
+    names = {name for _, _, name in pstats.Stats(prefix + '.pstats').stats}
+    assert 'update' in names
+    assert not names & {'_on_signal', '_record', '_run'}
+    stacks = collapsed(prefix)
+    assert all(stack.startswith('it-crowd [playing];') for stack in stacks)
+    assert any(';update (it-crowd.py:' in stack for stack in stacks)
+    assert not any('_on_signal' in stack or '_record (' in stack for stack in stacks)
+
+
+def test_cprofile_stacks_add_up_to_the_profiled_time(tmp_path):
+    prefix = capture(tmp_path, 'cprofile')
+    stats = pstats.Stats(prefix + '.pstats')
+    total = sum(stacks for stacks in collapsed(prefix).values()) / 1e6
+    # Stack times are rounded to microseconds
+    assert total == pytest.approx(stats.total_tt, rel=0.02)
+    # Game.update, whose callees' stacks all run through it
+    code = headless.load_variant('it-crowd').Game.update.__code__
+    key = (code.co_filename, code.co_firstlineno, code.co_name)
+    prefix_stack = f"it-crowd [playing];update (it-crowd.py:{code.co_firstlineno})"
+    updated = sum(count for stack, count in collapsed(prefix).items()
+                  if stack == prefix_stack or stack.startswith(prefix_stack + ';')) / 1e6
+    assert updated == pytest.approx(stats.stats[key][3], rel=0.02)
@@ -0,0 +1,68 @@
+import pytest
+
+import headless
+import rollback
+from particles import available as particle_system_available
+
+
+@pytest.mark.parametrize('variant', sorted(headless.VARIANTS))
+def test_restore_brings_back_the_exact_state(variant):
+    # Raises on the first frame that restores or re-simulates differently
+    rollback.check_restore(variant, frames=600)
+
+
+def test_lossy_match_stays_in_sync():
+    sessions, transport, synced = rollback.play_match('it-crowd', peers=2, frames=400, delay=3, jitter=2,
+                                                      loss=0.2, seed=3)
+    assert transport.dropped > 0
+    assert all(session.rollbacks > 0 for session in sessions)
+    assert synced
+
+
+@pytest.mark.parametrize('variant', sorted(headless.VARIANTS))
+def test_single_peer_match_matches_straight_simulation(variant):
+    _, _, synced = rollback.play_match(variant, peers=1, frames=300, loss=0.2, seed=3)
+    assert synced
+
+
+@pytest.mark.skipif(not particle_system_available(), reason="the particle system needs NumPy")
+@pytest.mark.parametrize('variant', ['it-crowd', 'retro_game_it_crowd'])
+def test_resimulated_hit_does_not_emit_particles_again(variant):
+    module = headless.load_variant(variant)
+    game = headless.create_game(module, 'moss', seed=1)
+    session = rollback.RollbackSession(game, 0, 1, rollback.LossyTransport(), input_delay=0)
+    # An enemy right above the player, who keeps firing
+    game.spawn_enemy(game.player.x - 10, game.player.y - 120, module.ENEMY_TYPES[0])
+    hit = None
+    for frame in range(60):
+        session.confirmed[0][frame] = rollback.FIRE
+        score = game.score
+        session.step()
+        if game.score > score:
+            hit = frame
+            break
+    assert hit is not None
+    score = game.score
+    particles = len(game.particles)
+    assert particles > 0
+    for _ in range(3):
+        session.roll_back(hit - 1)
+    assert game.score == score
+    assert len(game.particles) == particles
+    assert not game.resimulating
+
+
+@pytest.mark.parametrize('variant', sorted(headless.VARIANTS))
+def test_cli_benchmarks_and_plays_a_match(variant, capsys):
+    assert rollback.main(['--variant', variant, '--frames', '200']) == 0
+    assert "same state as a straight simulation" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('variant', ['retro_game', 'retro_game_it_crowd'])
+def test_cli_refuses_peers_a_variant_cannot_host(variant, capsys):
+    with pytest.raises(SystemExit) as error:
+        rollback.main(['--variant', variant, '--peers', '2'])
+    assert error.value.code == 2
+    assert "need it-crowd" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        rollback.RollbackSession(rollback.new_game(variant), 0, 2, rollback.LossyTransport())
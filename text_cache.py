@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+import pygame
+
+# Process-wide font registry and rendered-text cache. Loading a font and
+# rasterizing glyphs are far more expensive than blitting the result, and the
+# games draw the same handful of strings every frame.
+
+_fonts = {}
+
+
+def get_font(size, face=None):
+    # One pygame Font per (face, size) for the whole process; face None is
+    # pygame's default font. The font module is started on first use.
+    key = (face, size)
+    font = _fonts.get(key)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.Font(face, size)
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    # LRU cache of rendered text surfaces keyed by (text, size, color,
+    # antialias, face). Bounded by entry count and by total pixel bytes.
+    # Returned surfaces are shared: blit them, never draw on them.
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def render(self, text, size, color, antialias=True, face=None):
+        key = (text, size, tuple(color), antialias, face)
+        entries = self.entries
+        surface = entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = get_font(size, face).render(text, antialias, color)
+        self._add(key, surface)
+        return surface
+
+    def preload(self, key, surface):
+        # Adds a surface rendered earlier (by the on-disk asset cache); key
+        # is (text, size, color tuple, antialias, face)
+        if key not in self.entries:
+            self._add(key, surface)
+
+    def _add(self, key, surface):
+        entries = self.entries
+        entries[key] = surface
+        self.bytes += self._surface_bytes(surface)
+        while entries and (len(entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, evicted = entries.popitem(last=False)
+            self.bytes -= self._surface_bytes(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _surface_bytes(surface):
+        return surface.get_height() * surface.get_pitch()
+
+
+text_cache = TextCache()
+
+
+def render_text(text, size, color, antialias=True, face=None):
+    return text_cache.render(text, size, color, antialias, face)
@@ -0,0 +1,93 @@
+import time
+
+# Fixed-timestep game loop driver. The simulation advances in ticks of
+# exactly 1 / tick_rate seconds of real time, however fast or slow frames
+# are rendered; each frame runs as many ticks as the elapsed time calls for
+# and renders with alpha, the fraction of a tick left over, so drawing can
+# interpolate between the last two simulation states.
+#
+# Usage per rendered frame:
+#   for _ in range(timestep.advance()):
+#       game.tick()
+#   game.draw(timestep.alpha)
+#
+# When a frame falls so far behind that catching up would need more than
+# max_ticks_per_frame ticks (a debugger pause, a dragged window, a machine
+# too slow for the tick rate), the excess ticks are dropped and counted
+# rather than run, so the loop never spirals into ever longer frames.
+#
+# borrow() runs the next tick early, for input that should not wait for it
+# (input_latency.py's late-input mode): the accumulator goes up to a tick
+# negative, the following frames run correspondingly fewer ticks, and the
+# simulation keeps its rate.
+
+DEFAULT_TICK_RATE = 60
+MAX_TICKS_PER_FRAME = 5
+
+
+class FixedTimestep:
+    def __init__(self, tick_rate=DEFAULT_TICK_RATE, max_ticks_per_frame=MAX_TICKS_PER_FRAME,
+                 clock=time.perf_counter):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.clock = clock
+        self.accumulator = 0.0
+        self.last_time = None
+
+        # Stats
+        self.frames = 0
+        self.ticks = 0
+        self.dropped_ticks = 0
+        self.borrowed_ticks = 0
+
+    def advance(self):
+        # Number of ticks to run before rendering this frame
+        now = self.clock()
+        if self.last_time is None:
+            # First frame: one tick so there is a state to draw
+            self.last_time = now
+            self.accumulator = self.dt
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        ticks = int(self.accumulator / self.dt)
+        if ticks > self.max_ticks_per_frame:
+            self.dropped_ticks += ticks - self.max_ticks_per_frame
+            ticks = self.max_ticks_per_frame
+            # Forget the dropped time but keep the partial tick
+            self.accumulator %= self.dt
+        else:
+            self.accumulator -= ticks * self.dt
+
+        self.frames += 1
+        self.ticks += ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        # How far the frame is between the previous tick (0) and the latest (1)
+        return max(0.0, min(1.0, self.accumulator / self.dt))
+
+    def borrow(self):
+        # One tick to run now, ahead of time; at most one is ever owed
+        if self.accumulator < 0:
+            return 0
+        self.accumulator -= self.dt
+        self.ticks += 1
+        self.borrowed_ticks += 1
+        return 1
+
+    def reset(self):
+        # Skip the time spent outside the loop (e.g. while paused)
+        self.last_time = None
+        self.accumulator = 0.0
+
+
+def interpolate(entity, alpha):
+    # Position of entity alpha of the way from its previous tick to its
+    # current one
+    if alpha >= 1.0:
+        return entity.x, entity.y
+    prev_x, prev_y = entity.prev_x, entity.prev_y
+    return prev_x + (entity.x - prev_x) * alpha, prev_y + (entity.y - prev_y) * alpha
@@ -0,0 +1,339 @@
+import argparse
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # like the entity store, the environment needs NumPy
+    np = None
+
+# Vectorized training environment: N independent games stepped together,
+# Gym style, with every instance's state in (N, ...) arrays.
+#
+#   env = VecEnv('retro_game_it_crowd', num_envs=256, seed=1)
+#   obs = env.reset()
+#   obs, reward, done, info = env.step(actions)   # actions: (N,) ints
+#
+#   python vec_env.py --envs 1024 --steps 2000     # random-policy throughput
+#
+# The rules are Game.update() and check_collisions(): the player moves left
+# or right and shoots, enemies spawn every enemy_spawn_delay ticks at a
+# random x above the screen and fall, bullets rise, and a bullet hitting an
+# enemy removes both and scores 10. Sizes, speeds, spawn timing and the
+# player's start are read from a headless Game of the chosen variant, so the
+# environment follows the variant (and any constants a sweep changed).
+# Enemy types only change how enemies are drawn and are not modelled.
+#
+# A step is a fixed number of NumPy operations whatever N is; there are no
+# per-instance Python objects and no pygame in step(). Spawn positions come
+# from one NumPy generator for the whole batch, so an instance does not
+# replay a Game with the same seed tick for tick, but every rule, including
+# which enemy a bullet hits when it overlaps several, is the same.
+#
+# An episode ends when max_escaped enemies have fallen past the player (the
+# games have no way to die) or after max_steps ticks; finished instances are
+# reset in the same step() call, and their last observation is returned in
+# info['final_observation'].
+
+# Action = move + 3 * fire, move 0: stay, 1: left, 2: right
+NUM_ACTIONS = 6
+
+# Large spawn sequence number for empty slots, so they never come first
+NO_SEQ = 2 ** 62
+# Sort keys of the collision broad phase: instance * KEY_STRIDE + y
+KEY_STRIDE = 2 ** 32
+
+
+def available():
+    return np is not None
+
+
+def decode_action(action):
+    # (fire, left, right) for one action number
+    move = action % 3
+    return action >= 3, move == 1, move == 2
+
+
+class GameRules:
+    # Geometry and timing of one variant, measured on a headless Game
+    def __init__(self, variant):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        import headless
+        module = headless.load_variant(variant)
+        game = headless.create_game(module)
+        player = game.player
+
+        self.variant = variant
+        self.screen_width = module.SCREEN_WIDTH
+        self.screen_height = module.SCREEN_HEIGHT
+        self.player_x = player.x
+        self.player_y = player.y
+        self.player_width = player.width
+        self.player_speed = player.speed
+        self.spawn_delay = game.enemy_spawn_delay
+
+        game.shoot()
+        bullet = game.bullets[-1]
+        self.bullet_offset = bullet.x - player.x
+        self.bullet_width = bullet.width
+        self.bullet_height = bullet.height
+        self.bullet_speed = bullet.speed
+
+        # One tick with the spawn timer about to run out spawns an enemy
+        game.enemy_spawn_timer = game.enemy_spawn_delay - 1
+        game.update()
+        enemy = game.enemies[-1]
+        self.enemy_y = enemy.y
+        self.enemy_width = enemy.width
+        self.enemy_height = enemy.height
+        self.enemy_speed = enemy.speed
+
+    def bullet_capacity(self):
+        # Most bullets on screen at once, firing every tick
+        return -(-(self.player_y + self.bullet_height) // self.bullet_speed) + 1
+
+    def enemy_capacity(self):
+        # Most enemies on screen at once
+        lifetime = -(-(self.screen_height - self.enemy_y + 1) // self.enemy_speed)
+        return -(-lifetime // self.spawn_delay) + 1
+
+
+class VecEnv:
+    def __init__(self, variant='retro_game_it_crowd', num_envs=64, seed=None, max_escaped=10,
+                 max_steps=None, escape_penalty=0.0, rules=None):
+        if np is None:
+            raise RuntimeError("VecEnv requires NumPy")
+        self.rules = rules if rules is not None else GameRules(variant)
+        self.num_envs = num_envs
+        self.max_escaped = max_escaped
+        self.max_steps = max_steps
+        self.escape_penalty = escape_penalty
+        self.rng = np.random.default_rng(seed)
+        self.bullet_slots = self.rules.bullet_capacity()
+        self.enemy_slots = self.rules.enemy_capacity()
+        # Observation: player x, spawn timer, then (x, y, alive) for every
+        # enemy slot and every bullet slot; positions are scaled to the screen
+        self.observation_size = 2 + 3 * (self.enemy_slots + self.bullet_slots)
+
+        n = num_envs
+        self.player_x = np.zeros(n, dtype=np.int64)
+        self.spawn_timer = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.escaped = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.bullet_x = np.zeros((n, self.bullet_slots), dtype=np.int64)
+        self.bullet_y = np.zeros((n, self.bullet_slots), dtype=np.int64)
+        self.bullet_alive = np.zeros((n, self.bullet_slots), dtype=bool)
+        self.bullet_seq = np.full((n, self.bullet_slots), NO_SEQ, dtype=np.int64)
+        self.enemy_x = np.zeros((n, self.enemy_slots), dtype=np.int64)
+        self.enemy_y = np.zeros((n, self.enemy_slots), dtype=np.int64)
+        self.enemy_alive = np.zeros((n, self.enemy_slots), dtype=bool)
+        self.enemy_seq = np.full((n, self.enemy_slots), NO_SEQ, dtype=np.int64)
+        # Spawn order across the batch; only compared within an instance
+        self.next_seq = 0
+        self.rows = np.arange(n)
+        self.reset()
+
+    def reset(self, mask=None):
+        # Resets every instance (or those where mask is True); returns the
+        # observations of all of them
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        rules = self.rules
+        self.player_x[mask] = rules.player_x
+        self.spawn_timer[mask] = 0
+        self.score[mask] = 0
+        self.escaped[mask] = 0
+        self.steps[mask] = 0
+        self.bullet_alive[mask] = False
+        self.bullet_seq[mask] = NO_SEQ
+        self.enemy_alive[mask] = False
+        self.enemy_seq[mask] = NO_SEQ
+        return self.observe()
+
+    def step(self, actions):
+        rules = self.rules
+        actions = np.asarray(actions)
+        move = actions % 3
+
+        # Input, as Game.apply_input: shoot from where the player stands,
+        # then move
+        fire = actions >= 3
+        if fire.any():
+            self._add(fire, self.bullet_alive, self.bullet_seq,
+                      (self.bullet_x, self.player_x + rules.bullet_offset),
+                      (self.bullet_y, rules.player_y))
+        x = self.player_x
+        x[(move == 1) & (x > 0)] -= rules.player_speed
+        x[(move == 2) & (x < rules.screen_width - rules.player_width)] += rules.player_speed
+
+        # Movement and off-screen culling
+        self.bullet_y -= rules.bullet_speed
+        self.bullet_alive &= self.bullet_y >= 0
+        self.enemy_y += rules.enemy_speed
+        escaping = self.enemy_alive & (self.enemy_y > rules.screen_height)
+        escaped = escaping.sum(axis=1)
+        self.enemy_alive &= ~escaping
+        self.escaped += escaped
+
+        # Spawning
+        self.spawn_timer += 1
+        spawning = self.spawn_timer >= rules.spawn_delay
+        if spawning.any():
+            spawn_x = self.rng.integers(0, rules.screen_width - rules.enemy_width + 1, self.num_envs)
+            self._add(spawning, self.enemy_alive, self.enemy_seq,
+                      (self.enemy_x, spawn_x), (self.enemy_y, rules.enemy_y))
+            self.spawn_timer[spawning] = 0
+
+        hits = self._collide()
+        self.score += 10 * hits
+        self.bullet_seq[~self.bullet_alive] = NO_SEQ
+        self.enemy_seq[~self.enemy_alive] = NO_SEQ
+
+        self.steps += 1
+        reward = (10 * hits - self.escape_penalty * escaped).astype(np.float32)
+        done = np.zeros(self.num_envs, dtype=bool)
+        if self.max_escaped:
+            done = self.escaped >= self.max_escaped
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_steps is not None:
+            truncated = (self.steps >= self.max_steps) & ~done
+        finished = done | truncated
+        info = {
+            'score': self.score.copy(),
+            'escaped': self.escaped.copy(),
+            'steps': self.steps.copy(),
+            'truncated': truncated,
+        }
+        if finished.any():
+            info['final_observation'] = self.observe()
+            obs = self.reset(finished)
+        else:
+            obs = self.observe()
+        return obs, reward, finished, info
+
+    def _add(self, mask, alive, seq, *columns):
+        # Puts one new entity into the first free slot of every masked
+        # instance; (column, value) pairs set its fields. The slot counts
+        # cover the most entities the rules allow, so a slot is always free.
+        slot = np.argmin(alive, axis=1)
+        mask = mask & ~alive[self.rows, slot]
+        rows = self.rows[mask]
+        slot = slot[mask]
+        alive[rows, slot] = True
+        seq[rows, slot] = self.next_seq
+        self.next_seq += 1
+        for column, value in columns:
+            # value: one per instance, or the same for all
+            column[rows, slot] = value[mask] if np.ndim(value) else value
+
+    def _collide(self):
+        # Hits per instance. Like check_collisions, bullets are resolved in
+        # spawn order and each takes the earliest spawned enemy it overlaps
+        # that no earlier bullet took.
+        rules = self.rules
+        hits = np.zeros(self.num_envs, dtype=np.int64)
+        enemy_rows, enemy_slots = np.nonzero(self.enemy_alive)
+        bullet_rows, bullet_slots = np.nonzero(self.bullet_alive)
+        if len(enemy_rows) == 0 or len(bullet_rows) == 0:
+            return hits
+
+        # Broad phase: enemies of all instances sorted by (instance, y), so
+        # the enemies level with a bullet are one binary search away
+        keys = enemy_rows * KEY_STRIDE + self.enemy_y[enemy_rows, enemy_slots]
+        order = np.argsort(keys, kind='stable')
+        keys, enemy_rows, enemy_slots = keys[order], enemy_rows[order], enemy_slots[order]
+        base = bullet_rows * KEY_STRIDE + self.bullet_y[bullet_rows, bullet_slots]
+        # Overlap in y: bullet.y - enemy.height < enemy.y < bullet.y + bullet.height
+        lo = np.searchsorted(keys, base - rules.enemy_height, 'right')
+        hi = np.searchsorted(keys, base + rules.bullet_height, 'left')
+        counts = hi - lo
+        if not counts.any():
+            return hits
+
+        # Narrow phase on the (bullet, enemy) pairs level with each other
+        pair_bullets = np.repeat(np.arange(len(bullet_rows)), counts)
+        pair_enemies = lo[pair_bullets] + np.arange(len(pair_bullets)) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = bullet_rows[pair_bullets]
+        bullets = bullet_slots[pair_bullets]
+        enemies = enemy_slots[pair_enemies]
+        bx = self.bullet_x[rows, bullets]
+        ex = self.enemy_x[rows, enemies]
+        overlap = (bx < ex + rules.enemy_width) & (bx + rules.bullet_width > ex)
+        if not overlap.any():
+            return hits
+        rows, bullets, enemies = rows[overlap], bullets[overlap], enemies[overlap]
+
+        # Pairs in (instance, bullet spawn order, enemy spawn order); round r
+        # resolves the r-th overlapping bullet of every instance at once
+        bullet_seq = self.bullet_seq[rows, bullets]
+        order = np.lexsort((self.enemy_seq[rows, enemies], bullet_seq, rows))
+        rows, bullets, enemies, bullet_seq = rows[order], bullets[order], enemies[order], bullet_seq[order]
+        new_bullet = np.ones(len(rows), dtype=bool)
+        new_bullet[1:] = (rows[1:] != rows[:-1]) | (bullet_seq[1:] != bullet_seq[:-1])
+        bullet_number = np.cumsum(new_bullet) - 1
+        rank = bullet_number - bullet_number[np.searchsorted(rows, rows)]
+        taken = np.zeros_like(self.enemy_alive)
+        for r in range(int(rank.max()) + 1):
+            pick = np.nonzero(rank == r)[0]
+            pick = pick[~taken[rows[pick], enemies[pick]]]
+            # The first pair left of a bullet has its earliest free enemy
+            first = np.ones(len(pick), dtype=bool)
+            first[1:] = bullet_number[pick[1:]] != bullet_number[pick[:-1]]
+            pick = pick[first]
+            taken[rows[pick], enemies[pick]] = True
+            self.bullet_alive[rows[pick], bullets[pick]] = False
+            hits[rows[pick]] += 1
+        self.enemy_alive &= ~taken
+        return hits
+
+    def observe(self):
+        rules = self.rules
+        obs = np.empty((self.num_envs, self.observation_size), dtype=np.float32)
+        obs[:, 0] = self.player_x / rules.screen_width
+        obs[:, 1] = self.spawn_timer / rules.spawn_delay
+        start = 2
+        for xs, ys, alive in ((self.enemy_x, self.enemy_y, self.enemy_alive),
+                              (self.bullet_x, self.bullet_y, self.bullet_alive)):
+            end = start + 3 * alive.shape[1]
+            obs[:, start + 2:end:3] = alive
+            obs[:, start:end:3] = xs * obs[:, start + 2:end:3] / rules.screen_width
+            obs[:, start + 1:end:3] = ys * obs[:, start + 2:end:3] / rules.screen_height
+            start = end
+        return obs
+
+
+def main(argv=None):
+    import headless
+
+    parser = argparse.ArgumentParser(description="Step many game instances with a random policy.")
+    parser.add_argument('--variant', choices=sorted(headless.VARIANTS), default='retro_game_it_crowd')
+    parser.add_argument('--envs', type=int, default=1024)
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-escaped', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    env = VecEnv(args.variant, num_envs=args.envs, seed=args.seed, max_escaped=args.max_escaped)
+    actions = np.random.default_rng(args.seed).integers(0, NUM_ACTIONS, (args.steps, args.envs))
+    episodes = 0
+    total_score = 0
+    start = time.perf_counter()
+    for step_actions in actions:
+        _, _, done, info = env.step(step_actions)
+        if done.any():
+            episodes += int(done.sum())
+            total_score += int(info['score'][done].sum())
+    elapsed = time.perf_counter() - start
+    rate = args.envs * args.steps / elapsed if elapsed > 0 else float('inf')
+    print(f"{args.variant}: {args.envs} instances x {args.steps} steps in {elapsed:.2f}s "
+          f"({rate:,.0f} steps/s), {episodes} episodes")
+    if episodes:
+        print(f"  mean episode score {total_score / episodes:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())